@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""Generated presets stored on disk, ready to be sent as files.
+
+An artifact is the output of a target for an EQ, keyed by (EQ hash,
+target, parameters, version of the output). It is written once, atomically,
+under a sharded tree:
+
+    <root>/<version>/<target>/<hash[:2]>/<hash[2:4]>/<hash>[-<params>].<extension>
+
+and then served as a file: nginx sends it directly when the backend answers
+with X-Accel-Redirect, otherwise the backend streams it. A new release or
+a change of the rendered output (RENDER_VERSION in backend.py) writes to a
+new directory, old ones are swept away.
+
+The tree is capped in size: sweep() removes the least recently used files
+(by mtime, refreshed on every hit) until the tree fits. One process sweeps
+at a time, the others skip.
+
+    python3 -m artifacts ROOT --max-bytes 1000000000    sweep from cron
+"""
+
+import argparse
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+import pathlib
+import sys
+import time
+from dataclasses import dataclass
+
+# 1 GB
+ARTIFACTS_MAX_BYTES = 1 << 30
+# temporary files older than this are leftovers of a crash
+STALE_TMP_SECONDS = 3600
+SWEEP_LOCK = ".sweep.lock"
+
+
+@dataclass(frozen=True)
+class ArtifactKey:
+    eq_hash: str
+    target: str
+    extension: str
+    version: str
+    params: tuple[tuple[str, str], ...] = ()
+
+    def relative_path(self) -> str:
+        name = self.eq_hash
+        if self.params:
+            canonical = json.dumps(sorted(self.params), separators=(",", ":"))
+            digest = hashlib.blake2b(canonical.encode("utf-8"), digest_size=8).hexdigest()
+            name = "{}-{}".format(name, digest)
+        return "/".join(
+            (
+                self.version,
+                self.target,
+                self.eq_hash[:2],
+                self.eq_hash[2:4],
+                "{}.{}".format(name, self.extension),
+            )
+        )
+
+
+class ArtifactStore:
+    def __init__(self, root: str, max_bytes: int = ARTIFACTS_MAX_BYTES):
+        self.root = pathlib.Path(root)
+        self.max_bytes = max_bytes
+        # a sweep is due after writing a tenth of the cap
+        self._written = 0
+
+    def path(self, key: ArtifactKey) -> pathlib.Path:
+        return self.root / key.relative_path()
+
+    def get(self, key: ArtifactKey) -> pathlib.Path | None:
+        """the file of an artifact if it exists, marked as recently used"""
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key: ArtifactKey, body: bytes) -> pathlib.Path:
+        """write an artifact; readers never see a partial file"""
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name("{}.{}.tmp".format(path.name, os.getpid()))
+        tmp.write_bytes(body)
+        os.replace(tmp, path)
+        self._written += len(body)
+        return path
+
+    def sweep_due(self) -> bool:
+        return self._written >= self.max_bytes // 10
+
+    def sweep(self) -> tuple[int, int]:
+        """remove least recently used files past max_bytes, return files and bytes removed"""
+        self._written = 0
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self.root / SWEEP_LOCK, "w") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # another process is sweeping
+                return 0, 0
+            return self._sweep_locked()
+
+    def _sweep_locked(self) -> tuple[int, int]:
+        files = []
+        stale = time.time() - STALE_TMP_SECONDS
+        removed = freed = 0
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                if name == SWEEP_LOCK:
+                    continue
+                path = os.path.join(directory, name)
+                with contextlib.suppress(FileNotFoundError):
+                    stat = os.stat(path)
+                    if name.endswith(".tmp"):
+                        if stat.st_mtime < stale:
+                            os.unlink(path)
+                            removed, freed = removed + 1, freed + stat.st_size
+                        continue
+                    files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        files.sort()
+        for _, size, path in files:
+            if total <= self.max_bytes:
+                break
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(path)
+                removed, freed = removed + 1, freed + size
+            total -= size
+        return removed, freed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Sweep an artifact store")
+    parser.add_argument("root")
+    parser.add_argument("--max-bytes", type=int, default=ARTIFACTS_MAX_BYTES)
+    args = parser.parse_args()
+
+    removed, freed = ArtifactStore(args.root, args.max_bytes).sweep()
+    print("{} files removed, {} bytes freed".format(removed, freed))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
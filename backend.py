@@ -1,33 +1,71 @@
 # -*- coding: utf-8 -*-
 import ast
+import asyncio
+import base64
+import functools
 import hashlib
 import json
 import logging
-import math
 import re
 import os
+import pathlib
 import sys
+import time
+import urllib.parse
+from collections.abc import Awaitable, Callable
+from typing import Literal
 from typing_extensions import Annotated
 
 import sqlite3
-from fastapi import FastAPI, Depends, UploadFile, HTTPException
-from fastapi.encoders import jsonable_encoder
+from fastapi import FastAPI, Depends, Query, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+import msgspec
 import numpy as np
-from pydantic import BaseModel, Field, StringConstraints
-from starlette.responses import JSONResponse
+from starlette.background import BackgroundTask
+from starlette.responses import FileResponse, Response, StreamingResponse
 import uvicorn
 
-from iir.filter_iir import Biquad
-from iir.filter_peq import peq_format_apo, peq_build
+from iir.filter_peq import peq_bank, peq_freq_grid
 from converter import (
+    EQ_HASH_SIZE,
     IIR,
     lines2iir,
-    iir2aupreset,
+    iir2hash,
     iir2peq,
-    iir2rme_totalmix_channel,
-    iir2rme_totalmix_room,
+    name2hash,
+    spin_eq2text,
 )
+from targets import TARGETS, convert, convert_cache_info, get_target
+from graphs import (
+    GRAPH_DEFAULT_POINTS,
+    GRAPH_FORMATS,
+    GRAPH_MAX_POINTS,
+    GRAPH_MAX_PRECISION,
+    GRAPH_MEDIA_TYPE,
+    GRAPH_MIN_POINTS,
+    graph_content,
+    graph_curves,
+    graph_encode,
+    graph_round,
+    graph_spl_content,
+    graph_spl_details_content,
+)
+from responses import FastJSONResponse, dumps
+from catalog import SpeakerIndex, speaker_index, speaker_index_cache_info
+from eqdata import (
+    EqdataIndex,
+    eqdata_entry_cache_info,
+    eqdata_index,
+    eqdata_index_cache_info,
+)
+from packed import PackedCatalog, PackedEntries, packed_cache_info, packed_catalog
+from rendercache import CacheUnavailableError, cache_from_url
+from artifacts import ARTIFACTS_MAX_BYTES, ArtifactKey, ArtifactStore
+from database import Database
+from uploads import UPLOAD_FIELD, UploadRejectedError, read_uploads
+import metrics
+from metrics import stage
+import profiling
 
 # ----------------------------------------------------------------------
 # constants
@@ -36,6 +74,11 @@ from converter import (
 API_VERSION = "v1"
 CURRENT_VERSION = 3
 SOFTWARE_VERSION = f"{API_VERSION}.{CURRENT_VERSION}"
+# bump when a rendered body changes for the same request (writers, fits,
+# graph payloads): it is part of the render cache and artifact keys, and
+# both outlive deploys
+RENDER_VERSION = 2
+RENDER_KEY_VERSION = f"{SOFTWARE_VERSION}-r{RENDER_VERSION}"
 
 # ----------------------------------------------------------------------
 # env variables
@@ -58,35 +101,127 @@ if ENV == "dev":
     EQDATA = f"{SPIN}/eqdata.json"
     FASTAPI_DEBUG = True
 
+# explicit locations win, used for tests and load testing
+METADATA = os.getenv("EQCONVERTER_METADATA", METADATA)
+EQDATA = os.getenv("EQCONVERTER_EQDATA", EQDATA)
+DATABASE = os.getenv("EQCONVERTER_DB", "eqs.db")
+# uploads: full, normal or buffered, see database.py
+DB_DURABILITY = os.getenv("EQCONVERTER_DB_DURABILITY", "normal")
+DB_COMMIT_DELAY_MS = float(os.getenv("EQCONVERTER_DB_COMMIT_DELAY_MS", "2"))
+DB_MAX_BATCH = int(os.getenv("EQCONVERTER_DB_MAX_BATCH", "256"))
+# catalog file shared by the workers, see packed.py; empty to disable
+PACKED = os.getenv("EQCONVERTER_PACKED", "")
+# where rendered targets and graphs are cached, see rendercache.py
+CACHE = os.getenv("EQCONVERTER_CACHE", "memory")
+# generated presets on disk, see artifacts.py
+ARTIFACTS = os.getenv("EQCONVERTER_ARTIFACTS", "artifacts")
+ARTIFACTS_MAX = int(os.getenv("EQCONVERTER_ARTIFACTS_MAX_BYTES", str(ARTIFACTS_MAX_BYTES)))
+# internal nginx location of ARTIFACTS, empty when the backend sends the files
+ACCEL_REDIRECT = os.getenv("EQCONVERTER_ACCEL_REDIRECT", "")
+
 
 KNOWN_FORMATS = {"txt", "text", "aupreset"}
 
+# largest page of speakers, brands or eqs
+PAGE_MAX_LIMIT = 1000
+# rows read per query by the NDJSON export
+EXPORT_BATCH_SIZE = 1000
+
+# number of (eq, resolution) filter banks kept in memory
+GRAPH_CACHE_SIZE = 1024
+
 # ----------------------------------------------------------------------
 # data model
 # ----------------------------------------------------------------------
 
+# canonical hashes from iir2hash; EQs stored before them keep the blake2b
+# of the uploaded bytes, which is still accepted everywhere
+HASH_LENGTH = 2 * EQ_HASH_SIZE
+LEGACY_HASH_LENGTH = 128
+HASH_PATTERN = r"^(?:[a-z0-9]{%d}|[a-z0-9]{%d})$" % (HASH_LENGTH, LEGACY_HASH_LENGTH)
+
 HashStr = Annotated[
-    str, StringConstraints(min_length=128, max_length=128, pattern=r"[a-z0-9]+")
+    str,
+    msgspec.Meta(min_length=HASH_LENGTH, max_length=LEGACY_HASH_LENGTH, pattern=HASH_PATTERN),
 ]
 
 
 def check_hash(input: str) -> bool:
-    if len(input) != 128:
+    if len(input) not in (HASH_LENGTH, LEGACY_HASH_LENGTH):
         return False
-    return re.search("^[a-z0-9]+$", input)
+    return re.search(HASH_PATTERN, input)
+
 
+class EQ(msgspec.Struct, frozen=True, array_like=True):
+    """a row of the eqs table, encoded as [eq_hash, name, peq]
+
+    Constraints are checked by msgspec.convert, not by the constructor
+    which is used for rows read from the database.
+    """
 
-class EQ(BaseModel):
     eq_hash: HashStr
-    name: str = Field(min_length=5, max_length=64)
-    peq: str = Field(max_length=4096)
+    name: Annotated[str, msgspec.Meta(min_length=5, max_length=64)]
+    peq: Annotated[str, msgspec.Meta(max_length=4096)]
+
+
+class CountedConnection(sqlite3.Connection):
+    """a sqlite connection that reports to the metrics"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.closed = False
+        metrics.DB_CONNECTIONS.inc()
+        metrics.DB_CONNECTIONS_OPEN.inc()
+
+    def cursor(self, *args, **kwargs):
+        return super().cursor(*args, factory=CountedCursor)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            metrics.DB_CONNECTIONS_OPEN.dec()
+        super().close()
+
+
+class CountedCursor(sqlite3.Cursor):
+    def execute(self, *args, **kwargs):
+        metrics.DB_QUERIES.inc()
+        return super().execute(*args, **kwargs)
 
 
 def create_connection():
-    connection = sqlite3.connect("eqs.db")
+    connection = sqlite3.connect(DATABASE, factory=CountedConnection)
     return connection
 
 
+# one Database per process: a forked worker never uses the one of its parent
+_DATABASES: dict[int, Database] = {}
+
+
+def database() -> Database:
+    """async access to DATABASE for the routes, see database.py"""
+    pid = os.getpid()
+    current = _DATABASES.get(pid)
+    if current is None or current.path != DATABASE:
+        if current is not None:
+            current.close()
+        current = Database(
+            DATABASE,
+            factory=CountedConnection,
+            durability=DB_DURABILITY,
+            commit_delay=DB_COMMIT_DELAY_MS / 1000,
+            max_batch=DB_MAX_BATCH,
+        )
+        _DATABASES[pid] = current
+    return current
+
+
+def close_database() -> None:
+    current = _DATABASES.pop(os.getpid(), None)
+    if current is not None:
+        current.close()
+
+
 def create_table():
     connection = create_connection()
     cursor = connection.cursor()
@@ -99,46 +234,178 @@ def create_table():
         )
         """
     )
+    # tables created before listings were paginated have no created_at;
+    # their rows sort first
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(eqs)")]
+    if "created_at" not in columns:
+        cursor.execute("ALTER TABLE eqs ADD COLUMN created_at INTEGER NOT NULL DEFAULT 0")
+    for order, column in EQ_ORDERS.items():
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS eqs_{} ON eqs ({}, eq_hash)".format(order, column)
+        )
+    # what scripts/ingest.py last stored for each speaker of eqdata.json
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS eqdata_manifest (
+        speaker TEXT PRIMARY KEY,
+        digest TEXT NOT NULL,
+        eqs TEXT NOT NULL
+        )
+        """
+    )
     connection.commit()
     connection.close()
 
 
-def create_eq(eq: EQ) -> bool:
-    connection = create_connection()
+# created_at is in milliseconds since the epoch and kept on conflict
+EQ_UPSERT = (
+    "INSERT INTO eqs (eq_hash, name, peq, created_at) "
+    "VALUES (?, ?, ?, CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER)) "
+    "ON CONFLICT (eq_hash) DO UPDATE SET name=excluded.name"
+)
+
+
+def upsert_eqs(connection: sqlite3.Connection, eqs: list[EQ]) -> None:
     cursor = connection.cursor()
-    cursor.execute(
-        "INSERT INTO eqs (eq_hash, name, peq) VALUES (?, ?, ?) ON CONFLICT (eq_hash) DO UPDATE SET name=excluded.name",
-        (eq.eq_hash, eq.name, eq.peq),
-    )
-    connection.commit()
-    connection.close()
+    cursor.executemany(EQ_UPSERT, [(eq.eq_hash, eq.name, eq.peq) for eq in eqs])
+
+
+def select_peq(connection: sqlite3.Connection, eq_hash: str) -> tuple[str, str] | None:
+    cursor = connection.cursor()
+    return cursor.execute("SELECT name, peq FROM eqs WHERE eq_hash=?", (eq_hash,)).fetchone()
+
+
+def create_eq(eq: EQ) -> bool:
+    """store an EQ from a script or a test, routes use create_eqs_async"""
+    with stage("db"):
+        connection = create_connection()
+        upsert_eqs(connection, [eq])
+        connection.commit()
+        connection.close()
     return True
 
 
-def db_get_eqs() -> list[tuple[str, str]]:
-    connection = create_connection()
+async def create_eqs_async(eqs: list[EQ]) -> bool:
+    """store EQs in one write, committed with the other pending writes
+
+    Returns once the write is as durable as DB_DURABILITY asks.
+    """
+    with stage("db"):
+        await database().write(upsert_eqs, eqs)
+    return True
+
+
+# listing orders and the column they sort on, eq_hash breaks ties
+EQ_ORDERS = {"name": "name", "created": "created_at"}
+EqOrder = Literal["name", "created"]
+
+
+def encode_cursor(key: str | int, eq_hash: str) -> str:
+    """an opaque position after the row (key, eq_hash)"""
+    return base64.urlsafe_b64encode(dumps([key, eq_hash])).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> tuple[str | int, str] | None:
+    try:
+        key, eq_hash = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(key, (str, int)) or not isinstance(eq_hash, str):
+        return None
+    return key, eq_hash
+
+
+def select_eqs(connection: sqlite3.Connection, query: str, parameters: list) -> list[tuple]:
     cursor = connection.cursor()
-    results = cursor.execute("SELECT * from  eqs;").fetchall()
-    connection.commit()
-    connection.close()
-    return results
+    return cursor.execute(query, parameters).fetchall()
 
 
-def db_get_eq(eq_hash: str) -> tuple[str, IIR]:
-    connection = create_connection()
+def select_count(connection: sqlite3.Connection) -> int:
     cursor = connection.cursor()
+    (count,) = cursor.execute("SELECT COUNT(*) FROM eqs").fetchone()
+    return count
+
+
+async def db_list_eqs(
+    order: EqOrder,
+    limit: int,
+    after: tuple[str | int, str] | None = None,
+    *,
+    peq: bool = False,
+) -> list[tuple]:
+    """rows (eq_hash, name, created_at[, peq]) after a position, by index
+
+    Keyset pagination: the cost of a page does not depend on how far it is.
+    """
+    column = EQ_ORDERS[order]
+    columns = "eq_hash, name, created_at, peq" if peq else "eq_hash, name, created_at"
+    query = "SELECT {} FROM eqs".format(columns)  # noqa: S608
+    parameters = []
+    if after is not None:
+        query += " WHERE ({}, eq_hash) > (?, ?)".format(column)
+        parameters.extend(after)
+    query += " ORDER BY {0}, eq_hash LIMIT ?".format(column)
+    parameters.append(limit)
+    with stage("db"):
+        return await database().read(select_eqs, query, parameters)
+
+
+async def db_count_eqs() -> int:
+    with stage("db"):
+        return await database().read(select_count)
+
+
+def row_position(order: EqOrder, row: tuple) -> tuple[str | int, str]:
+    eq_hash, name, created_at = row[:3]
+    return (name if order == "name" else created_at), eq_hash
+
+
+def eq_listing(row: tuple) -> dict:
+    listing = {"hash": row[0], "name": row[1], "created_at": row[2]}
+    if len(row) > 3:
+        listing["peq"] = row[3]
+    return listing
+
+
+def parse_peq(serialized: str) -> IIR:
+    with stage("parse"):
+        return ast.literal_eval(serialized)
+
+
+def db_find_eq(eq_hash: str) -> tuple[str, IIR] | None:
     if not check_hash(eq_hash):
-        return "error", []
-    results = cursor.execute(
-        "SELECT name, peq from eqs where eq_hash='{}';".format(eq_hash)  # noqa: S608
-    ).fetchone()
-    connection.commit()
-    connection.close()
+        return None
+    with stage("db"):
+        connection = create_connection()
+        results = select_peq(connection, eq_hash)
+        connection.close()
     if not results:
-        return "error", []
+        return None
     name, serialized = results
-    iir = ast.literal_eval(serialized)
-    return name, iir
+    return name, parse_peq(serialized)
+
+
+async def db_find_peq_async(eq_hash: str) -> tuple[str, str] | None:
+    """name and serialized IIR of the EQ, read without blocking the loop"""
+    if not check_hash(eq_hash):
+        return None
+    with stage("db"):
+        return await database().read(select_peq, eq_hash)
+
+
+async def db_find_eq_async(eq_hash: str) -> tuple[str, IIR] | None:
+    found = await db_find_peq_async(eq_hash)
+    if found is None:
+        return None
+    name, serialized = found
+    return name, parse_peq(serialized)
+
+
+def db_get_eq(eq_hash: str) -> tuple[str, IIR]:
+    found = db_find_eq(eq_hash)
+    if found is None:
+        return "error", []
+    return found
 
 
 # ----------------------------------------------------------------------
@@ -146,24 +413,91 @@ def db_get_eq(eq_hash: str) -> tuple[str, IIR]:
 # ----------------------------------------------------------------------
 
 
+def load_packed() -> PackedCatalog | None:
+    """the shared catalog when there is an up to date one"""
+    if not PACKED:
+        return None
+    return packed_catalog(PACKED)
+
+
 def load_metadata():
+    packed = load_packed()
+    if packed is not None:
+        yield packed.metadata
+        return
+
     if not os.path.exists(METADATA):
         logging.error("Cannot find %s", METADATA)
         sys.exit(1)
 
-    with open(METADATA, "r", encoding="utf8") as f:
+    with stage("load"), open(METADATA, "r", encoding="utf8") as f:
         metadata = json.load(f)
-        yield metadata
+    yield metadata
+
 
+def load_eqdata() -> EqdataIndex | PackedEntries:
+    packed = load_packed()
+    if packed is not None:
+        return packed.eqdata
 
-def load_eqdata():
     if not os.path.exists(EQDATA):
         logging.error("Cannot find %s", EQDATA)
         sys.exit(1)
 
-    with open(EQDATA, "r", encoding="utf8") as f:
-        eqdata = json.load(f)
-        yield eqdata
+    with stage("load"):
+        return eqdata_index(EQDATA)
+
+
+def load_index() -> SpeakerIndex | PackedCatalog:
+    packed = load_packed()
+    if packed is not None:
+        return packed
+
+    if not os.path.exists(METADATA):
+        logging.error("Cannot find %s", METADATA)
+        sys.exit(1)
+
+    with stage("load"):
+        return speaker_index(METADATA)
+
+
+def json_response(content, headers: dict[str, str] | None = None) -> FastJSONResponse:
+    with stage("serialize"):
+        return FastJSONResponse(content=content, headers=headers)
+
+
+RENDER_CACHE = cache_from_url(CACHE)
+
+
+def render_key(kind: str, *args) -> str:
+    """cache key of a rendered body, a new version invalidates all of them"""
+    return "/".join((RENDER_KEY_VERSION, kind, *(str(arg) for arg in args)))
+
+
+async def cached_response(
+    key: str, media_type: str, render: Callable[[], Awaitable[tuple[Response, bool]]]
+) -> Response:
+    """the cached body for key, or the rendered one, cached if render allows it
+
+    render returns the response and whether it may be cached: bodies for
+    unknown hashes are not, the EQ may be uploaded later.
+    """
+    try:
+        with stage("cache"):
+            (body,) = await RENDER_CACHE.get_many([key])
+    except CacheUnavailableError as e:
+        logging.warning("Render cache unavailable: %s", e)
+        body = None
+    if body is not None:
+        return Response(content=body, media_type=media_type)
+    response, cacheable = await render()
+    if cacheable:
+        try:
+            with stage("cache"):
+                await RENDER_CACHE.set_many({key: response.body})
+        except CacheUnavailableError as e:
+            logging.warning("Render cache unavailable: %s", e)
+    return response
 
 
 # ----------------------------------------------------------------------
@@ -174,8 +508,58 @@ backend = FastAPI(
     title="EQ Converter API",
     version=SOFTWARE_VERSION,
     on_startup=[load_metadata],
+    on_shutdown=[close_database],
+    default_response_class=FastJSONResponse,
 )
 
+metrics.register_cache("convert", convert_cache_info)
+metrics.register_cache("freq_grid", peq_freq_grid.cache_info)
+metrics.register_cache("speaker_index", speaker_index_cache_info)
+metrics.register_cache("eqdata_index", eqdata_index_cache_info)
+metrics.register_cache("eqdata_entry", eqdata_entry_cache_info)
+metrics.register_cache("packed", packed_cache_info)
+metrics.register_cache("render", RENDER_CACHE.cache_info)
+
+
+@backend.middleware("http")
+async def record_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    with metrics.request_stages() as stages:
+        try:
+            response = await call_next(request)
+            status = response.status_code
+        finally:
+            route = request.scope.get("route")
+            metrics.observe_request(
+                request.method,
+                route.path if route is not None else "unmatched",
+                status,
+                time.perf_counter() - start,
+                stages,
+            )
+    return response
+
+
+@backend.middleware("http")
+async def profile_requests(request: Request, call_next):
+    mode = profiling.wanted(request.url.path, request.headers.get(profiling.HEADER))
+    if mode is None:
+        return await call_next(request)
+    with profiling.profiled(
+        "{} {}".format(request.method, request.url.path), mode
+    ) as result:
+        response = await call_next(request)
+    if result.path is not None:
+        response.headers[profiling.HEADER] = result.profile_id
+    return response
+
+
+@backend.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
 origins = []
 
 if ENV == "dev":
@@ -189,14 +573,40 @@ if ENV == "dev":
     )
 
 
+PageLimit = Annotated[int | None, Query(ge=1, le=PAGE_MAX_LIMIT)]
+PageOffset = Annotated[int, Query(ge=0)]
+
+
 @backend.get(f"/{API_VERSION}/brands", tags=["Speaker Anechoic EQ"])
-async def get_brand_list(metadata: dict = Depends(load_metadata)):  # noqa: B008
-    return sorted({v.get("brand") for _, v in metadata.items()})
+async def get_brand_list(
+    prefix: str = "",
+    limit: PageLimit = None,
+    offset: PageOffset = 0,
+    index: SpeakerIndex | PackedCatalog = Depends(load_index),  # noqa: B008
+):
+    """sorted brands, optionally starting with prefix (ignoring case)
+
+    X-Total-Count gives the number of matches before pagination.
+    """
+    content = index.brands.search(prefix, limit, offset)
+    headers = {"X-Total-Count": str(index.brands.count(prefix))}
+    return json_response(content, headers)
 
 
 @backend.get(f"/{API_VERSION}/speakers", tags=["Speaker Anechoic EQ"])
-async def get_speaker_list(metadata: dict = Depends(load_metadata)):  # noqa: B008
-    return sorted(metadata.keys())
+async def get_speaker_list(
+    prefix: str = "",
+    limit: PageLimit = None,
+    offset: PageOffset = 0,
+    index: SpeakerIndex | PackedCatalog = Depends(load_index),  # noqa: B008
+):
+    """sorted speakers, optionally starting with prefix (ignoring case)
+
+    X-Total-Count gives the number of matches before pagination.
+    """
+    content = index.speakers.search(prefix, limit, offset)
+    headers = {"X-Total-Count": str(index.speakers.count(prefix))}
+    return json_response(content, headers)
 
 
 @backend.get(
@@ -205,11 +615,10 @@ async def get_speaker_list(metadata: dict = Depends(load_metadata)):  # noqa: B0
 )
 async def get_speaker_metadata(
     speaker_name: str,
-    metadata: dict = Depends(load_metadata),  # noqa: B008
+    metadata: dict | PackedEntries = Depends(load_metadata),  # noqa: B008
 ):
     content = metadata.get(speaker_name, {"error": "Speaker not found"})
-    encoded = jsonable_encoder(content)
-    return JSONResponse(content=encoded)
+    return json_response(content)
 
 
 @backend.get(
@@ -218,207 +627,498 @@ async def get_speaker_metadata(
 )
 async def get_speaker_eqdata(
     speaker_name: str,
-    eqdata: dict = Depends(load_eqdata),  # noqa: B008
+    eqdata: EqdataIndex | PackedEntries = Depends(load_eqdata),  # noqa: B008
 ):
-    content = eqdata.get(speaker_name, {"error": "Speaker not found"})
+    with stage("load"):
+        content = eqdata.get(speaker_name, {"error": "Speaker not found"})
     flat = []
+    rows = []
     if "eqs" in content:
         for key in content["eqs"]:
             eq = content["eqs"][key]
-            lines = [
-                "{} {}".format(eq["display_name"], eq["filename"]),
-                "\n",
-                "Preamp gain: {:+3.1f}".format(float(eq["preamp_gain"])),
-            ]
-            for i, iir in enumerate(eq["peq"]):
-                iir_type = Biquad.type2name[iir["type"]][1]
-                iir_freq = int(iir["freq"])
-                iir_q = float(iir["Q"])
-                iir_gain = float(iir["dbGain"])
-                lines.append(
-                    "Filter {:2d} ON {:s} Fc {:d} Hz Gain {:4.1f} dB Q {:4.2f}".format(
-                        i,
-                        iir_type,
-                        iir_freq,
-                        iir_gain,
-                        iir_q,
-                    )
-                )
-            lines.append("\n")
-            buffer = "\n".join(lines).encode(encoding="utf-8")
-            success, hash_or_msg = store_eq(speaker_name, buffer)
+            text = spin_eq2text(eq)
+            success, eq_or_msg = parse_eq(speaker_name, text.encode(encoding="utf-8"))
             if not success:
-                raise HTTPException(status_code=500, detail=hash_or_msg)
-            eq["hash"] = hash_or_msg
+                raise HTTPException(status_code=500, detail=eq_or_msg)
+            rows.append(eq_or_msg)
             flat.append(
                 {
-                    "hash": hash_or_msg,
-                    "eq": "\n".join(lines),
+                    "hash": eq_or_msg.eq_hash,
+                    "eq": text,
                     "display_name": eq["display_name"],
                     "name": key,
                 }
             )
-    encoded = jsonable_encoder(flat)
-    return JSONResponse(content=encoded)
+    if rows:
+        # the speaker's EQs in one write
+        await create_eqs_async(rows)
+    return json_response(flat)
 
 
 def eq2hash(buffer: bytes) -> str:
+    """the canonical hash of an EQ file, empty if it does not parse"""
+    success, iir = lines2iir(buffer.decode("utf-8").split("\n"))
+    if not success:
+        return ""
+    return iir2hash(iir)
+
+
+def eq2legacy_hash(buffer: bytes) -> str:
+    """the hash of EQs stored before canonical hashing"""
     return hashlib.blake2b(buffer).hexdigest()
 
 
-def store_eq(filename: str, buffer: bytes) -> tuple[bool, str]:
+def parse_eq(filename: str, buffer: bytes) -> tuple[bool, EQ | str]:
+    """the row to store for an uploaded EQ, or an error message"""
     input = buffer.decode("utf-8")
     if not input or len(input) == 0:
         return False, "There was an error parsing the file: buffer decoding"
     lines = input.split("\n")
     if not lines or len(lines) == 0:
         return False, "There was an error parsing the file: buffer splitting"
-    success, iir = lines2iir(lines)
+    return parse_eq_lines(filename, lines)
+
+
+def parse_eq_lines(filename: str, lines: list[str]) -> tuple[bool, EQ | str]:
+    with stage("parse"):
+        success, iir = lines2iir(lines)
     if not success:
         return False, "There was an error parsing the file as an EQ"
-    eq_hash = eq2hash(buffer)
+    eq_hash = iir2hash(iir)
     if not eq_hash:
         return (
             False,
             "There was an error computing the hash failed",
         )
     name = filename if filename else "eq"
-    eq = EQ(eq_hash=eq_hash, name=name, peq=str(iir))
+    try:
+        return True, msgspec.convert([eq_hash, name, str(iir)], EQ)
+    except msgspec.ValidationError as e:
+        return False, "There was an error with the EQ: {}".format(e)
+
+
+def store_eq(filename: str, buffer: bytes) -> tuple[bool, str]:
+    success, eq_or_msg = parse_eq(filename, buffer)
+    if not success:
+        return False, eq_or_msg
+    eq = eq_or_msg
     success = create_eq(eq)
     if not success:
         return False, "Failed to save peq"
-    return True, eq_hash
+    return True, eq.eq_hash
+
+
+UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": [UPLOAD_FIELD],
+                    "properties": {
+                        UPLOAD_FIELD: {
+                            "type": "array",
+                            "items": {"type": "string", "format": "binary"},
+                        }
+                    },
+                }
+            }
+        },
+    }
+}
+
+
+def upload_failed(message: str) -> dict:
+    return {"status": "failed", "message": message, "hash": None}
 
 
-@backend.post(f"/{API_VERSION}/eq/upload", tags=["EQ"])
-async def upload_eq(files: list[UploadFile]):
+@backend.post(f"/{API_VERSION}/eq/upload", tags=["EQ"], openapi_extra=UPLOAD_OPENAPI)
+async def upload_eq(request: Request):
+    """store the uploaded EQ files, one status per file
+
+    The body is parsed while it arrives, see uploads.py for the limits.
+    """
+    try:
+        uploads = await read_uploads(request.headers, request.stream())
+    except UploadRejectedError as e:
+        raise HTTPException(status_code=e.status, detail=str(e)) from e
     content = []
-    for file in files:
-        hash_or_msg: str = ""
-        try:
-            buffer = await file.read()
-            if not buffer or len(buffer) == 0:
-                content.append(
-                    {
-                        "status": "failed",
-                        "message": "There was an error parsing the file: buffer looks empty",
-                        "hash": None,
-                    }
-                )
-                continue
-            if file.filename is None:
-                content.append(
-                    {
-                        "status": "failed",
-                        "message": "There was an error with the name of the file",
-                        "hash": None,
-                    }
-                )
-                continue
-            success, hash_or_msg = store_eq(file.filename, buffer)
-            if not success:
-                content.append(
-                    {
-                        "status": "failed",
-                        "message": hash_or_msg,
-                        "hash": None,
-                    }
-                )
-                continue
-        except Exception as e:
-            content.append(
-                {
-                    "status": "failed",
-                    "message": "There was an error uploading the file {}".format(
-                        e
-                    ),
-                    "hash": None,
-                }
-            )
+    rows = []
+    for filename, lines in uploads:
+        if filename is None:
+            content.append(upload_failed("There was an error with the name of the file"))
             continue
-        await file.close()
-        content.append(
-            {
-                "status": "ok",
-                "name": file.filename,
-                "hash": hash_or_msg,
-            }
-        )
-    return content
+        success, lines_or_msg = lines.result()
+        if not success:
+            content.append(upload_failed(lines_or_msg))
+            continue
+        success, eq_or_msg = parse_eq_lines(filename, lines_or_msg)
+        if not success:
+            content.append(upload_failed(eq_or_msg))
+            continue
+        rows.append(eq_or_msg)
+        content.append({"status": "ok", "name": filename, "hash": eq_or_msg.eq_hash})
+    if rows:
+        # the files of a request in one write
+        try:
+            await create_eqs_async(rows)
+        except sqlite3.Error as e:
+            failed = upload_failed("There was an error uploading the file {}".format(e))
+            content = [failed if item["status"] == "ok" else item for item in content]
+    return json_response(content)
+
+
+def eq_cursor(cursor: str | None) -> tuple[str | int, str] | None:
+    if cursor is None:
+        return None
+    after = decode_cursor(cursor)
+    if after is None:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return after
 
 
 @backend.get(f"/{API_VERSION}/eqs", tags=["EQ"])
-async def get_eqs():
-    content = db_get_eqs()
-    encoded = jsonable_encoder(content)
-    return JSONResponse(content=encoded)
+async def get_eqs(
+    order: EqOrder = "created",
+    limit: Annotated[int, Query(ge=1, le=PAGE_MAX_LIMIT)] = 100,
+    cursor: str | None = None,
+    *,
+    peq: bool = False,
+):
+    """a page of uploaded EQs, by name or by upload time
+
+    X-Next-Cursor, absent on the last page, is the cursor of the next page.
+    """
+    rows = await db_list_eqs(order, limit, eq_cursor(cursor), peq=peq)
+    headers = {}
+    if len(rows) == limit:
+        headers["X-Next-Cursor"] = encode_cursor(*row_position(order, rows[-1]))
+    return json_response([eq_listing(row) for row in rows], headers)
+
+
+@backend.get(f"/{API_VERSION}/eqs/count", tags=["EQ"])
+async def get_eqs_count():
+    return json_response({"count": await db_count_eqs()})
+
+
+@backend.get(f"/{API_VERSION}/eqs/export", tags=["EQ"])
+async def get_eqs_export(order: EqOrder = "created", cursor: str | None = None):
+    """every EQ with its peq as NDJSON, one line per EQ
+
+    Rows are read in batches, each in its own short query, so the export
+    holds neither the table nor a lock.
+    """
+    after = eq_cursor(cursor)
+
+    async def lines():
+        position = after
+        while True:
+            rows = await db_list_eqs(order, EXPORT_BATCH_SIZE, position, peq=True)
+            if rows:
+                yield b"".join(dumps(eq_listing(row)) + b"\n" for row in rows)
+            if len(rows) < EXPORT_BATCH_SIZE:
+                return
+            position = row_position(order, rows[-1])
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@backend.get(f"/{API_VERSION}/targets", tags=["EQ"])
+async def get_targets():
+    content = [target.capabilities() for target in TARGETS.values()]
+    return json_response(content)
+
+
+async def convert_async(name: str, iirs: list[IIR], title: str) -> tuple[bool, str]:
+    """convert() on a worker thread
+
+    An EQ that does not fit on a constrained target is fitted, which takes
+    about 100 ms per channel: not on the event loop.
+    """
+    with stage("convert"):
+        return await asyncio.to_thread(convert, name, iirs, title)
+
+
+async def known_eq(eq_hash: str) -> tuple[str, IIR, bool]:
+    """name and IIR of the EQ, and whether it exists"""
+    found = await db_find_eq_async(eq_hash)
+    if found is None:
+        return "error", [], False
+    name, iir = found
+    return name, iir, True
+
+
+async def named_eq(eq_hash: str) -> tuple[str, str | None]:
+    """name and serialized IIR of the EQ, None when it does not exist
+
+    Bodies that show the name are keyed on it too: EQs with the same
+    filters share a hash but not always a name.
+    """
+    found = await db_find_peq_async(eq_hash)
+    if found is None:
+        return "error", None
+    return found
 
 
 @backend.get(f"/{API_VERSION}/eq/target/aupreset", tags=["EQ"])
 async def get_eq_aupreset(eq_hash: str):
-    name, iir = db_get_eq(eq_hash)
-    content = iir2aupreset(iir, name)
-    encoded = jsonable_encoder(content)
-    return JSONResponse(content=encoded)
+    name, serialized = await named_eq(eq_hash)
+
+    async def render():
+        iir = [] if serialized is None else parse_peq(serialized)
+        content = await convert_async("aupreset", [iir], name)
+        return json_response(content), serialized is not None
+
+    return await cached_response(
+        render_key("aupreset", eq_hash, name2hash(name)), "application/json", render
+    )
 
 
 @backend.get(f"/{API_VERSION}/eq/target/apo", tags=["EQ"])
 async def get_eq_apo(eq_hash: str):
-    name, iir = db_get_eq(eq_hash)
-    peq = iir2peq(iir)
-    content = peq_format_apo(comment=name, peq=peq)
-    encoded = jsonable_encoder(content)
-    return JSONResponse(content=encoded)
+    name, serialized = await named_eq(eq_hash)
+
+    async def render():
+        iir = [] if serialized is None else parse_peq(serialized)
+        _, content = await convert_async("apo", [iir], name)
+        return json_response(content), serialized is not None
+
+    return await cached_response(
+        render_key("apo", eq_hash, name2hash(name)), "application/json", render
+    )
 
 
 @backend.get(f"/{API_VERSION}/eq/target/rme_totalmix_channel", tags=["EQ"])
 async def get_eq_rme_totalmix_channel(eq_hash: str):
-    _, iir = db_get_eq(eq_hash)
-    success, content = iir2rme_totalmix_channel(iir)
-    if not success:
-        print(content)
-        raise HTTPException(status_code=500, detail=iir)
-    encoded = jsonable_encoder(content)
-    return JSONResponse(content=encoded)
+    async def render():
+        name, iir, known = await known_eq(eq_hash)
+        success, content = await convert_async("rme_totalmix_channel", [iir], name)
+        if not success:
+            print(content)
+            raise HTTPException(status_code=500, detail=iir)
+        return json_response(content), known
+
+    return await cached_response(
+        render_key("rme_totalmix_channel", eq_hash), "application/json", render
+    )
 
 
 @backend.get(f"/{API_VERSION}/eq/target/rme_totalmix_room", tags=["EQ"])
 async def get_eq_rme_totalmix_room(eq_hash_left: str, eq_hash_right: str):
-    _, iir_left = db_get_eq(eq_hash_left)
-    iir_right = iir_left
-    if eq_hash_right != "":
-        _, iir_right = db_get_eq(eq_hash_right)
-    success, content = iir2rme_totalmix_room(iir_left, iir_right)
-    if not success:
-        raise HTTPException(
-            status_code=500, detail="{} {}".format(iir_left, iir_right)
+    async def render():
+        name, iir_left, known = await known_eq(eq_hash_left)
+        iir_right = iir_left
+        if eq_hash_right != "":
+            _, iir_right, known_right = await known_eq(eq_hash_right)
+            known = known and known_right
+        success, content = await convert_async(
+            "rme_totalmix_room", [iir_left, iir_right], name
         )
-    encoded = jsonable_encoder(content)
-    return JSONResponse(content=encoded)
+        if not success:
+            raise HTTPException(
+                status_code=500, detail="{} {}".format(iir_left, iir_right)
+            )
+        return json_response(content), known
+
+    return await cached_response(
+        render_key("rme_totalmix_room", eq_hash_left, eq_hash_right),
+        "application/json",
+        render,
+    )
+
+
+ARTIFACT_STORE = ArtifactStore(ARTIFACTS, ARTIFACTS_MAX)
+
+
+def content_disposition(filename: str) -> str:
+    quoted = urllib.parse.quote(filename)
+    if quoted == filename:
+        return 'attachment; filename="{}"'.format(filename)
+    return "attachment; filename*=utf-8''{}".format(quoted)
+
+
+@backend.get(f"/{API_VERSION}/eq/download/{{target_name}}", tags=["EQ"])
+async def download_eq(target_name: str, eq_hash: str, eq_hash_right: str = ""):
+    """the EQ converted to a target, as a file
+
+    Files are generated once and kept in the artifact store; behind nginx
+    the body is sent by nginx (X-Accel-Redirect). Two channel targets use
+    eq_hash_right for the right channel, or the left EQ when it is empty.
+    """
+    target = get_target(target_name)
+    if target is None:
+        raise HTTPException(status_code=404, detail="Unknown target")
+    name, iir, known = await known_eq(eq_hash)
+    if not known:
+        raise HTTPException(status_code=404, detail="Unknown EQ")
+    iirs = [iir]
+    # presets show the name, EQs with the same filters share the hash
+    params = (("name", name2hash(name)),)
+    if target.max_channels > 1:
+        iir_right = iir
+        if eq_hash_right != "":
+            _, iir_right, known = await known_eq(eq_hash_right)
+            if not known:
+                raise HTTPException(status_code=404, detail="Unknown EQ")
+            params += (("right", eq_hash_right),)
+        iirs.append(iir_right)
+    key = ArtifactKey(eq_hash, target.name, target.extension, RENDER_KEY_VERSION, params)
+
+    path = ARTIFACT_STORE.get(key)
+    background = None
+    if path is None:
+        success, content = await convert_async(target.name, iirs, name)
+        if not success:
+            raise HTTPException(status_code=500, detail=content)
+        path = ARTIFACT_STORE.put(key, content.encode("utf-8"))
+        if ARTIFACT_STORE.sweep_due():
+            background = BackgroundTask(ARTIFACT_STORE.sweep)
+
+    filename = "{}.{}".format(pathlib.PurePath(name).stem or "eq", target.extension)
+    if ACCEL_REDIRECT:
+        return Response(
+            media_type=target.media_type,
+            headers={
+                "Content-Disposition": content_disposition(filename),
+                "X-Accel-Redirect": ACCEL_REDIRECT + key.relative_path(),
+            },
+            background=background,
+        )
+    return FileResponse(
+        path, media_type=target.media_type, filename=filename, background=background
+    )
+
+
+def graph_response(
+    freq: np.ndarray, curves: np.ndarray, fmt: str, precision: int | None
+) -> tuple[np.ndarray, np.ndarray] | Response:
+    """the binary payload, or the arrays to put in a json response"""
+    if fmt == "json":
+        return graph_round(freq, curves, precision)
+    with stage("serialize"):
+        return Response(
+            content=graph_encode(freq, curves, fmt), media_type=GRAPH_MEDIA_TYPE
+        )
+
+
+GraphPoints = Annotated[
+    int, Query(ge=GRAPH_MIN_POINTS, le=GRAPH_MAX_POINTS)
+]
+GraphFormat = Annotated[Literal[GRAPH_FORMATS], Query(alias="format")]
+GraphPrecision = Annotated[int | None, Query(ge=0, le=GRAPH_MAX_PRECISION)]
+
+
+async def cached_graph(
+    kind: str,
+    eq_hash: str,
+    points: int,
+    fmt: str,
+    precision: int | None,
+    render: Callable[[np.ndarray], Response],
+) -> Response:
+    """a graph response rendered from the filter bank of the EQ"""
+
+    async def render_bank():
+        bank = await filter_bank(eq_hash, points)
+        # an empty bank is an unknown hash
+        return render(bank), bank.shape[0] > 0
+
+    media_type = "application/json" if fmt == "json" else GRAPH_MEDIA_TYPE
+    key = render_key(kind, eq_hash, points, fmt, precision)
+    return await cached_response(key, media_type, render_bank)
+
+
+@functools.lru_cache(maxsize=GRAPH_CACHE_SIZE)
+def peq_filter_bank(serialized: str, points: int) -> np.ndarray:
+    """SPL of each filter of a stored EQ, one row per filter, read only
+
+    Keyed by the stored IIR: the same EQ gives the same bank whatever its
+    hash, and the read of the row stays off the event loop.
+    """
+    iir = parse_peq(serialized)
+    with stage("dsp"):
+        bank = peq_bank(peq_freq_grid(points), iir2peq(iir))
+    bank.flags.writeable = False
+    return bank
+
+
+async def filter_bank(eq_hash: str, points: int) -> np.ndarray:
+    """the bank of an EQ, empty for unknown hashes"""
+    packed = load_packed()
+    if packed is not None and points == packed.banks.points:
+        # catalog EQs, computed once for all the workers
+        bank = packed.banks.get(eq_hash)
+        if bank is not None:
+            return bank
+    found = await db_find_peq_async(eq_hash)
+    if found is None:
+        return np.zeros((0, points))
+    return peq_filter_bank(found[1], points)
+
+
+metrics.register_cache("filter_bank", peq_filter_bank.cache_info)
+
+
+@backend.get(f"/{API_VERSION}/eq/graph", tags=["EQ"])
+async def get_eq_graph(
+    eq_hash: str,
+    points: GraphPoints = GRAPH_DEFAULT_POINTS,
+    fmt: GraphFormat = "json",
+    precision: GraphPrecision = None,
+):
+    """SPL of the EQ and of each of its filters
+
+    The binary format has the total as first curve, then one per filter.
+    """
+
+    def render(bank):
+        with stage("dsp"):
+            curves = graph_curves(bank)
+        graph = graph_response(peq_freq_grid(points), curves, fmt, precision)
+        if isinstance(graph, Response):
+            return graph
+        return json_response(graph_content(*graph))
+
+    return await cached_graph("graph", eq_hash, points, fmt, precision, render)
 
 
 @backend.get(f"/{API_VERSION}/eq/graph_spl", tags=["EQ"])
-async def get_eq_graph_spl(eq_hash: str):
-    _, iir = db_get_eq(eq_hash)
-    peq = iir2peq(iir)
-    freq = np.logspace(1 + math.log10(2), 4 + math.log10(2), 200)
-    spl = peq_build(freq, peq)
-    content = {"freq": freq.tolist(), "spl": spl.tolist()}
-    encoded = jsonable_encoder(content)
-    return JSONResponse(content=encoded)
+async def get_eq_graph_spl(
+    eq_hash: str,
+    points: GraphPoints = GRAPH_DEFAULT_POINTS,
+    fmt: GraphFormat = "json",
+    precision: GraphPrecision = None,
+):
+
+    def render(bank):
+        spl = bank.sum(axis=0)
+        graph = graph_response(peq_freq_grid(points), spl[np.newaxis, :], fmt, precision)
+        if isinstance(graph, Response):
+            return graph
+        freq_values, (spl_values,) = graph
+        return json_response(graph_spl_content(freq_values, spl_values))
+
+    return await cached_graph("graph_spl", eq_hash, points, fmt, precision, render)
 
 
 @backend.get(f"/{API_VERSION}/eq/graph_spl_details", tags=["EQ"])
-async def get_eq_graph_spl_details(eq_hash: str):
-    _, iir = db_get_eq(eq_hash)
-    peq = iir2peq(iir)
-    freq = np.logspace(1 + math.log10(2), 4 + math.log10(2), 200)
-    spl = {}
-    for i, iir in enumerate(peq):
-        spl[i] = peq_build(freq, [iir]).tolist()
-    content = {"freq": freq.tolist(), "spl": spl}
-    encoded = jsonable_encoder(content)
-    return JSONResponse(content=encoded)
+async def get_eq_graph_spl_details(
+    eq_hash: str,
+    points: GraphPoints = GRAPH_DEFAULT_POINTS,
+    fmt: GraphFormat = "json",
+    precision: GraphPrecision = None,
+):
+
+    def render(bank):
+        graph = graph_response(peq_freq_grid(points), bank, fmt, precision)
+        if isinstance(graph, Response):
+            return graph
+        return json_response(graph_spl_details_content(*graph))
+
+    return await cached_graph(
+        "graph_spl_details", eq_hash, points, fmt, precision, render
+    )
 
 
 if __name__ == "__main__":
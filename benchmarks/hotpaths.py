@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Micro benchmarks for the DSP and converter hot paths.
+
+Usage:
+    python3 -m benchmarks.hotpaths              compare with the baseline
+    python3 -m benchmarks.hotpaths --save       record a new baseline
+    python3 -m benchmarks.hotpaths -k peq_build only run matching benchmarks
+
+Each benchmark reports the best time per call over a few repeats. A
+benchmark regresses when it is slower than threshold times its baseline;
+the exit code is then 1. Regressions against a baseline recorded on
+another host, python or numpy are only reported as a warning.
+"""
+
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import pathlib
+import platform
+import sys
+import timeit
+from collections.abc import Callable
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from iir.filter_iir import Biquad
+from iir.filter_peq import (
+    peq_bank,
+    peq_batch,
+    peq_build,
+    peq_freq_grid,
+    peq_preamp_gain,
+    peq_preamp_gain_conservative,
+)
+from converter import (
+    iir2aupreset,
+    iir2data,
+    iir2peq,
+    iir2rme_totalmix_channel,
+    iir2rme_totalmix_room,
+    lines2iir,
+    rme_totalmix_channel_render,
+    rme_totalmix_room_render,
+)
+
+BASE_DIR = pathlib.Path(__file__).resolve().parent.parent
+BASELINE = BASE_DIR / "benchmarks" / "baseline.json"
+
+# slower than THRESHOLD times the baseline is a regression
+THRESHOLD = 1.5
+# each repeat runs the benchmark for at least that many seconds
+MIN_TIME = 0.1
+REPEAT = 7
+
+SYNTHETIC_BANDS = (1, 4, 16, 64)
+# about the size of the spinorama catalog
+SYNTHETIC_CATALOG = 2000
+
+# name -> setup, the setup returns the function to time
+BENCHMARKS: dict[str, Callable[[], Callable[[], object]]] = {}
+
+
+def benchmark(name: str):
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+
+    return register
+
+
+# ----------------------------------------------------------------------
+# inputs
+# ----------------------------------------------------------------------
+
+
+def corpus_lines() -> list[list[str]]:
+    lines = []
+    for filename in sorted(glob.glob(str(BASE_DIR / "examples_rews" / "*.txt"))):
+        with open(filename, "r", encoding="utf-8") as fd:
+            lines.append(fd.readlines())
+    return lines
+
+
+def corpus_iirs() -> list[list]:
+    return [lines2iir(lines)[1] for lines in corpus_lines()]
+
+
+def synthetic_iir(n_bands: int, seed: int = 0) -> list:
+    """a deterministic EQ with n_bands peaks spread over the audio range"""
+    rng = np.random.default_rng(seed)
+    freqs = np.geomspace(30, 16000, n_bands) if n_bands > 1 else [1000.0]
+    return [
+        {
+            "type": "PK",
+            "freq": float(round(freq, 1)),
+            "gain": float(round(rng.uniform(-6, 6), 1)),
+            "width": float(round(rng.uniform(0.2, 2.0), 2)),
+        }
+        for freq in freqs
+    ]
+
+
+def synthetic_lines(n_bands: int) -> list[str]:
+    """the same EQ in APO text format"""
+    lines = ["Preamp: -6.0 dB\n"]
+    for i, iir in enumerate(synthetic_iir(n_bands)):
+        lines.append(
+            "Filter {}: ON PK Fc {} Hz Gain {} dB BW Oct {}\n".format(
+                i + 1, iir["freq"], iir["gain"], iir["width"]
+            )
+        )
+    return lines
+
+
+# ----------------------------------------------------------------------
+# DSP
+# ----------------------------------------------------------------------
+
+
+@benchmark("biquad_init")
+def setup_biquad_init():
+    return lambda: Biquad(Biquad.PEAK, 1000.0, 48000, 1.0, 3.0)
+
+
+@benchmark("np_log_result")
+def setup_np_log_result():
+    biquad = Biquad(Biquad.PEAK, 1000.0, 48000, 1.0, 3.0)
+    freq = peq_freq_grid(1000)
+    return lambda: biquad.np_log_result(freq)
+
+
+@benchmark("np_log_result[f32]")
+def setup_np_log_result_f32():
+    biquad = Biquad(Biquad.PEAK, 1000.0, 48000, 1.0, 3.0)
+    freq = peq_freq_grid(1000)
+    return lambda: biquad.np_log_result(freq, np.float32)
+
+
+def _register_peq(n_bands: int):
+    @benchmark(f"peq_build[{n_bands}]")
+    def setup_peq_build():
+        peq = iir2peq(synthetic_iir(n_bands))
+        freq = peq_freq_grid(1000)
+        return lambda: peq_build(freq, peq)
+
+    @benchmark(f"peq_bank[{n_bands}]")
+    def setup_peq_bank():
+        peq = iir2peq(synthetic_iir(n_bands))
+        freq = peq_freq_grid(200)
+        return lambda: peq_bank(freq, peq)
+
+    @benchmark(f"peq_preamp_gain[{n_bands}]")
+    def setup_peq_preamp_gain():
+        peq = iir2peq(synthetic_iir(n_bands))
+        return lambda: peq_preamp_gain(peq)
+
+    @benchmark(f"peq_preamp_gain_conservative[{n_bands}]")
+    def setup_peq_preamp_gain_conservative():
+        peq = iir2peq(synthetic_iir(n_bands))
+        return lambda: peq_preamp_gain_conservative(peq)
+
+
+def synthetic_catalog() -> list:
+    """SYNTHETIC_CATALOG peqs of 1 to 20 bands"""
+    return [iir2peq(synthetic_iir(1 + i % 20, seed=i)) for i in range(SYNTHETIC_CATALOG)]
+
+
+@benchmark("peq_preamp_gain[catalog]")
+def setup_peq_preamp_gain_catalog():
+    peqs = synthetic_catalog()
+    return _run_all(peq_preamp_gain, peqs)
+
+
+@benchmark("peq_batch[catalog]")
+def setup_peq_batch_catalog():
+    peqs = synthetic_catalog()
+    return lambda: peq_batch(peqs)
+
+
+@benchmark("peq_batch[catalog,f32]")
+def setup_peq_batch_catalog_f32():
+    peqs = synthetic_catalog()
+    return lambda: peq_batch(peqs, dtype=np.float32)
+
+
+# ----------------------------------------------------------------------
+# converters
+# ----------------------------------------------------------------------
+
+
+def _run_all(fn, inputs):
+    def run():
+        for item in inputs:
+            fn(item)
+
+    return run
+
+
+@benchmark("lines2iir[corpus]")
+def setup_lines2iir_corpus():
+    return _run_all(lines2iir, corpus_lines())
+
+
+@benchmark("iir2data[corpus]")
+def setup_iir2data_corpus():
+    return _run_all(iir2data, corpus_iirs())
+
+
+@benchmark("iir2aupreset[corpus]")
+def setup_iir2aupreset_corpus():
+    return _run_all(lambda iir: iir2aupreset(iir, "bench"), corpus_iirs())
+
+
+@benchmark("rme_channel_render[corpus]")
+def setup_rme_channel_render_corpus():
+    return _run_all(rme_totalmix_channel_render, corpus_iirs())
+
+
+@benchmark("rme_room_render[corpus]")
+def setup_rme_room_render_corpus():
+    return _run_all(lambda iir: rme_totalmix_room_render(iir, []), corpus_iirs())
+
+
+def _register_converters(n_bands: int):
+    @benchmark(f"lines2iir[{n_bands}]")
+    def setup_lines2iir():
+        lines = synthetic_lines(n_bands)
+        return lambda: lines2iir(lines)
+
+    @benchmark(f"iir2data[{n_bands}]")
+    def setup_iir2data():
+        iir = synthetic_iir(n_bands)
+        return lambda: iir2data(iir)
+
+    @benchmark(f"iir2aupreset[{n_bands}]")
+    def setup_iir2aupreset():
+        iir = synthetic_iir(n_bands)
+        return lambda: iir2aupreset(iir, "bench")
+
+    @benchmark(f"iir2rme_totalmix_channel[{n_bands}]")
+    def setup_rme_channel():
+        iir = synthetic_iir(n_bands)
+        return lambda: iir2rme_totalmix_channel(iir)
+
+    @benchmark(f"iir2rme_totalmix_room[{n_bands}]")
+    def setup_rme_room():
+        iir = synthetic_iir(n_bands)
+        return lambda: iir2rme_totalmix_room(iir, [])
+
+
+for _n in SYNTHETIC_BANDS:
+    _register_peq(_n)
+    _register_converters(_n)
+
+
+# ----------------------------------------------------------------------
+# runner
+# ----------------------------------------------------------------------
+
+
+def measure(fn: Callable[[], object]) -> float:
+    """best time per call in seconds"""
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    number = max(1, int(number * MIN_TIME / 0.2))
+    return min(timer.repeat(repeat=REPEAT, number=number)) / number
+
+
+def run(pattern: str = "") -> dict[str, float]:
+    results = {}
+    for name, setup in BENCHMARKS.items():
+        if pattern not in name:
+            continue
+        # writers and preamp computations print diagnostics
+        with contextlib.redirect_stdout(io.StringIO()):
+            fn = setup()
+            results[name] = measure(fn)
+        print("{:45s} {:12.1f} us".format(name, results[name] * 1e6))
+    return results
+
+
+def environment() -> dict[str, str]:
+    """what timings depend on besides the code"""
+    return {
+        "machine": platform.machine(),
+        "node": platform.node(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+    }
+
+
+def load_baseline(path: pathlib.Path) -> dict:
+    if not path.exists():
+        return {"results": {}}
+    with open(path, "r", encoding="utf-8") as fd:
+        return json.load(fd)
+
+
+def save_baseline(path: pathlib.Path, results: dict[str, float]) -> None:
+    content = {**environment(), "results": results}
+    with open(path, "w", encoding="utf-8") as fd:
+        json.dump(content, fd, indent=2, sort_keys=True)
+        fd.write("\n")
+
+
+def environment_changes(baseline: dict) -> list[str]:
+    """how this environment differs from the one the baseline was recorded in"""
+    return [
+        "{} {} instead of {}".format(key, value, baseline.get(key, "unknown"))
+        for key, value in environment().items()
+        if baseline.get(key) != value
+    ]
+
+
+def compare(
+    results: dict[str, float], baseline: dict[str, float], threshold: float
+) -> list[str]:
+    """names of the benchmarks slower than threshold times their baseline
+
+    A suspected regression is measured again before being reported, timings
+    on a busy machine are noisy.
+    """
+    regressions = []
+    print("")
+    print("{:45s} {:>10s}".format("benchmark", "ratio"))
+    for name, measured in results.items():
+        if name not in baseline:
+            print("{:45s} {:>10s}".format(name, "new"))
+            continue
+        current = measured
+        ratio = current / baseline[name]
+        if ratio > threshold:
+            with contextlib.redirect_stdout(io.StringIO()):
+                current = min(current, measure(BENCHMARKS[name]()))
+            results[name] = current
+            ratio = current / baseline[name]
+        flag = ""
+        if ratio > threshold:
+            flag = " REGRESSION"
+            regressions.append(name)
+        print("{:45s} {:10.2f}{}".format(name, ratio, flag))
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-k", dest="pattern", default="")
+    parser.add_argument("--save", action="store_true")
+    parser.add_argument("--baseline", type=pathlib.Path, default=BASELINE)
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    args = parser.parse_args()
+
+    results = run(args.pattern)
+    baseline = load_baseline(args.baseline)
+    if args.save:
+        save_baseline(args.baseline, {**baseline["results"], **results})
+        print("Baseline saved in {}".format(args.baseline))
+        return 0
+
+    regressions = compare(results, baseline["results"], args.threshold)
+    if len(regressions) == 0:
+        return 0
+    changes = environment_changes(baseline)
+    if len(changes) > 0:
+        # timings from another machine or stack say nothing about the code
+        print(
+            "Warning: {} benchmarks are slower than a baseline recorded elsewhere ({}): {}".format(
+                len(regressions), ", ".join(changes), ", ".join(regressions)
+            )
+        )
+        return 0
+    print("Error: {} benchmarks regressed: {}".format(len(regressions), ", ".join(regressions)))
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,429 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""HTTP load test of the backend against a synthetic catalog.
+
+Usage:
+    python3 -m benchmarks.loadtest                      default mix, 1 worker
+    python3 -m benchmarks.loadtest --workers 4 -c 64    size the workers
+    python3 -m benchmarks.loadtest --url http://host/   hit a running server
+
+A temporary metadata.json, eqdata.json and eqs.db are generated, the app is
+started with uvicorn on a free local port and many concurrent clients replay
+a weighted traffic mix. Latency percentiles and throughput are reported per
+endpoint. Nothing leaves the machine.
+
+--workers starts that many uvicorn worker processes, the same model as
+gunicorn with uvicorn workers: increase it until throughput stops growing
+and p99 stays acceptable. Against a running server (--url) the speakers
+come from the server and the EQs are uploaded first.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import pathlib
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+
+import httpx
+import numpy as np
+
+BASE_DIR = pathlib.Path(__file__).resolve().parent.parent
+
+sys.path.insert(0, str(BASE_DIR))
+
+from iir.filter_iir import Biquad
+
+API = "v1"
+
+# ----------------------------------------------------------------------
+# synthetic catalog
+# ----------------------------------------------------------------------
+
+BRANDS = ("Acme", "Bose", "Genelec", "JBL", "KEF", "Neumann", "Focal", "Dynaudio")
+PEQ_TYPES = (Biquad.PEAK, Biquad.PEAK, Biquad.PEAK, Biquad.LOWSHELF, Biquad.HIGHSHELF)
+
+
+def synthetic_peq(rng: random.Random, n_bands: int) -> list[dict]:
+    return [
+        {
+            "type": rng.choice(PEQ_TYPES),
+            "freq": round(rng.uniform(30, 16000)),
+            "Q": round(rng.uniform(0.5, 4.0), 2),
+            "dbGain": round(rng.uniform(-6.0, 6.0), 1),
+        }
+        for _ in range(n_bands)
+    ]
+
+
+def synthetic_catalog(n_speakers: int, seed: int = 0) -> tuple[dict, dict]:
+    """metadata and eqdata in the format the spinorama site produces"""
+    # seeded for a reproducible workload, not for security
+    rng = random.Random(seed)  # noqa: S311
+    metadata = {}
+    eqdata = {}
+    for i in range(n_speakers):
+        brand = BRANDS[i % len(BRANDS)]
+        name = "{} Model {:04d}".format(brand, i)
+        metadata[name] = {
+            "brand": brand,
+            "model": "Model {:04d}".format(i),
+            "type": rng.choice(("passive", "active")),
+            "shape": rng.choice(("bookshelves", "floorstanders", "center")),
+            "price": str(rng.randrange(100, 10000)),
+        }
+        eqs = {}
+        for key in ("autoeq", "autoeq_lw"):
+            n_bands = rng.randrange(3, 10)
+            eqs[key] = {
+                "display_name": "{} {}".format(name, key),
+                "filename": "iir-{}.txt".format(key),
+                "preamp_gain": -round(rng.uniform(0.0, 6.0), 1),
+                "peq": synthetic_peq(rng, n_bands),
+            }
+        eqdata[name] = {"eqs": eqs}
+    return metadata, eqdata
+
+
+def apo_text(peq: list[dict]) -> str:
+    lines = ["Preamp: -3.0 dB"]
+    for i, iir in enumerate(peq):
+        lines.append(
+            "Filter {}: ON {} Fc {} Hz Gain {} dB Q {}".format(
+                i + 1,
+                Biquad.type2name[iir["type"]][1],
+                iir["freq"],
+                iir["dbGain"],
+                iir["Q"],
+            )
+        )
+    return "\n".join(lines) + "\n"
+
+
+def write_fixtures(directory: pathlib.Path, n_speakers: int, n_eqs: int) -> list[str]:
+    """write the catalog and fill the database, return the stored hashes"""
+    metadata, eqdata = synthetic_catalog(n_speakers)
+    with open(directory / "metadata.json", "w", encoding="utf-8") as fd:
+        json.dump(metadata, fd)
+    with open(directory / "eqdata.json", "w", encoding="utf-8") as fd:
+        json.dump(eqdata, fd)
+
+    # backend reads its locations when imported
+    os.environ.update(fixture_env(directory))
+    import backend  # noqa: PLC0415
+
+    backend.create_table()
+    rng = random.Random(1)  # noqa: S311
+    hashes = []
+    for i in range(n_eqs):
+        buffer = apo_text(synthetic_peq(rng, rng.randrange(3, 10))).encode("utf-8")
+        success, hash_or_msg = backend.store_eq("eq-{:05d}.txt".format(i), buffer)
+        if not success:
+            raise RuntimeError(hash_or_msg)
+        hashes.append(hash_or_msg)
+    return hashes
+
+
+def fixture_env(directory: pathlib.Path) -> dict[str, str]:
+    return {
+        "EQCONVERTER_ENV": "loadtest",
+        "EQCONVERTER_METADATA": str(directory / "metadata.json"),
+        "EQCONVERTER_EQDATA": str(directory / "eqdata.json"),
+        "EQCONVERTER_DB": str(directory / "eqs.db"),
+    }
+
+
+# ----------------------------------------------------------------------
+# server
+# ----------------------------------------------------------------------
+
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(directory: pathlib.Path, port: int, workers: int) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update(fixture_env(directory))
+    # a fixed command line, only the port and worker count vary
+    return subprocess.Popen(  # noqa: S603
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "backend:backend",
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(port),
+            "--workers",
+            str(workers),
+            "--log-level",
+            "warning",
+        ],
+        cwd=BASE_DIR,
+        env=env,
+        # writers print fitting diagnostics, keep the report readable
+        stdout=subprocess.DEVNULL,
+    )
+
+
+def wait_ready(url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{url}/{API}/targets", timeout=1.0).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.1)
+    msg = "server at {} did not start in {}s".format(url, timeout)
+    raise RuntimeError(msg)
+
+
+# ----------------------------------------------------------------------
+# traffic
+# ----------------------------------------------------------------------
+
+
+def remote_catalog(url: str, uploads: list[bytes]) -> tuple[list[str], list[str]]:
+    """speakers and uploaded hashes of a running server"""
+    speakers = httpx.get(f"{url}/{API}/speakers", timeout=30.0).json()
+    files = [("files", ("seed.txt", upload, "text/plain")) for upload in uploads]
+    response = httpx.post(f"{url}/{API}/eq/upload", files=files, timeout=30.0)
+    hashes = [item["hash"] for item in response.json() if item["status"] == "ok"]
+    return speakers, hashes
+
+
+@dataclass
+class Catalog:
+    speakers: list[str]
+    hashes: list[str]
+    uploads: list[bytes] = field(default_factory=list)
+
+
+def _speaker(rng, catalog):
+    return "GET", f"/{API}/speaker/{rng.choice(catalog.speakers)}/metadata", {}
+
+
+def _search(rng, catalog):
+    params = {"prefix": rng.choice(catalog.speakers)[:3], "limit": 100}
+    return "GET", f"/{API}/speakers", {"params": params}
+
+
+def _eqdata(rng, catalog):
+    return "GET", f"/{API}/speaker/{rng.choice(catalog.speakers)}/eqdata", {}
+
+
+def _upload(rng, catalog):
+    files = [("files", ("upload.txt", rng.choice(catalog.uploads), "text/plain"))]
+    return "POST", f"/{API}/eq/upload", {"files": files}
+
+
+def _hash_param(path):
+    def request(rng, catalog):
+        return "GET", f"/{API}/{path}", {"params": {"eq_hash": rng.choice(catalog.hashes)}}
+
+    return request
+
+
+def _room(rng, catalog):
+    params = {
+        "eq_hash_left": rng.choice(catalog.hashes),
+        "eq_hash_right": rng.choice(catalog.hashes),
+    }
+    return "GET", f"/{API}/eq/target/rme_totalmix_room", {"params": params}
+
+
+# endpoint -> request builder
+ENDPOINTS = {
+    "brands": lambda rng, catalog: ("GET", f"/{API}/brands", {}),
+    "speakers": lambda rng, catalog: ("GET", f"/{API}/speakers", {}),
+    "speaker_search": _search,
+    "speaker_metadata": _speaker,
+    "speaker_eqdata": _eqdata,
+    "upload": _upload,
+    "targets": lambda rng, catalog: ("GET", f"/{API}/targets", {}),
+    "aupreset": _hash_param("eq/target/aupreset"),
+    "apo": _hash_param("eq/target/apo"),
+    "rme_channel": _hash_param("eq/target/rme_totalmix_channel"),
+    "rme_room": _room,
+    "graph": _hash_param("eq/graph"),
+    "graph_spl": _hash_param("eq/graph_spl"),
+    "graph_spl_details": _hash_param("eq/graph_spl_details"),
+}
+
+# relative weights, a user browses speakers, looks at eqs and then graphs
+MIXES = {
+    "browse": {
+        "brands": 5,
+        "speakers": 5,
+        "speaker_search": 10,
+        "speaker_metadata": 20,
+        "speaker_eqdata": 20,
+        "graph": 20,
+        "graph_spl": 5,
+        "graph_spl_details": 5,
+        "targets": 2,
+        "aupreset": 5,
+        "apo": 5,
+        "rme_channel": 3,
+        "rme_room": 2,
+        "upload": 3,
+    },
+    "upload": {
+        "upload": 40,
+        "graph_spl": 30,
+        "graph_spl_details": 10,
+        "aupreset": 10,
+        "apo": 10,
+    },
+    "graphs": {
+        "graph": 50,
+        "graph_spl": 30,
+        "graph_spl_details": 20,
+    },
+}
+
+
+async def client(
+    http: httpx.AsyncClient,
+    rng: random.Random,
+    catalog: Catalog,
+    names: list[str],
+    weights: list[int],
+    deadline: float,
+    samples: dict[str, list[float]],
+    errors: dict[str, int],
+) -> None:
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, weights)[0]
+        method, path, kwargs = ENDPOINTS[name](rng, catalog)
+        start = time.perf_counter()
+        try:
+            response = await http.request(method, path, **kwargs)
+            ok = response.status_code == 200
+        except httpx.HTTPError:
+            ok = False
+        elapsed = time.perf_counter() - start
+        if ok:
+            samples[name].append(elapsed)
+        else:
+            errors[name] += 1
+
+
+async def replay(
+    url: str, catalog: Catalog, mix: dict[str, int], clients: int, duration: float
+) -> tuple[dict[str, list[float]], dict[str, int], float]:
+    names = list(mix.keys())
+    weights = [mix[name] for name in names]
+    samples: dict[str, list[float]] = {name: [] for name in names}
+    errors: dict[str, int] = {name: 0 for name in names}
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30.0) as http:
+        start = time.perf_counter()
+        deadline = start + duration
+        # one seeded generator per client, not for security
+        rngs = [random.Random(i) for i in range(clients)]  # noqa: S311
+        await asyncio.gather(
+            *[
+                client(http, rng, catalog, names, weights, deadline, samples, errors)
+                for rng in rngs
+            ]
+        )
+        elapsed = time.perf_counter() - start
+    return samples, errors, elapsed
+
+
+def report(samples: dict[str, list[float]], errors: dict[str, int], elapsed: float) -> None:
+    print(
+        "{:20s} {:>8s} {:>7s} {:>9s} {:>9s} {:>9s} {:>9s}".format(
+            "endpoint", "requests", "errors", "req/s", "p50 ms", "p95 ms", "p99 ms"
+        )
+    )
+    total = 0
+    total_errors = 0
+    for name in sorted(samples):
+        count = len(samples[name])
+        total += count
+        total_errors += errors[name]
+        if count == 0:
+            print("{:20s} {:8d} {:7d}".format(name, count, errors[name]))
+            continue
+        p50, p95, p99 = np.percentile(np.array(samples[name]) * 1000, (50, 95, 99))
+        print(
+            "{:20s} {:8d} {:7d} {:9.1f} {:9.1f} {:9.1f} {:9.1f}".format(
+                name, count, errors[name], count / elapsed, p50, p95, p99
+            )
+        )
+    all_samples = [s for values in samples.values() for s in values]
+    if len(all_samples) > 0:
+        p50, p95, p99 = np.percentile(np.array(all_samples) * 1000, (50, 95, 99))
+        print(
+            "{:20s} {:8d} {:7d} {:9.1f} {:9.1f} {:9.1f} {:9.1f}".format(
+                "total", total, total_errors, total / elapsed, p50, p95, p99
+            )
+        )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mix", choices=sorted(MIXES), default="browse")
+    parser.add_argument("-c", "--clients", type=int, default=32)
+    parser.add_argument("-d", "--duration", type=float, default=10.0)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--speakers", type=int, default=500)
+    parser.add_argument("--eqs", type=int, default=200)
+    parser.add_argument("--url", default=None, help="use a running server")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = pathlib.Path(tmp)
+        hashes = write_fixtures(directory, args.speakers, args.eqs)
+        metadata, _ = synthetic_catalog(args.speakers)
+        rng = random.Random(2)  # noqa: S311
+        catalog = Catalog(
+            speakers=sorted(metadata.keys()),
+            hashes=hashes,
+            uploads=[
+                apo_text(synthetic_peq(rng, rng.randrange(3, 10))).encode("utf-8")
+                for _ in range(64)
+            ],
+        )
+
+        server = None
+        url = args.url
+        if url is None:
+            port = free_port()
+            url = "http://127.0.0.1:{}".format(port)
+            server = start_server(directory, port, args.workers)
+        try:
+            wait_ready(url)
+            if args.url is not None:
+                catalog.speakers, catalog.hashes = remote_catalog(url, catalog.uploads)
+            print(
+                "mix {} with {} clients for {}s against {} ({} workers)".format(
+                    args.mix, args.clients, args.duration, url, args.workers
+                )
+            )
+            samples, errors, elapsed = asyncio.run(
+                replay(url, catalog, MIXES[args.mix], args.clients, args.duration)
+            )
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait(timeout=30)
+    report(samples, errors, elapsed)
+    return 1 if sum(errors.values()) > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Serialization cost of the backend responses, per endpoint.
+
+Usage:
+    python3 -m benchmarks.serialization
+
+For each endpoint a representative payload is serialized the way the
+backend used to (jsonable_encoder then JSONResponse) and with
+FastJSONResponse. Payloads come from the synthetic catalog of the load test.
+"""
+
+import contextlib
+import io
+import json
+import random
+import sys
+
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import JSONResponse
+
+from benchmarks.hotpaths import corpus_iirs, measure
+from benchmarks.loadtest import apo_text, synthetic_catalog, synthetic_peq
+from backend import EQ, eq2hash, eq2legacy_hash
+from converter import iir2aupreset, iir2peq
+from iir.filter_peq import peq_bank, peq_freq_grid
+from responses import FastJSONResponse
+from targets import TARGETS
+
+N_SPEAKERS = 1000
+N_EQS = 500
+
+
+def payloads() -> dict[str, tuple[object, object]]:
+    """endpoint -> (content as the old code built it, content for FastJSONResponse)"""
+    metadata, eqdata = synthetic_catalog(N_SPEAKERS)
+    speaker = next(iter(metadata))
+    brands = sorted({v.get("brand") for _, v in metadata.items()})
+    speakers = sorted(metadata.keys())
+
+    flat = []
+    for key, eq in eqdata[speaker]["eqs"].items():
+        text = apo_text(eq["peq"])
+        flat.append(
+            {
+                "hash": eq2hash(text.encode("utf-8")),
+                "eq": text,
+                "display_name": eq["display_name"],
+                "name": key,
+            }
+        )
+
+    # seeded for reproducible payloads, not for security
+    rng = random.Random(0)  # noqa: S311
+    rows = []
+    for i in range(N_EQS):
+        peq = str(synthetic_peq(rng, rng.randrange(3, 10)))
+        rows.append((eq2legacy_hash(peq.encode("utf-8")), "eq-{:05d}.txt".format(i), peq))
+
+    iir = max(corpus_iirs(), key=len)
+    with contextlib.redirect_stdout(io.StringIO()):
+        aupreset = iir2aupreset(iir, "bench")
+    freq = peq_freq_grid(200)
+    bank = peq_bank(freq, iir2peq(iir))
+    spl = bank.sum(axis=0)
+
+    return {
+        "brands": (brands, brands),
+        "speakers": (speakers, speakers),
+        "speaker_metadata": (metadata[speaker], metadata[speaker]),
+        "speaker_eqdata": (flat, flat),
+        "eqs": (rows, [EQ(*row) for row in rows]),
+        "targets": ([t.capabilities() for t in TARGETS.values()],) * 2,
+        "aupreset": (aupreset, aupreset),
+        "graph_spl": (
+            {"freq": freq.tolist(), "spl": spl.tolist()},
+            {"freq": freq, "spl": spl},
+        ),
+        "graph_spl_details": (
+            {"freq": freq.tolist(), "spl": {i: row.tolist() for i, row in enumerate(bank)}},
+            {"freq": freq, "spl": dict(enumerate(bank))},
+        ),
+        "graph": (
+            {
+                "freq": freq.tolist(),
+                "spl": spl.tolist(),
+                "details": {i: row.tolist() for i, row in enumerate(bank)},
+            },
+            {"freq": freq, "spl": spl, "details": dict(enumerate(bank))},
+        ),
+    }
+
+
+def main() -> int:
+    print(
+        "{:20s} {:>10s} {:>12s} {:>10s} {:>8s}".format(
+            "endpoint", "bytes", "encoder us", "fast us", "speedup"
+        )
+    )
+    for name, (old, new) in payloads().items():
+        body = FastJSONResponse(new).body
+        expected = JSONResponse(jsonable_encoder(old)).body
+        if json.loads(body) != json.loads(expected):
+            print("Error: {} serializes differently".format(name))
+            return 1
+        slow = measure(lambda old=old: JSONResponse(jsonable_encoder(old)))
+        fast = measure(lambda new=new: FastJSONResponse(new))
+        print(
+            "{:20s} {:10d} {:12.1f} {:10.1f} {:8.1f}".format(
+                name, len(body), slow * 1e6, fast * 1e6, slow / fast
+            )
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""Sorted, immutable indexes over the speaker metadata.
+
+The index is built once per version of metadata.json (its mtime and size)
+and then shared by all requests. Prefix search is case insensitive and uses
+bisect on casefolded keys, so it costs O(log n + results).
+"""
+
+import bisect
+import functools
+import json
+import os
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class SortedNames:
+    """names in their usual order plus a casefolded order for prefix search"""
+
+    names: tuple[str, ...]
+    folded_keys: tuple[str, ...]
+    folded_names: tuple[str, ...]
+
+    @classmethod
+    def build(cls, names) -> "SortedNames":
+        ordered = tuple(sorted(names))
+        folded = sorted((name.casefold(), name) for name in ordered)
+        return cls(
+            names=ordered,
+            folded_keys=tuple(key for key, _ in folded),
+            folded_names=tuple(name for _, name in folded),
+        )
+
+    def search(self, prefix: str = "", limit: int | None = None, offset: int = 0) -> list[str]:
+        """names starting with prefix, ignoring case"""
+        if not prefix:
+            stop = len(self.names) if limit is None else offset + limit
+            return list(self.names[offset:stop])
+        key = prefix.casefold()
+        start = bisect.bisect_left(self.folded_keys, key)
+        # every key starting with prefix sorts before prefix + the last code point
+        end = bisect.bisect_left(self.folded_keys, key + "\U0010ffff", lo=start)
+        start += offset
+        if limit is not None:
+            end = min(end, start + limit)
+        return list(self.folded_names[start:end])
+
+    def count(self, prefix: str = "") -> int:
+        if not prefix:
+            return len(self.names)
+        key = prefix.casefold()
+        start = bisect.bisect_left(self.folded_keys, key)
+        return bisect.bisect_left(self.folded_keys, key + "\U0010ffff", lo=start) - start
+
+
+@dataclass(frozen=True)
+class SpeakerIndex:
+    speakers: SortedNames
+    brands: SortedNames
+
+    @classmethod
+    def build(cls, metadata: dict) -> "SpeakerIndex":
+        brands = {v.get("brand") for v in metadata.values()}
+        brands.discard(None)
+        return cls(
+            speakers=SortedNames.build(metadata.keys()),
+            brands=SortedNames.build(brands),
+        )
+
+
+@functools.lru_cache(maxsize=1)
+def _load_index(path: str, mtime_ns: int, size: int) -> SpeakerIndex:
+    with open(path, "r", encoding="utf8") as f:
+        return SpeakerIndex.build(json.load(f))
+
+
+def speaker_index(path: str) -> SpeakerIndex:
+    """the index of the metadata in path, rebuilt when the file changes"""
+    stat = os.stat(path)
+    return _load_index(path, stat.st_mtime_ns, stat.st_size)
+
+
+def speaker_index_cache_info():
+    return _load_index.cache_info()
@@ -5,13 +5,15 @@
 # ruff: noqa: N816
 
 import base64
+import hashlib
 import pathlib
 from string import Template
 import struct
-from typing import Literal
+from typing import Literal, TextIO
 
 from iir.filter_iir import Biquad, q2bw, bw2q
-from iir.filter_peq import peq_preamp_gain, Peq
+from iir.filter_peq import peq_preamp_gain, peq_freq_grid, Peq
+from iir.filter_fit import GAIN_TYPES, FitReport, PeqConstraints, peq_fit
 
 SRATE = 48000
 
@@ -106,19 +108,22 @@ def parse_apo(lines: list[str]) -> tuple[STATUS, IIR]:
     return True, iir
 
 
+IIR2BIQUAD = {
+    "PK": Biquad.PEAK,
+    "LP": Biquad.LOWPASS,
+    "HP": Biquad.HIGHPASS,
+    "LS": Biquad.LOWSHELF,
+    "HS": Biquad.HIGHSHELF,
+    "BP": Biquad.BANDPASS,
+    "LSC": Biquad.LOWSHELF,  # Low Shelf Cut - use same as Low Shelf
+    "HSC": Biquad.HIGHSHELF,  # High Shelf Cut - use same as High Shelf
+}
+
+
 def iir2peq(iir: IIR) -> Peq:
     peq = []
     for biquad in iir:
-        biquad_type = {
-            "PK": Biquad.PEAK,
-            "LP": Biquad.LOWPASS,
-            "HP": Biquad.HIGHPASS,
-            "LS": Biquad.LOWSHELF,
-            "HS": Biquad.HIGHSHELF,
-            "BP": Biquad.BANDPASS,
-            "LSC": Biquad.LOWSHELF,  # Low Shelf Cut - use same as Low Shelf
-            "HSC": Biquad.HIGHSHELF,  # High Shelf Cut - use same as High Shelf
-        }.get(str(biquad["type"]))
+        biquad_type = IIR2BIQUAD.get(str(biquad["type"]))
         if biquad_type is None:
             continue
         freq = biquad["freq"]
@@ -129,6 +134,133 @@ def iir2peq(iir: IIR) -> Peq:
     return peq
 
 
+# safety cutoff on the time spent by the optimizer when an EQ does not fit
+# on a target: it stops on its iteration count or tolerance long before, so
+# the fitted bands do not depend on the machine load
+FIT_BUDGET = 5.0
+
+
+def fit_iirs(
+    iirs: IIR, constraints: PeqConstraints, budget: float = FIT_BUDGET
+) -> tuple[IIR, FitReport]:
+    """Fit an EQ on a constrained target.
+
+    Args:
+        iirs: List of IIR filter dictionaries
+        constraints: What the target can represent (slots, types, ranges)
+        budget: Safety cutoff in seconds on the time spent optimizing
+
+    Returns:
+        The IIRs unchanged if the target can represent them, otherwise new
+        IIRs fitted to the response of the original ones, and a report on
+        the quality of the fit
+    """
+    known = [iir for iir in iirs if iir.get("type") in IIR2BIQUAD]
+    peq = iir2peq(known)
+    fitted, report = peq_fit(
+        peq_freq_grid(200), peq, constraints, budget=budget
+    )
+    if not report.fitted:
+        return known, report
+    result = []
+    for _, biquad in fitted:
+        result.append(
+            {
+                "type": biquad.type2str(),
+                "freq": biquad.freq,
+                "gain": biquad.db_gain,
+                "q": biquad.q,
+                "width": q2bw(biquad.q),
+            }
+        )
+    return result, report
+
+
+def clamp_iirs(iirs: IIR, constraints: PeqConstraints) -> tuple[IIR, list[str]]:
+    """Clamp the parameters of an EQ into the ranges of a target.
+
+    Args:
+        iirs: List of IIR filter dictionaries
+        constraints: What the target can represent, only the frequency, Q
+            and gain ranges and the gain step are used
+
+    Returns:
+        The IIRs with out of range parameters clamped and gains rounded to
+        the step, and a description of each clamped parameter
+    """
+    fmin, fmax = constraints.freq_range
+    qmin, qmax = constraints.q_range
+    gmin, gmax = constraints.gain_range
+    step = constraints.gain_step
+    result = []
+    clamped = []
+    for i, original in enumerate(iirs):
+        iir = dict(original)
+        freq = float(iir["freq"])
+        if not fmin <= freq <= fmax:
+            iir["freq"] = min(max(freq, fmin), fmax)
+            clamped.append(
+                "filter {} Fc {:g} Hz is outside {:g}-{:g} Hz".format(
+                    i + 1, freq, fmin, fmax
+                )
+            )
+        width = float(iir["width"])
+        q = bw2q(width) if width > 0.0 else qmax
+        if not qmin <= q <= qmax:
+            iir["width"] = q2bw(min(max(q, qmin), qmax))
+            if "q" in iir:
+                iir["q"] = min(max(q, qmin), qmax)
+            clamped.append(
+                "filter {} Q {:.2f} is outside {:.2f}-{:.2f}".format(
+                    i + 1, q, qmin, qmax
+                )
+            )
+        gain = float(iir["gain"])
+        if IIR2BIQUAD.get(iir["type"]) in GAIN_TYPES:
+            if not gmin <= gain <= gmax:
+                iir["gain"] = min(max(gain, gmin), gmax)
+                clamped.append(
+                    "filter {} gain {:g} dB is outside {:g}-{:g} dB".format(
+                        i + 1, gain, gmin, gmax
+                    )
+                )
+            if step > 0.0:
+                iir["gain"] = round(round(iir["gain"] / step) * step, 6)
+        result.append(iir)
+    return result, clamped
+
+
+def constrain_iirs(iirs: IIR, constraints: PeqConstraints, target: str) -> IIR:
+    """Make an EQ fit on a target, warning about what was changed.
+
+    Args:
+        iirs: List of IIR filter dictionaries
+        constraints: What the target can represent
+        target: Name of the target in the warnings
+
+    Returns:
+        The IIRs fitted when there are more than the target has bands,
+        otherwise the IIRs with their parameters clamped into range
+    """
+    max_bands = constraints.max_bands
+    if len(iirs) > max_bands:
+        fitted, report = fit_iirs(iirs, constraints)
+        if report.fitted:
+            print(
+                "Warning: {} supports a maximum of {} bands, {} bands were "
+                "provided, EQ was fitted: {}".format(target, max_bands, len(iirs), report)
+            )
+        return fitted
+    clamped, messages = clamp_iirs(iirs, constraints)
+    if messages:
+        print(
+            "Warning: {} range exceeded, parameters were clamped: {}".format(
+                target, "; ".join(messages)
+            )
+        )
+    return clamped
+
+
 def lines2iir(lines: list[str]) -> tuple[STATUS, IIR]:
     option = guess_format(lines)
     if option == "AUNBandEQ":
@@ -138,6 +270,77 @@ def lines2iir(lines: list[str]) -> tuple[STATUS, IIR]:
     return True, []
 
 
+# ----------------------------------------------------------------------
+# HASH
+# ----------------------------------------------------------------------
+
+# parameters are rounded to these steps before hashing: 0.01 Hz, 0.001 dB
+# and 0.0001 octave absorb the float noise of Q <-> bandwidth conversions
+EQ_HASH_STEPS = (0.01, 0.001, 0.0001)
+# domain separation: no other blake2b digest collides with an EQ hash
+EQ_HASH_KEY = b"spinorama-eqconverter-eq-v1"
+EQ_HASH_SIZE = 32
+EQ_NAME_HASH_SIZE = 8
+EQ_HASH_RECORD = struct.Struct("<4sqqq")
+
+
+def iir2canonical(iir: IIR) -> bytes:
+    """Serialize an EQ independently of how its file was written.
+
+    Args:
+        iir: Filters as returned by lines2iir
+
+    Returns:
+        One fixed size record per filter (type, quantized frequency, gain
+        and bandwidth), sorted since cascaded biquads commute; whitespace,
+        comments, the preamp line and Q versus BW notation do not matter
+    """
+    freq_step, gain_step, width_step = EQ_HASH_STEPS
+    records = sorted(
+        EQ_HASH_RECORD.pack(
+            str(biquad["type"]).upper().encode("ascii", "replace")[:4],
+            round(float(biquad["freq"]) / freq_step),
+            round(float(biquad["gain"]) / gain_step),
+            round(float(biquad["width"]) / width_step),
+        )
+        for biquad in iir
+    )
+    return b"".join(records)
+
+
+def iir2hash(iir: IIR) -> str:
+    """Hash an EQ with a keyed BLAKE2b over its canonical form.
+
+    Args:
+        iir: Filters as returned by lines2iir
+
+    Returns:
+        64 hexadecimal characters; the same for every file describing the
+        same filters, whatever its name
+    """
+    return hashlib.blake2b(
+        iir2canonical(iir), digest_size=EQ_HASH_SIZE, key=EQ_HASH_KEY
+    ).hexdigest()
+
+
+def name2hash(name: str) -> str:
+    """Hash the name an EQ is stored under.
+
+    EQs uploaded under different names share their iir2hash and the stored
+    row keeps the last name: anything rendered from a row that shows its
+    name is keyed on both hashes.
+
+    Args:
+        name: Name of the EQ, usually the uploaded file name
+
+    Returns:
+        16 hexadecimal characters
+    """
+    return hashlib.blake2b(
+        name.encode("utf-8"), digest_size=EQ_NAME_HASH_SIZE, key=EQ_HASH_KEY
+    ).hexdigest()
+
+
 # ----------------------------------------------------------------------
 # AUPRESET
 # ----------------------------------------------------------------------
@@ -171,6 +374,26 @@ kAUNBandEQFilterType_ResonantLowShelf = 9
 kAUNBandEQFilterType_ResonantHighShelf = 10
 kNumAUNBandEQFilterTypes = 11
 
+# AUNBandEQ has 16 bands accepting any type, bandwidth is 0.05 to 5 octaves
+AUNBANDEQ_CONSTRAINTS = PeqConstraints(
+    slot_types=(
+        frozenset(
+            (
+                Biquad.PEAK,
+                Biquad.LOWPASS,
+                Biquad.HIGHPASS,
+                Biquad.LOWSHELF,
+                Biquad.HIGHSHELF,
+                Biquad.BANDPASS,
+            )
+        ),
+    )
+    * 16,
+    freq_range=(20.0, 20000.0),
+    q_range=(bw2q(5.0), bw2q(0.05)),
+    gain_range=(-96.0, 24.0),
+)
+
 # plist template, could also use a library
 AUPRESET_TEMPLATE = Template(
     '\
@@ -209,9 +432,45 @@ def file2iir(filename: str) -> tuple[STATUS, IIR]:
     return False, []
 
 
+def spin_eq2text(eq: dict) -> str:
+    """Format an EQ from spinorama's eqdata.json as text.
+
+    Args:
+        eq: One of the eqs of a speaker, with display_name, filename,
+            preamp_gain and peq
+
+    Returns:
+        The EQ in a text format that lines2iir parses, as the backend
+        stores it
+    """
+    lines = [
+        "{} {}".format(eq["display_name"], eq["filename"]),
+        "\n",
+        "Preamp gain: {:+3.1f}".format(float(eq["preamp_gain"])),
+    ]
+    for i, iir in enumerate(eq["peq"]):
+        iir_type = Biquad.type2name[iir["type"]][1]
+        iir_freq = int(iir["freq"])
+        iir_q = float(iir["Q"])
+        iir_gain = float(iir["dbGain"])
+        lines.append(
+            "Filter {:2d} ON {:s} Fc {:d} Hz Gain {:4.1f} dB Q {:4.2f}".format(
+                i,
+                iir_type,
+                iir_freq,
+                iir_gain,
+                iir_q,
+            )
+        )
+    lines.append("\n")
+    return "\n".join(lines)
+
+
 def iir2data(iir: IIR) -> tuple[STATUS, int, str]:
     """Build the data field from an iir"""
 
+    iir = constrain_iirs(iir, AUNBANDEQ_CONSTRAINTS, "AUNBandEQ")
+
     def type2value(t: str) -> int:
         """Transform a IIR type into the corresponding value for AUNBandEQ"""
         val = {
@@ -256,7 +515,7 @@ def iir2data(iir: IIR) -> tuple[STATUS, int, str]:
         )
 
     # remainings EQ are required and are set to 0
-    for i in range(len_iir, 16):
+    for i in range(len_iir, AUNBANDEQ_CONSTRAINTS.max_bands):
         params["{:d}".format(kAUNBandEQParam_BypassBand + i)] = 1.0  # False
         params["{:d}".format(kAUNBandEQParam_FilterType + i)] = 0
         params["{:d}".format(kAUNBandEQParam_Frequency + i)] = 0.0
@@ -377,6 +636,30 @@ def filter_iirs_by_gain(iirs: list, max_count: int) -> list:
     return [item[1] for item in selected]
 
 
+# TotalMix displays and stores gains with a 0.1 dB resolution
+RME_GAIN_STEP = 0.1
+
+# first band can be a low shelf or a high pass, last band a high shelf or a
+# low pass and all the bands in the middle are peaks
+RME_FIRST_SLOT = frozenset((Biquad.PEAK, Biquad.LOWSHELF, Biquad.HIGHPASS))
+RME_MIDDLE_SLOT = frozenset((Biquad.PEAK,))
+RME_LAST_SLOT = frozenset((Biquad.PEAK, Biquad.HIGHSHELF, Biquad.LOWPASS))
+
+RME_CHANNEL_CONSTRAINTS = PeqConstraints(
+    slot_types=(RME_FIRST_SLOT, RME_MIDDLE_SLOT, RME_LAST_SLOT),
+    q_range=(0.4, 9.9),
+    gain_range=(-20.0, 20.0),
+    gain_step=RME_GAIN_STEP,
+)
+
+RME_ROOM_CONSTRAINTS = PeqConstraints(
+    slot_types=(RME_FIRST_SLOT,) + (RME_MIDDLE_SLOT,) * 7 + (RME_LAST_SLOT,),
+    q_range=(0.4, 9.9),
+    gain_range=(-20.0, 20.0),
+    gain_step=RME_GAIN_STEP,
+)
+
+
 def type2rme(t: str, pos: int) -> float:
     # ---------------
     # pk       = 0
@@ -403,46 +686,89 @@ def type2rme(t: str, pos: int) -> float:
     return -1.0
 
 
-def iir2rme_totalmix_channel(iirs: list) -> tuple[STATUS, str]:
-    # Check IIR filter limit for TotalMix channel EQ (max 3 bands)
-    if len(iirs) > 3:
-        print(f"Error: TotalMix channel EQ supports a maximum of 3 bands. {len(iirs)} bands were provided.")
-        return False, ""
-
-    lines = []
-    lines.append("<Preset>")
-    lines.append("  <Equalizer>")
-    lines.append("    <Params>")
+# precompiled templates for TotalMix presets: a preset is rendered with a
+# single join over these pieces
+RME_CHANNEL_HEADER = (
+    "<Preset>\n"
+    "  <Equalizer>\n"
+    "    <Params>\n"
     # for now, default
-    lines.append('	<val e="LC Grade" v="1.00,"/>')
-    lines.append('	<val e="LC Freq" v="20.00,"/>')
+    '\t<val e="LC Grade" v="1.00,"/>\n'
+    '\t<val e="LC Freq" v="20.00,"/>\n'
+)
+RME_CHANNEL_BAND = (
+    '      <val e="Band{0} Freq" v="{1:7.2f},"/>\n'
+    '      <val e="Band{0} Q" v="{2:4.2f},"/>\n'
+    '        <val e="Band{0} Gain" v="{3:4.2f},"/>\n'
+).format
+RME_CHANNEL_TYPE = '        <val e="Band{0} Type" v="{1:4.2f},"/>\n'.format
+RME_CHANNEL_FOOTER = "    </Params>\n  </Equalizer>\n</Preset>"
+
+RME_ROOM_CHANNEL_HEADER = (
+    "  <Room EQ {0}>\n"
+    "    <Params>\n"
+    '\t<val e="REQ Delay" v="0.00,"/>\n'
+).format
+RME_ROOM_BAND = (
+    '        <val e="REQ Band{0} Freq" v="{1:7.2f},"/>\n'
+    '        <val e="REQ Band{0} Q" v="{2:4.2f},"/>\n'
+    '        <val e="REQ Band{0} Gain" v="{3:4.2f},"/>\n'
+).format
+RME_ROOM_TYPE = '        <val e="REQ Band{0} Type" v="{1:4.2f},"/>\n'.format
+RME_ROOM_CHANNEL_FOOTER = (
+    '\t<val e="REQ Chan Gain" v="{1},"/>\n'
+    "    </Params>\n"
+    "  </Room EQ {0}>\n"
+).format
+
+
+def rme_bands(iirs: list, band, band_type) -> list[str]:
+    """Render the parameters of each band with the band and type templates.
+
+    Args:
+        iirs: List of IIR filter dictionaries
+        band: Template for frequency, Q and gain of a band
+        band_type: Template for the type of a band
+
+    Returns:
+        List of rendered pieces, all bands first and then all types
+    """
+    pieces = []
     for i, iir in enumerate(iirs):
         q = iir.get("q", 0.0)
         if "q" not in iir and "width" in iir:
             q = bw2q(iir["width"])
-        lines.append(
-            '      <val e="Band{} Freq" v="{:7.2f},"/>'.format(
-                i + 1, iir["freq"]
-            )
-        )
-        lines.append('      <val e="Band{} Q" v="{:4.2f},"/>'.format(i + 1, q))
-        lines.append(
-            '        <val e="Band{} Gain" v="{:4.2f},"/>'.format(
-                i + 1, iir["gain"]
-            )
-        )
+        pieces.append(band(i + 1, iir["freq"], q, iir["gain"]))
     for i, iir in enumerate(iirs):
         rme = type2rme(iir["type"], i + 1)
         if rme == -1:
-            print("skip eq {} type is unknown {}".format(i, iir["type"]))
+            print("skip eq at pos {} type is unknown {}".format(i + 1, iir["type"]))
             continue
-        lines.append(
-            '        <val e="Band{} Type" v="{:4.2f},"/>'.format(i + 1, rme)
-        )
-    lines.append("    </Params>")
-    lines.append("  </Equalizer>")
-    lines.append("</Preset>")
-    return True, "\n".join(lines)
+        pieces.append(band_type(i + 1, rme))
+    return pieces
+
+
+def rme_totalmix_channel_render(iirs: list) -> list[str]:
+    """Render a TotalMix channel EQ preset as a list of pieces, as is."""
+    return [
+        RME_CHANNEL_HEADER,
+        *rme_bands(iirs, RME_CHANNEL_BAND, RME_CHANNEL_TYPE),
+        RME_CHANNEL_FOOTER,
+    ]
+
+
+def iir2rme_totalmix_channel_pieces(iirs: list) -> list[str]:
+    iirs = constrain_iirs(iirs, RME_CHANNEL_CONSTRAINTS, "TotalMix channel EQ")
+    return rme_totalmix_channel_render(iirs)
+
+
+def iir2rme_totalmix_channel(iirs: list) -> tuple[STATUS, str]:
+    return True, "".join(iir2rme_totalmix_channel_pieces(iirs))
+
+
+def iir2rme_totalmix_channel_stream(iirs: list, stream: TextIO) -> STATUS:
+    stream.writelines(iir2rme_totalmix_channel_pieces(iirs))
+    return True
 
 
 def enforce_rme_room_filter_constraints(iirs: list) -> list:
@@ -495,83 +821,85 @@ def enforce_rme_room_filter_constraints(iirs: list) -> list:
     return result
 
 
-def iir2rme_totalmix_room(left: list, right: list) -> tuple[STATUS, str]:
+def rme_totalmix_room_render(left: list, right: list) -> list[str]:
+    """Render a TotalMix room EQ preset as a list of pieces, as is.
+
+    When right is empty, the left channel is used for both channels and
+    rendered only once.
+    """
+    preamp_gain = 0.0
+    left_bands = rme_bands(left, RME_ROOM_BAND, RME_ROOM_TYPE)
+    right_bands = left_bands
+    if len(right) > 0:
+        right_bands = rme_bands(right, RME_ROOM_BAND, RME_ROOM_TYPE)
+    return [
+        "<Preset>\n",
+        RME_ROOM_CHANNEL_HEADER("L"),
+        *left_bands,
+        RME_ROOM_CHANNEL_FOOTER("L", preamp_gain),
+        RME_ROOM_CHANNEL_HEADER("R"),
+        *right_bands,
+        RME_ROOM_CHANNEL_FOOTER("R", preamp_gain),
+        "</Preset>",
+    ]
+
+
+def iir2rme_totalmix_room_pieces(left: list, right: list) -> list[str]:
     # Apply RME room EQ constraints for LSC and HSC filters
     left = enforce_rme_room_filter_constraints(left)
     right = enforce_rme_room_filter_constraints(right)
-    
-    # Check IIR filter limits for TotalMix room EQ (max 9 bands per channel)
-    original_left_count = len(left)
-    original_right_count = len(right)
-
-    # Filter left channel if needed
-    if len(left) > 9:
-        left = filter_iirs_by_gain(left, 9)
-
-    # Filter right channel if needed
-    if len(right) > 9:
-        right = filter_iirs_by_gain(right, 9)
-
-    # Print warning if any channel was filtered
-    if original_left_count > 9 or original_right_count > 9:
-        print(f"Warning: TotalMix room EQ supports a maximum of 9 bands per channel. "
-              f"Left channel has {original_left_count} bands, right channel has {original_right_count} bands. "
-              f"Keeping the 9 bands with highest absolute gain.")
-
-    lines = []
-
-    def process(iirs: list):
-        for i, iir in enumerate(iirs):
-            q = iir.get("q", 0.0)
-            if "q" not in iir and "width" in iir:
-                q = bw2q(iir["width"])
-            lines.append(
-                '        <val e="REQ Band{} Freq" v="{:7.2f},"/>'.format(
-                    i + 1, iir["freq"]
-                )
-            )
-            lines.append(
-                '        <val e="REQ Band{} Q" v="{:4.2f},"/>'.format(i + 1, q)
-            )
-            lines.append(
-                '        <val e="REQ Band{} Gain" v="{:4.2f},"/>'.format(
-                    i + 1, iir["gain"]
-                )
-            )
 
-        for i, iir in enumerate(iirs):
-            rme = type2rme(iir["type"], i + 1)
-            if rme == -1:
-                print("skip eq at pos {} type is unknown {}", i+1, iir["type"])
-                continue
-            lines.append(
-                '        <val e="REQ Band{} Type" v="{:4.2f},"/>'.format(
-                    i + 1, rme
-                )
-            )
+    # fit or clamp each channel, an empty right channel copies the left one
+    left = constrain_iirs(left, RME_ROOM_CONSTRAINTS, "TotalMix room EQ left channel")
+    if len(right) > 0:
+        right = constrain_iirs(right, RME_ROOM_CONSTRAINTS, "TotalMix room EQ right channel")
 
-    lines.append("<Preset>")
+    return rme_totalmix_room_render(left, right)
 
-    preamp_gain = 0.0
-    lines.append("  <Room EQ L>")
-    lines.append("    <Params>")
-    lines.append('	<val e="REQ Delay" v="0.00,"/>')
-    process(left)
-    lines.append('	<val e="REQ Chan Gain" v="{},"/>'.format(preamp_gain))
-    lines.append("    </Params>")
-    lines.append("  </Room EQ L>")
 
-    preamp_gain = 0.0
-    lines.append("  <Room EQ R>")
-    lines.append("    <Params>")
-    lines.append('	<val e="REQ Delay" v="0.00,"/>')
-    if len(right) > 0:
-        process(right)
-    else:
-        process(left)
-    lines.append('	<val e="REQ Chan Gain" v="{},"/>'.format(preamp_gain))
-    lines.append("    </Params>")
-    lines.append("  </Room EQ R>")
-
-    lines.append("</Preset>")
-    return True, "\n".join(lines)
+def iir2rme_totalmix_room(left: list, right: list) -> tuple[STATUS, str]:
+    return True, "".join(iir2rme_totalmix_room_pieces(left, right))
+
+
+def iir2rme_totalmix_room_stream(left: list, right: list, stream: TextIO) -> STATUS:
+    stream.writelines(iir2rme_totalmix_room_pieces(left, right))
+    return True
+
+
+def iir2rme_totalmix_catalog(catalog: dict[str, IIR]) -> dict[str, tuple[str, str]]:
+    """Render channel and room TotalMix presets for a whole catalog.
+
+    Args:
+        catalog: EQs by name
+
+    Returns:
+        For each name, the channel (tmeq) and room (tmreq) presets
+    """
+    result = {}
+    for name, iirs in catalog.items():
+        _, channel = iir2rme_totalmix_channel(iirs)
+        _, room = iir2rme_totalmix_room(iirs, [])
+        result[name] = (channel, room)
+    return result
+
+
+def write_rme_totalmix_catalog(catalog: dict[str, IIR], directory: str) -> int:
+    """Write channel and room TotalMix presets for a whole catalog.
+
+    Args:
+        catalog: EQs by name
+        directory: Where to write name.tmeq and name.tmreq
+
+    Returns:
+        Number of files written
+    """
+    path = pathlib.Path(directory)
+    path.mkdir(parents=True, exist_ok=True)
+    count = 0
+    for name, iirs in catalog.items():
+        with open(path / f"{name}.tmeq", "w", encoding="ascii") as fd:
+            iir2rme_totalmix_channel_stream(iirs, fd)
+        with open(path / f"{name}.tmreq", "w", encoding="ascii") as fd:
+            iir2rme_totalmix_room_stream(iirs, [], fd)
+        count += 2
+    return count
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""Async access to the sqlite database without blocking the event loop.
+
+sqlite calls block, so the backend never runs them on the event loop:
+
+    reads   run on a small pool of threads, each with its own connection;
+            in WAL mode they proceed in parallel with each other and with
+            the writer
+    writes  are queued to one writer thread that owns the only write
+            connection; it gathers the writes arriving within commit_delay
+            of the first one, up to max_batch, and runs them in a single
+            transaction (group commit), each in its own savepoint so a
+            failing write does not undo the others
+
+How long a write waits depends on the durability level:
+
+    full      the caller waits for the commit, which is synced to disk
+    normal    the caller waits for the commit; in WAL mode it survives a
+              crash of the process but the last transactions may be lost
+              on power failure, the disk is synced at checkpoints
+    buffered  write behind: the caller only waits for the queue, errors
+              are logged; a crash of the process loses the pending writes
+
+Queries are plain functions taking a connection:
+
+    def count(connection):
+        return connection.cursor().execute("SELECT COUNT(*) FROM eqs").fetchone()[0]
+
+    n = await database.read(count)
+
+Time spent waiting for a thread is recorded per kind of query, and so is
+the number of writes per transaction.
+"""
+
+import asyncio
+import concurrent.futures
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections.abc import Callable
+from typing import Any
+
+import metrics
+
+DB_READERS = 4
+# longest wait for a lock held by another process, seconds
+DB_TIMEOUT = 5.0
+# how long the writer waits for more writes before committing, seconds
+DB_COMMIT_DELAY = 0.002
+DB_MAX_BATCH = 256
+
+# level -> (PRAGMA synchronous, whether callers wait for the commit)
+DURABILITY_LEVELS = {
+    "full": ("FULL", True),
+    "normal": ("NORMAL", True),
+    "buffered": ("NORMAL", False),
+}
+
+
+class Database:
+    def __init__(
+        self,
+        path: str,
+        readers: int = DB_READERS,
+        factory: type[sqlite3.Connection] = sqlite3.Connection,
+        durability: str = "normal",
+        commit_delay: float = DB_COMMIT_DELAY,
+        max_batch: int = DB_MAX_BATCH,
+    ):
+        if durability not in DURABILITY_LEVELS:
+            msg = "unknown durability {}, expected one of {}".format(
+                durability, ", ".join(DURABILITY_LEVELS)
+            )
+            raise ValueError(msg)
+        self.path = path
+        self.factory = factory
+        self.durability = durability
+        self.commit_delay = commit_delay
+        self.max_batch = max(1, max_batch)
+        # a process forked from this one must not use its threads
+        self.pid = os.getpid()
+        self._local = threading.local()
+        self._connections: list[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        self._readers = concurrent.futures.ThreadPoolExecutor(
+            max_workers=readers, thread_name_prefix="db-read"
+        )
+        self._writes: queue.SimpleQueue = queue.SimpleQueue()
+        self._writer: threading.Thread | None = None
+        self._writer_lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(
+            self.path, timeout=DB_TIMEOUT, factory=self.factory, check_same_thread=False
+        )
+        with self._connections_lock:
+            self._connections.append(connection)
+        return connection
+
+    def _reader_connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+        return connection
+
+    # ------------------------------------------------------------------
+    # reads
+    # ------------------------------------------------------------------
+
+    def _run_read(self, queued: float, query: Callable, args: tuple):
+        metrics.DB_QUEUE_LATENCY.observe(time.perf_counter() - queued, "read")
+        return query(self._reader_connection(), *args)
+
+    async def read(self, query: Callable[..., Any], *args) -> Any:
+        """the result of query(connection, *args) run on a reader thread"""
+        return await asyncio.wrap_future(self.submit_read(query, *args))
+
+    def submit_read(self, query: Callable[..., Any], *args) -> concurrent.futures.Future:
+        return self._readers.submit(self._run_read, time.perf_counter(), query, args)
+
+    # ------------------------------------------------------------------
+    # writes
+    # ------------------------------------------------------------------
+
+    async def write(self, query: Callable[..., Any], *args) -> Any:
+        """the result of query(connection, *args) once it is committed
+
+        With buffered durability it returns None as soon as the write is
+        queued.
+        """
+        future = self.submit_write(query, *args)
+        if not DURABILITY_LEVELS[self.durability][1]:
+            future.add_done_callback(_log_failure)
+            return None
+        return await asyncio.wrap_future(future)
+
+    def submit_write(self, query: Callable[..., Any], *args) -> concurrent.futures.Future:
+        future = concurrent.futures.Future()
+        self._start_writer()
+        self._writes.put((time.perf_counter(), query, args, future))
+        return future
+
+    def _start_writer(self) -> None:
+        if self._writer is not None:
+            return
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(
+                    target=self._write_loop, name="db-write", daemon=True
+                )
+                self._writer.start()
+
+    def _write_loop(self) -> None:
+        connection = self._connect()
+        # transactions are explicit
+        connection.isolation_level = None
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            "PRAGMA synchronous={}".format(DURABILITY_LEVELS[self.durability][0])
+        )
+        stop = False
+        while not stop:
+            batch = [self._writes.get()]
+            deadline = time.perf_counter() + self.commit_delay
+            while len(batch) < self.max_batch and batch[-1] is not None:
+                timeout = deadline - time.perf_counter()
+                try:
+                    if timeout > 0:
+                        batch.append(self._writes.get(timeout=timeout))
+                    else:
+                        batch.append(self._writes.get_nowait())
+                except queue.Empty:
+                    break
+            if batch[-1] is None:
+                stop = True
+                batch.pop()
+            if batch:
+                self._commit(connection, batch)
+
+    def _commit(self, connection: sqlite3.Connection, batch: list) -> None:
+        now = time.perf_counter()
+        results = []
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            for queued, query, args, future in batch:
+                metrics.DB_QUEUE_LATENCY.observe(now - queued, "write")
+                if not future.set_running_or_notify_cancel():
+                    continue
+                connection.execute("SAVEPOINT write")
+                try:
+                    result = query(connection, *args)
+                except Exception as e:
+                    connection.execute("ROLLBACK TO write")
+                    connection.execute("RELEASE write")
+                    future.set_exception(e)
+                    continue
+                connection.execute("RELEASE write")
+                results.append((future, result))
+            connection.execute("COMMIT")
+        except sqlite3.Error as e:
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            for future, _ in results:
+                future.set_exception(e)
+            for _, _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        metrics.DB_WRITE_BATCH.observe(len(results))
+        for future, result in results:
+            future.set_result(result)
+
+    # ------------------------------------------------------------------
+
+    def pending_writes(self) -> int:
+        return self._writes.qsize()
+
+    def close(self) -> None:
+        """finish queued writes and close every connection"""
+        if self._writer is not None:
+            self._writes.put(None)
+            self._writer.join()
+            self._writer = None
+        self._readers.shutdown(wait=True)
+        with self._connections_lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections.clear()
+
+
+def _log_failure(future: concurrent.futures.Future) -> None:
+    if not future.cancelled() and future.exception() is not None:
+        logging.error("Buffered write failed: %s", future.exception())
@@ -5,13 +5,9 @@ import os
 import pathlib
 import sys
 
-from converter import (
-    file2iir,
-    iir2aupreset,
-    PRESET_DIR,
-    iir2rme_totalmix_channel,
-    iir2rme_totalmix_room,
-)
+from converter import file2iir
+import profiling
+from targets import convert, get_target, known_targets
 
 
 def usage():
@@ -22,7 +18,7 @@ def usage():
     )
     print("Parameters")
     print("    *infile* the name of your eq files separated by comma.")
-    print("    *format* can be one of aupreset, apo, rmetmeq, rmetmreq.")
+    print("    *format* can be one of {}.".format(", ".join(known_targets())))
     print(
         "    *outfile* the name of the generated eq file, if not specified stdout will be used."
     )
@@ -59,12 +55,7 @@ def main():
     cond_input_exists = not os.path.exists(files[0])
     cond_input_file = not os.path.isfile(files[0])
     cond_no_format = sys.argv[3] != "-format"
-    cond_unknown_format = sys.argv[4] not in (
-        "apo",
-        "aupreset",
-        "rmetmeq",
-        "rmetmreq",
-    )
+    cond_unknown_format = get_target(sys.argv[4]) is None
     cond_output = len(sys.argv) > 5 and sys.argv[5] != "-output"
     if (
         cond_too_short
@@ -113,59 +104,41 @@ def main():
         print("Parsing failed! for {}".format(rew_filename))
         return 1
 
-    success = True
-    result = ""
-    output = ""
-    if output_format == "aupreset":
-        success, result = iir2aupreset(iir, preset_name)
-        if not success:
-            print("Generation failed! for {}".format(rew_filename))
-            return success
-        output = "{}.aupreset".format(rew_base)
-    elif output_format == "rmetmeq":
-        success, result = iir2rme_totalmix_channel(iir)
-        if not success:
-            print("Generation failed! for {}".format(rew_filename))
-            return success
-        output = "{}.tmeq".format(rew_base)
-    elif output_format == "rmetmreq":
-        if len(files) == 1:
-            success, result = iir2rme_totalmix_room(iir, [])
-            if not success:
-                print("Converting to RME room eq failed {}".format(files[0]))
-                return 1
-            output = "{}.tmreq".format(rew_base)
-        elif len(files) == 2:
-            iir_left = iir
-            success, iir_right = file2iir(files[1])
-            if not success or len(iir_right) == 0:
-                print("Parsing failed! for {}".format(files[1]))
-                return 1
-            success, result = iir2rme_totalmix_room(iir_left, iir_right)
-            if not success:
-                print(
-                    "Converting to RME room eq failed for {} and {}".format(
-                        files[0], files[1]
-                    )
-                )
-                return 1
-            output = "{}.tmreq".format(rew_base)
-        else:
-            print(
-                "Warning: RME TotalMix Room EQ takes at most 2 EQs (left, right)"
+    target = get_target(output_format)
+    if len(files) > target.max_channels:
+        print(
+            "Warning: {} takes at most {} EQs".format(
+                target.description, target.max_channels
             )
-        if not success:
-            print("Generation failed! for {}".format(rew_filename))
-            return success
+        )
+        return 1
+
+    iirs = [iir]
+    for filename in files[1:]:
+        success, iir_other = file2iir(filename)
+        if not success or len(iir_other) == 0:
+            print("Parsing failed! for {}".format(filename))
+            return 1
+        iirs.append(iir_other)
+
+    success, result = convert(target.name, iirs, preset_name)
+    if not success:
+        print("Generation failed! for {}: {}".format(rew_filename, result))
+        return 1
+    output = "{}.{}".format(rew_base, target.extension)
+    if len(sys.argv) > 6:
+        output = sys.argv[6]
 
     if len(sys.argv) == 5:
         print("Generated file:")
         print(result)
         return 0
 
-    if output_format == "aupreset" and sys.argv[-1] == "-install":
-        PRESET_DIR.mkdir(mode=0o755, parents=True, exist_ok=True)
-        output = "{}/{}.aupreset".format(PRESET_DIR, preset_name)
+    if target.install_dir is not None and sys.argv[-1] == "-install":
+        target.install_dir.mkdir(mode=0o755, parents=True, exist_ok=True)
+        output = "{}/{}.{}".format(
+            target.install_dir, preset_name, target.extension
+        )
 
     try:
         with open(output, "w", encoding="ascii") as fd:
@@ -176,4 +149,4 @@ def main():
 
 
 if __name__ == "__main__":
-    sys.exit(main())
+    sys.exit(profiling.run("eq2eq", main))
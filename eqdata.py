@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""Read eqdata.json one speaker at a time.
+
+eqdata.json is a single object, speaker name -> entry. The scanner walks
+the bytes of the file (an mmap, so nothing is loaded up front) and yields
+the name and the byte range of each entry without parsing it: callers
+decode only the entries they need.
+
+The backend keeps an EqdataIndex per version of the file (its mtime and
+size): the byte ranges of all speakers plus the last speakers parsed.
+"""
+
+import contextlib
+import functools
+import json
+import mmap
+import os
+import re
+import weakref
+from collections.abc import Iterator
+
+_WHITESPACE = re.compile(rb"[ \t\n\r]*")
+_STRING_END = re.compile(rb'["\\]')
+# up to the next bracket outside of a string, that bracket is group 1
+_NESTED = re.compile(rb'[^"\[\]{}]*+(?:"(?:[^"\\]++|\\.)*+"[^"\[\]{}]*+)*+([\[\]{}])', re.DOTALL)
+_SCALAR_END = re.compile(rb"[^,}\] \t\n\r]*")
+
+_QUOTE = ord('"')
+_BACKSLASH = ord("\\")
+_OPENING = frozenset(b"{[")
+
+
+def _error(message: str, pos: int) -> ValueError:
+    return ValueError("malformed eqdata: {} at byte {}".format(message, pos))
+
+
+def _skip(buffer, pos: int) -> int:
+    return _WHITESPACE.match(buffer, pos).end()
+
+
+def _expect(buffer, pos: int, char: bytes) -> int:
+    pos = _skip(buffer, pos)
+    if buffer[pos : pos + 1] != char:
+        msg = "expected {!r}".format(char.decode())
+        raise _error(msg, pos)
+    return pos + 1
+
+
+def _string_end(buffer, pos: int) -> int:
+    """end of the string whose opening quote is before pos"""
+    while True:
+        match = _STRING_END.search(buffer, pos)
+        if match is None:
+            msg = "unterminated string"
+            raise _error(msg, pos)
+        if buffer[match.start()] == _BACKSLASH:
+            pos = match.start() + 2
+            continue
+        return match.end()
+
+
+def _value_end(buffer, pos: int) -> int:
+    """end of the json value starting at pos"""
+    first = buffer[pos]
+    if first == _QUOTE:
+        return _string_end(buffer, pos + 1)
+    if first not in _OPENING:
+        return _SCALAR_END.match(buffer, pos).end()
+    depth = 0
+    while True:
+        match = _NESTED.match(buffer, pos)
+        if match is None:
+            msg = "unterminated value"
+            raise _error(msg, pos)
+        pos = match.end()
+        depth += 1 if buffer[pos - 1] in _OPENING else -1
+        if depth == 0:
+            return pos
+
+
+def scan_entries(buffer) -> Iterator[tuple[str, int, int]]:
+    """name, start and end byte of each entry of the top level object"""
+    pos = _expect(buffer, 0, b"{")
+    pos = _skip(buffer, pos)
+    if buffer[pos : pos + 1] == b"}":
+        return
+    while True:
+        pos = _skip(buffer, pos)
+        if buffer[pos : pos + 1] != b'"':
+            msg = "expected a name"
+            raise _error(msg, pos)
+        end = _string_end(buffer, pos + 1)
+        name = json.loads(bytes(buffer[pos:end]))
+        pos = _skip(buffer, _expect(buffer, end, b":"))
+        end = _value_end(buffer, pos)
+        yield name, pos, end
+        pos = _skip(buffer, end)
+        separator = buffer[pos : pos + 1]
+        if separator == b"}":
+            return
+        if separator != b",":
+            msg = "expected ',' or '}'"
+            raise _error(msg, pos)
+        pos += 1
+
+
+@contextlib.contextmanager
+def open_eqdata(path: str):
+    """eqdata.json mapped read only; an empty file maps to b"" """
+    with open(path, "rb") as fd:
+        try:
+            buffer = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # mmap refuses empty files
+            yield b""
+            return
+        with buffer:
+            yield buffer
+
+
+def iter_eqdata(path: str) -> Iterator[tuple[str, bytes]]:
+    """name and raw json of each speaker of eqdata.json"""
+    with open_eqdata(path) as buffer:
+        if not buffer:
+            return
+        for name, start, end in scan_entries(buffer):
+            yield name, buffer[start:end]
+
+
+# speakers kept parsed in each worker
+HOT_ENTRIES = 256
+
+
+class EqdataIndex:
+    """byte range of each speaker of an eqdata.json, entries parsed on demand
+
+    Entries are read with pread on the file the index was built from, not
+    through the mmap: a file rewritten in place would make the mapping fault,
+    a short read only fails to parse until the index is rebuilt.
+    """
+
+    def __init__(self, path: str, ranges: dict[str, tuple[int, int]]):
+        self.path = path
+        self.ranges = ranges
+        self._fd = os.open(path, os.O_RDONLY)
+        weakref.finalize(self, os.close, self._fd)
+
+    @classmethod
+    def build(cls, path: str) -> "EqdataIndex":
+        with open_eqdata(path) as buffer:
+            ranges = {}
+            if buffer:
+                ranges = {name: (start, end) for name, start, end in scan_entries(buffer)}
+        return cls(path, ranges)
+
+    def __len__(self) -> int:
+        return len(self.ranges)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.ranges
+
+    def raw(self, name: str) -> bytes:
+        start, end = self.ranges[name]
+        return os.pread(self._fd, end - start, start)
+
+    def get(self, name: str, default=None):
+        """the parsed entry of a speaker, shared between calls: do not modify it"""
+        if name not in self.ranges:
+            return default
+        return _hot_entry(self, name)
+
+
+@functools.lru_cache(maxsize=HOT_ENTRIES)
+def _hot_entry(index: EqdataIndex, name: str):
+    return json.loads(index.raw(name))
+
+
+@functools.lru_cache(maxsize=1)
+def _load_index(path: str, mtime_ns: int, size: int) -> EqdataIndex:
+    _hot_entry.cache_clear()
+    return EqdataIndex.build(path)
+
+
+def eqdata_index(path: str) -> EqdataIndex:
+    """the index of the eqdata.json in path, rebuilt when the file changes"""
+    stat = os.stat(path)
+    return _load_index(path, stat.st_mtime_ns, stat.st_size)
+
+
+def eqdata_index_cache_info():
+    return _load_index.cache_info()
+
+
+def eqdata_entry_cache_info():
+    return _hot_entry.cache_info()
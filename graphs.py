@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""Payloads for the frequency response graphs.
+
+A graph is a frequency axis shared by one or more curves. It is sent either
+as JSON, optionally rounded, or as a compact little endian binary payload:
+
+    magic      4 bytes  b"EQG1"
+    itemsize   uint8    bytes per curve value, 4 (float32) or 2 (float16)
+    padding    3 bytes
+    n_points   uint32
+    n_curves   uint32
+    freq       float32 * n_points
+    curves     itemsize * n_curves * n_points, one curve after the other
+
+Frequencies are always float32: float16 cannot resolve them above a few kHz.
+"""
+
+import struct
+
+import numpy as np
+
+GRAPH_MAGIC = b"EQG1"
+GRAPH_HEADER = struct.Struct("<4sB3xII")
+GRAPH_DTYPES = {"f32": np.dtype("<f4"), "f16": np.dtype("<f2")}
+GRAPH_FORMATS = ("json", *GRAPH_DTYPES)
+GRAPH_MEDIA_TYPE = "application/octet-stream"
+
+GRAPH_DEFAULT_POINTS = 200
+GRAPH_MIN_POINTS = 10
+GRAPH_MAX_POINTS = 2000
+GRAPH_MAX_PRECISION = 6
+
+
+def graph_round(
+    freq: np.ndarray, curves: np.ndarray, precision: int | None = None
+) -> tuple[np.ndarray, np.ndarray]:
+    """frequencies and curves rounded to precision decimals"""
+    if precision is not None:
+        freq = np.round(freq, precision)
+        curves = np.round(curves, precision)
+    return freq, curves
+
+
+def graph_json(
+    freq: np.ndarray, curves: np.ndarray, precision: int | None = None
+) -> tuple[list[float], list[list[float]]]:
+    """frequencies and curves as lists, rounded to precision decimals"""
+    freq, curves = graph_round(freq, curves, precision)
+    return freq.tolist(), curves.tolist()
+
+
+def graph_curves(bank: np.ndarray) -> np.ndarray:
+    """the total of a filter bank followed by its rows"""
+    return np.vstack((bank.sum(axis=0), bank))
+
+
+def graph_content(freq: np.ndarray, curves: np.ndarray) -> dict:
+    """json document of /eq/graph from graph_curves"""
+    spl, *details = curves
+    return {"freq": freq, "spl": spl, "details": dict(enumerate(details))}
+
+
+def graph_spl_content(freq: np.ndarray, spl: np.ndarray) -> dict:
+    """json document of /eq/graph_spl"""
+    return {"freq": freq, "spl": spl}
+
+
+def graph_spl_details_content(freq: np.ndarray, bank: np.ndarray) -> dict:
+    """json document of /eq/graph_spl_details"""
+    return {"freq": freq, "spl": dict(enumerate(bank))}
+
+
+def graph_encode(freq: np.ndarray, curves: np.ndarray, fmt: str) -> bytes:
+    """the binary payload of a graph, curves has one row per curve"""
+    dtype = GRAPH_DTYPES[fmt]
+    n_curves, n_points = curves.shape
+    return b"".join(
+        (
+            GRAPH_HEADER.pack(GRAPH_MAGIC, dtype.itemsize, n_points, n_curves),
+            np.asarray(freq, dtype="<f4").tobytes(),
+            np.asarray(curves, dtype=dtype).tobytes(),
+        )
+    )
+
+
+def graph_decode(buffer: bytes) -> tuple[np.ndarray, np.ndarray]:
+    """frequencies and curves from a binary payload"""
+    magic, itemsize, n_points, n_curves = GRAPH_HEADER.unpack_from(buffer)
+    if magic != GRAPH_MAGIC:
+        msg = "not a graph payload"
+        raise ValueError(msg)
+    dtype = np.dtype("<f4") if itemsize == 4 else np.dtype("<f2")
+    offset = GRAPH_HEADER.size
+    freq = np.frombuffer(buffer, dtype="<f4", count=n_points, offset=offset)
+    offset += 4 * n_points
+    curves = np.frombuffer(buffer, dtype=dtype, count=n_points * n_curves, offset=offset)
+    return freq, curves.reshape(n_curves, n_points)
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""gunicorn settings for the backend.
+
+    gunicorn backend:backend        run from the backend directory
+
+The master packs the catalog before it forks the workers, and again on a
+reload (kill -HUP), so all workers map the same file, see packed.py. Until
+then, workers notice a catalog newer than the packed file and read the
+json files themselves.
+"""
+
+import multiprocessing
+import os
+
+bind = os.getenv("EQCONVERTER_BIND", "127.0.0.1:9999")
+workers = int(os.getenv("EQCONVERTER_WORKERS", str(multiprocessing.cpu_count())))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# inherited by the workers
+os.environ.setdefault("EQCONVERTER_PACKED", "catalog.pack")
+# rendered bodies shared by the workers and kept across restarts
+os.environ.setdefault("EQCONVERTER_CACHE", "sqlite:render-cache.db")
+# downloads are sent by nginx, see location /_artifacts/ in etc/nginx-prod.conf
+os.environ.setdefault("EQCONVERTER_ARTIFACTS", os.path.abspath("artifacts"))
+os.environ.setdefault("EQCONVERTER_ACCEL_REDIRECT", "/_artifacts/")
+
+
+def pack_catalog(server):
+    # backend reads its environment when imported
+    from scripts.pack import pack  # noqa: PLC0415
+
+    path = os.environ["EQCONVERTER_PACKED"]
+    try:
+        written = pack(path)
+    except (OSError, ValueError) as e:
+        server.log.warning("Cannot pack the catalog in %s: %s", path, e)
+        return
+    server.log.info("Catalog %s %s", path, "packed" if written else "up to date")
+
+
+def on_starting(server):
+    pack_catalog(server)
+
+
+def on_reload(server):
+    pack_catalog(server)
@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+import logging
+import math
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+from iir.filter_iir import Biquad, Vector, Peq, np_biquads_log_result
+from iir.filter_peq import peq_build
+from iir.filter_reduce import peq_reduce
+
+GAIN_TYPES = frozenset((Biquad.PEAK, Biquad.LOWSHELF, Biquad.HIGHSHELF))
+
+
+@dataclass(frozen=True)
+class PeqConstraints:
+    """what a target can represent
+
+    slot_types gives the allowed Biquad types for each slot; its length is the
+    maximum number of bands.
+    """
+
+    slot_types: tuple[frozenset[int], ...]
+    freq_range: tuple[float, float] = (20.0, 20000.0)
+    q_range: tuple[float, float] = (0.1, 20.0)
+    gain_range: tuple[float, float] = (-20.0, 20.0)
+    gain_step: float = 0.0
+
+    @property
+    def max_bands(self) -> int:
+        return len(self.slot_types)
+
+
+@dataclass(frozen=True)
+class FitReport:
+    """quality of a fit, errors are in dB over the frequency grid"""
+
+    fitted: bool
+    initial_error: float
+    error: float
+    max_error: float
+    iterations: int
+    elapsed: float
+
+    def __str__(self):
+        return (
+            "rms error {:.2f} dB (initial {:.2f} dB), max error {:.2f} dB, "
+            "{} iterations in {:.1f} ms".format(
+                self.error,
+                self.initial_error,
+                self.max_error,
+                self.iterations,
+                self.elapsed * 1000,
+            )
+        )
+
+
+def peq_satisfies(peq: Peq, constraints: PeqConstraints) -> bool:
+    """check that a peq can be written as is on a target"""
+    if len(peq) > constraints.max_bands:
+        return False
+    fmin, fmax = constraints.freq_range
+    qmin, qmax = constraints.q_range
+    gmin, gmax = constraints.gain_range
+    for (_, iir), allowed in zip(peq, constraints.slot_types, strict=False):
+        if iir.typ not in allowed or not fmin <= iir.freq <= fmax:
+            return False
+        if iir.typ != Biquad.NOTCH and not qmin <= iir.q <= qmax:
+            return False
+        if iir.typ in GAIN_TYPES and not gmin <= iir.db_gain <= gmax:
+            return False
+    return True
+
+
+def _place(peq: Peq, constraints: PeqConstraints) -> Peq:
+    """assign each filter to an allowed slot, converting it if required
+
+    The most constrained filters are placed first, on the free allowed slot
+    closest to their position. Holes before the last used slot are filled
+    with flat peaks.
+    """
+    slots: list = [None] * constraints.max_bands
+    order = sorted(
+        range(len(peq)),
+        key=lambda i: sum(peq[i][1].typ in t for t in constraints.slot_types),
+    )
+    pending = []
+    for i in order:
+        free = [
+            s
+            for s, allowed in enumerate(constraints.slot_types)
+            if slots[s] is None and peq[i][1].typ in allowed
+        ]
+        if len(free) == 0:
+            pending.append(i)
+            continue
+        slots[min(free, key=lambda s, i=i: abs(s - i))] = peq[i]
+    for i in pending:
+        w, iir = peq[i]
+        free = [s for s in range(len(slots)) if slots[s] is None]
+        s = min(free, key=lambda s, i=i: abs(s - i))
+        allowed = constraints.slot_types[s]
+        typ = Biquad.PEAK if Biquad.PEAK in allowed else min(allowed)
+        slots[s] = (w, Biquad(typ, iir.freq, iir.srate, iir.q, iir.db_gain))
+    used = [s for s in range(len(slots)) if slots[s] is not None]
+    placed = []
+    srate = peq[0][1].srate if len(peq) > 0 else 48000
+    for s in range(used[-1] + 1 if len(used) > 0 else 0):
+        if slots[s] is None:
+            allowed = constraints.slot_types[s]
+            typ = Biquad.PEAK if Biquad.PEAK in allowed else min(allowed)
+            slots[s] = (1.0, Biquad(typ, 1000.0, srate, 1.0, 0.0))
+        placed.append(slots[s])
+    return placed
+
+
+def peq_fit(
+    freq: Vector,
+    peq: Peq,
+    constraints: PeqConstraints,
+    budget: float = 5.0,
+    max_iter: int = 100,
+    tolerance: float = 0.1,
+) -> tuple[Peq, FitReport]:
+    """fit a peq that satisfies constraints to the response of peq
+
+    A peq that already satisfies the constraints is returned unchanged.
+    Otherwise the filters are reduced to the number of slots, placed on
+    allowed slots and then frequency, Q and gain of every slot are optimized
+    with Adam on the mean squared dB error. Gradients are computed by central
+    differences for all slots at once over the shared frequency grid. The
+    optimization stops after max_iter iterations or when the rms error goes
+    below tolerance dB, so the result does not depend on the machine load.
+    budget (in seconds) is a safety cutoff far above the time max_iter
+    takes; hitting it is logged since the result then depends on timing.
+    """
+    start = time.perf_counter()
+    freq_array = np.asarray(freq, dtype=float)
+    target = peq_build(freq_array, peq)
+
+    def report(initial, current, iterations, *, fitted):
+        diff = peq_build(freq_array, current) - target
+        return FitReport(
+            fitted=fitted,
+            initial_error=initial,
+            error=float(np.sqrt(np.mean(np.square(diff)))),
+            max_error=float(np.max(np.abs(diff))) if len(diff) > 0 else 0.0,
+            iterations=iterations,
+            elapsed=time.perf_counter() - start,
+        )
+
+    if peq_satisfies(peq, constraints):
+        return list(peq), report(0.0, peq, 0, fitted=False)
+
+    _, reduced, _ = peq_reduce(
+        freq_array, peq, constraints.max_bands, gain_step=constraints.gain_step
+    )
+    placed = _place(reduced, constraints)
+    if len(placed) == 0:
+        return placed, report(0.0, placed, 0, fitted=True)
+
+    srate = placed[0][1].srate
+    weights = np.array([w for w, _ in placed])
+    typ = np.array([iir.typ for _, iir in placed])
+    has_gain = np.isin(typ, list(GAIN_TYPES))
+    fmin, fmax = constraints.freq_range
+    qmin, qmax = constraints.q_range
+    gmin, gmax = constraints.gain_range
+    # optimize in a space where steps are comparable: octaves, log2(q), dB
+    lower = np.array([math.log2(fmin), math.log2(qmin), gmin])
+    upper = np.array([math.log2(fmax), math.log2(qmax), gmax])
+    theta = np.array(
+        [
+            [math.log2(iir.freq), math.log2(max(iir.q, 1.0e-3)), iir.db_gain]
+            for _, iir in placed
+        ]
+    )
+    theta = np.clip(theta, lower, upper)
+    theta[~has_gain, 2] = 0.0
+    n = len(placed)
+
+    def responses(params, types):
+        return np_biquads_log_result(
+            types,
+            np.exp2(params[:, 0]),
+            srate,
+            np.exp2(params[:, 1]),
+            params[:, 2],
+            freq_array,
+        )
+
+    def loss(params):
+        diff = (weights[:, None] * responses(params, typ)).sum(axis=0) - target
+        return float(np.mean(np.square(diff))), diff
+
+    initial_loss, _ = loss(theta)
+    initial_error = math.sqrt(initial_loss)
+    best_loss, best_theta = initial_loss, theta.copy()
+
+    # central differences: 6 perturbed copies of every slot in one evaluation
+    h = np.array([1.0e-3, 1.0e-3, 1.0e-2])
+    perturb = np.concatenate([np.diag(h), -np.diag(h)])
+    perturbed_typ = np.repeat(typ, 6)
+    learning_rate = np.array([0.05, 0.05, 0.2])
+    beta1, beta2, eps = 0.9, 0.999, 1.0e-8
+    m = np.zeros_like(theta)
+    v = np.zeros_like(theta)
+    mask = np.ones_like(theta)
+    mask[~has_gain, 2] = 0.0
+
+    iterations = 0
+    while iterations < max_iter and math.sqrt(best_loss) > tolerance:
+        if time.perf_counter() - start >= budget:
+            logging.warning(
+                "peq_fit stopped by its %.1fs budget after %d of %d iterations",
+                budget,
+                iterations,
+                max_iter,
+            )
+            break
+        iterations += 1
+        current_loss, diff = loss(theta)
+        if current_loss < best_loss:
+            best_loss, best_theta = current_loss, theta.copy()
+        perturbed = (theta[:, None, :] + perturb[None, :, :]).reshape(n * 6, 3)
+        r = responses(perturbed, perturbed_typ).reshape(n, 6, len(freq_array))
+        dr = (r[:, :3, :] - r[:, 3:, :]) / (2.0 * h[None, :, None])
+        grad = 2.0 * np.mean(
+            weights[:, None, None] * dr * diff[None, None, :], axis=2
+        )
+        grad *= mask
+        m = beta1 * m + (1 - beta1) * grad
+        v = beta2 * v + (1 - beta2) * np.square(grad)
+        m_hat = m / (1 - beta1**iterations)
+        v_hat = v / (1 - beta2**iterations)
+        theta = np.clip(
+            theta - learning_rate * m_hat / (np.sqrt(v_hat) + eps), lower, upper
+        )
+    current_loss, _ = loss(theta)
+    if current_loss < best_loss:
+        best_theta = theta
+
+    fitted = []
+    for (w, iir), (log_freq, log_q, raw_gain) in zip(
+        placed, best_theta.tolist(), strict=True
+    ):
+        gain = raw_gain
+        if iir.typ in GAIN_TYPES and constraints.gain_step > 0.0:
+            step = constraints.gain_step
+            gain = round(round(raw_gain / step) * step, 6)
+        fitted.append(
+            (w, Biquad(iir.typ, 2**log_freq, srate, 2**log_q, gain))
+        )
+    return fitted, report(initial_error, fitted, iterations, fitted=True)
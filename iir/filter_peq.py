@@ -1,22 +1,232 @@
 # -*- coding: utf-8 -*-
+import functools
 import math
 import logging
+from collections.abc import Iterator, Sequence
+from dataclasses import dataclass
+
 import numpy as np
+import numpy.typing as npt
 
 
 from iir.filter_iir import Biquad, Vector, Peq
+from iir.filter_iir import NP_RESPONSE_FLOOR, np_log_response, np_phi, np_response, np_scratch
+
+
+@functools.lru_cache(maxsize=8)
+def peq_freq_grid(n_points: int = 1000) -> np.ndarray:
+    """log spaced frequencies between 20Hz and 20kHz
+
+    The array is shared between callers and is read only.
+    """
+    freq = np.logspace(1 + math.log10(2), 4 + math.log10(2), n_points)
+    freq.flags.writeable = False
+    return freq
 
 
-def peq_build(freq: Vector, peq: Peq) -> Vector:
+def peq_build(freq: Vector, peq: Peq, dtype: npt.DTypeLike = np.float64) -> np.ndarray:
     """compute SPL for each frequency"""
     freq_array = np.asarray(freq)
-    current_filter = np.zeros_like(freq_array, dtype=float)
+    current_filter = np.zeros(freq_array.shape, dtype=dtype)
     if len(peq) > 0:
+        spl = np_scratch("peq_build", freq_array.shape, current_filter.dtype)
         for w, iir in peq:
-            current_filter += np.multiply(w, iir.np_log_result(freq_array))
+            iir.np_log_result(freq_array, out=spl)
+            if w != 1.0:
+                spl *= w
+            current_filter += spl
     return current_filter
 
 
+def peq_bank(freq: Vector, peq: Peq, dtype: npt.DTypeLike = np.float64) -> np.ndarray:
+    """compute the weighted SPL of each filter, one row per filter
+
+    All filters are evaluated at once from their coefficients, the SPL of
+    the peq is the sum of the rows.
+    """
+    freq_array = np.asarray(freq)
+    bank = np.empty((len(peq), len(freq_array)), dtype=dtype)
+    if len(peq) == 0:
+        return bank
+    srates = {iir.srate for _, iir in peq}
+    if len(srates) > 1:
+        for row, (_, iir) in zip(bank, peq, strict=True):
+            iir.np_log_result(freq_array, out=row)
+    else:
+        c = np.array([iir.response_coefficients() for _, iir in peq])
+        phi = np_phi(freq_array, srates.pop(), np_scratch("phi", freq_array.shape, bank.dtype))
+        np_log_response(c, phi, bank)
+    bank *= np.array([w for w, _ in peq], dtype=bank.dtype)[:, np.newaxis]
+    return bank
+
+
+# upper bound on the number of values evaluated at once, temporaries of
+# 512 KB stay in cache
+PEQ_BATCH_ELEMENTS = 1 << 16
+
+# a flat filter: numerator and denominator are 1 at every frequency
+_FLAT_COEFFICIENTS = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+
+
+def peq_pad(
+    peqs: Sequence[Peq],
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """coefficients of many peqs padded to the same number of filters
+
+    Return the (n_eqs, n_bands, 6) coefficients r_up0..r_dw2, the
+    (n_eqs, n_bands) weights, sample rates and mask, n_bands being the
+    largest number of filters. Padding filters are flat, have a weight of 0
+    and are false in the mask.
+    """
+    n_bands = max((len(peq) for peq in peqs), default=0)
+    coefficients = np.empty((len(peqs), n_bands, 6))
+    coefficients[:] = _FLAT_COEFFICIENTS
+    weights = np.zeros((len(peqs), n_bands))
+    srates = np.full((len(peqs), n_bands), 48000.0)
+    mask = np.zeros((len(peqs), n_bands), dtype=bool)
+    for i, peq in enumerate(peqs):
+        for j, (w, iir) in enumerate(peq):
+            coefficients[i, j] = iir.response_coefficients()
+            weights[i, j] = w
+            srates[i, j] = iir.srate
+        mask[i, : len(peq)] = True
+    return coefficients, weights, srates, mask
+
+
+def peq_batch_bank(
+    freq: Vector,
+    coefficients: np.ndarray,
+    weights: np.ndarray,
+    srates: np.ndarray,
+    dtype: npt.DTypeLike = np.float64,
+) -> np.ndarray:
+    """weighted SPL of every filter of padded peqs, (n_eqs, n_bands, n_freq)
+
+    Same computation as peq_bank, for a slice of what peq_pad returns.
+    """
+    freq_array = np.asarray(freq)
+    bank = np.empty(weights.shape + freq_array.shape, dtype=dtype)
+    # sin is only computed once per sample rate
+    rates, index = np.unique(srates, return_inverse=True)
+    phi = np.empty((len(rates), len(freq_array)), dtype=bank.dtype)
+    for row, rate in zip(phi, rates, strict=True):
+        np_phi(freq_array, rate, row)
+    if len(rates) > 1:
+        phi = phi[index.reshape(srates.shape)]
+    np_log_response(coefficients, phi, bank)
+    bank *= weights[:, :, np.newaxis]
+    return bank
+
+
+def peq_log_group(dtype: npt.DTypeLike) -> int:
+    """how many responses can be multiplied before their log is taken
+
+    That many NP_RESPONSE_FLOOR do not underflow: 15 in float64, 1 in
+    float32.
+    """
+    return max(1, int(math.log10(np.finfo(dtype).tiny) / math.log10(NP_RESPONSE_FLOOR)))
+
+
+def peq_batch_spl(
+    freq: Vector,
+    coefficients: np.ndarray,
+    weights: np.ndarray,
+    srates: np.ndarray,
+    mask: np.ndarray,
+    dtype: npt.DTypeLike = np.float64,
+) -> np.ndarray:
+    """SPL of padded peqs, (n_eqs, n_freq)
+
+    The sum of the 20*log10(sqrt(r)) of the filters is 10*log10 of the
+    product of their r: filters are evaluated one band at a time for all
+    peqs and multiplied, the log is taken once per peq_log_group filters.
+    Padding is skipped when the peqs are sorted by decreasing number of
+    filters.
+    """
+    freq_array = np.asarray(freq)
+    n_eqs, n_bands = weights.shape
+    spl = np.zeros((n_eqs, len(freq_array)), dtype=dtype)
+    group = peq_log_group(spl.dtype)
+    rates, index = np.unique(srates, return_inverse=True)
+    index = index.reshape(srates.shape)
+    phi = np.empty((len(rates), len(freq_array)), dtype=spl.dtype)
+    for row, rate in zip(phi, rates, strict=True):
+        np_phi(freq_array, rate, row)
+    product = np.ones_like(spl)
+    response = np.empty_like(spl)
+    for j in range(n_bands):
+        rows = int(np.count_nonzero(mask[:, j]))
+        if not mask[:rows, j].all():
+            rows = n_eqs
+        p = phi[0] if len(rates) == 1 else phi[index[:rows, j]]
+        r = np_response(coefficients[:rows, j], p, response[:rows])
+        w = weights[:rows, j]
+        if not np.all(w == 1.0):
+            # w * log(r) is log(r ** w), padding filters become 1
+            np.power(r, w[:, np.newaxis].astype(spl.dtype), out=r)
+        product[:rows] *= r
+        if (j + 1) % group == 0 or j + 1 == n_bands:
+            np.log10(product, out=product)
+            product *= 10.0
+            spl += product
+            product.fill(1.0)
+    return spl
+
+
+def peq_batch_banks(
+    freq: Vector, peqs: Sequence[Peq], max_elements: int = PEQ_BATCH_ELEMENTS
+) -> Iterator[tuple[int, np.ndarray, np.ndarray]]:
+    """evaluate many peqs by chunks of at most max_elements values
+
+    Yield the index of the first peq of the chunk, its (rows, n_bands,
+    n_freq) weighted banks and its (rows, n_bands) mask. The bank of
+    peqs[start + i] is bank[i][mask[i]].
+    """
+    coefficients, weights, srates, mask = peq_pad(peqs)
+    n_freq = len(np.asarray(freq))
+    rows = max(1, max_elements // max(1, coefficients.shape[1] * n_freq))
+    for start in range(0, len(peqs), rows):
+        end = start + rows
+        bank = peq_batch_bank(
+            freq, coefficients[start:end], weights[start:end], srates[start:end]
+        )
+        yield start, bank, mask[start:end]
+
+
+@dataclass(frozen=True)
+class PeqBatch:
+    """SPL of many peqs, one row or value per peq"""
+
+    freq: np.ndarray
+    spl: np.ndarray
+    preamp_gain: np.ndarray
+    peak_freq: np.ndarray
+
+
+def peq_batch(
+    peqs: Sequence[Peq],
+    freq: Vector | None = None,
+    max_elements: int = PEQ_BATCH_ELEMENTS,
+    dtype: npt.DTypeLike = np.float64,
+) -> PeqBatch:
+    """SPL, preamp gain and frequency of the maximum of many peqs at once
+
+    spl[i] is peq_build(freq, peqs[i]) and preamp_gain[i] is
+    peq_preamp_gain(peqs[i]) when freq is the default grid.
+    """
+    freq_array = peq_freq_grid(1000) if freq is None else np.asarray(freq, dtype=float)
+    # by decreasing number of filters, a chunk is padded to its first peq
+    order = np.argsort([-len(peq) for peq in peqs], kind="stable")
+    spl = np.empty((len(peqs), len(freq_array)), dtype=dtype)
+    rows = max(1, max_elements // max(1, len(freq_array)))
+    for start in range(0, len(peqs), rows):
+        chunk = order[start : start + rows]
+        spl[chunk] = peq_batch_spl(freq_array, *peq_pad([peqs[i] for i in chunk]), dtype)
+    preamp_gain = -np.max(np.clip(spl, 0, None), axis=1, initial=0.0)
+    peak_freq = freq_array[np.argmax(spl, axis=1)] if len(freq_array) else np.zeros(len(peqs))
+    return PeqBatch(freq_array, spl, preamp_gain, peak_freq)
+
+
 def peq_preamp_gain_conservative(peq: Peq) -> float:
     """compute preamp gain for a peq
 
@@ -24,7 +234,7 @@ def peq_preamp_gain_conservative(peq: Peq) -> float:
     It depends how it is implemented. For a computer, the other estimation is better.
     Note that we add 0.2 dB to have a margin for clipping
     """
-    freq = np.logspace(1 + math.log10(2), 4 + math.log10(2), 1000)
+    freq = peq_freq_grid(1000)
     spl = np.array(peq_build(freq, peq))
     individual = 0.0
     if len(peq) == 0:
@@ -47,7 +257,7 @@ def peq_preamp_gain_conservative(peq: Peq) -> float:
 
 def peq_preamp_gain(peq: Peq) -> float:
     """compute preamp gain for a peq"""
-    freq = np.logspace(1 + math.log10(2), 4 + math.log10(2), 1000)
+    freq = peq_freq_grid(1000)
     spl = np.array(peq_build(freq, peq))
     if len(peq) == 0:
         return 0.0
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+import itertools
+import math
+
+import numpy as np
+
+from iir.filter_iir import Biquad, Vector, Peq
+from iir.filter_peq import peq_build
+
+# filters where the gain is a free parameter
+GAIN_TYPES = (Biquad.PEAK, Biquad.LOWSHELF, Biquad.HIGHSHELF)
+
+# above this number of candidate subsets we switch from an exhaustive search
+# to a greedy backward elimination
+REDUCE_EXHAUSTIVE_MAX = 4096
+
+# relative ridge added to the gram matrix to keep the solves well conditioned
+REDUCE_RIDGE = 1.0e-9
+
+
+def _subset_errors(
+    subsets: np.ndarray,
+    adjustable: np.ndarray,
+    gram: np.ndarray,
+    cross: np.ndarray,
+    rr: np.ndarray,
+    bt: np.ndarray,
+    rt: np.ndarray,
+    tt: float,
+    *,
+    refit: bool,
+) -> tuple[np.ndarray, np.ndarray]:
+    """squared errors and refitted gains for a batch of subsets
+
+    subsets is a (n_subsets, k) array of filter indices. All subsets are
+    solved at once with a batched linear solve on the precomputed gram
+    matrices, the frequency grid is never touched again.
+    """
+    n_subsets, k = subsets.shape
+    adj = adjustable[subsets]
+    if not refit:
+        # keep the gains as they are
+        sub_rr = rr[subsets[:, :, None], subsets[:, None, :]]
+        err2 = tt - 2.0 * rt[subsets].sum(axis=1) + sub_rr.sum(axis=(1, 2))
+        return np.maximum(err2, 0.0), np.zeros((n_subsets, k))
+    fixed = ~adj
+    both = adj[:, :, None] & adj[:, None, :]
+    sub_gram = np.where(both, gram[subsets[:, :, None], subsets[:, None, :]], 0.0)
+    eye = np.eye(k)[None, :, :]
+    sub_gram += eye * np.where(adj, 0.0, 1.0)[:, :, None]
+    sub_gram += eye * REDUCE_RIDGE * (1.0 + np.trace(gram) / len(gram))
+    sub_cross = cross[subsets[:, :, None], subsets[:, None, :]]
+    rhs = bt[subsets] - np.einsum("sij,sj->si", sub_cross, fixed)
+    rhs = np.where(adj, rhs, 0.0)
+    x = np.linalg.solve(sub_gram, rhs[:, :, None])[:, :, 0]
+    sub_rr = rr[subsets[:, :, None], subsets[:, None, :]]
+    yy = (
+        tt
+        - 2.0 * np.sum(rt[subsets] * fixed, axis=1)
+        + np.einsum("si,sij,sj->s", fixed, sub_rr, fixed)
+    )
+    err2 = yy - np.sum(x * rhs, axis=1)
+    return np.maximum(err2, 0.0), x
+
+
+def peq_reduce(
+    freq: Vector,
+    peq: Peq,
+    max_count: int,
+    *,
+    refit: bool = True,
+    gain_step: float = 0.0,
+) -> tuple[list[int], Peq, float]:
+    """select at most max_count filters that best reproduce the full peq
+
+    Filters are removed to minimize the log-spectral error (rms of the
+    difference in dB over freq) against the response of the full peq. If
+    refit is set, the gains of the remaining peak and shelf filters are
+    refitted with least squares; gain_step rounds the refitted gains to the
+    resolution of the target device.
+
+    Return the indices of the kept filters (in the original order), the
+    reduced peq and the rms error in dB.
+    """
+    freq_array = np.asarray(freq, dtype=float)
+    n = len(peq)
+    if n <= max_count:
+        return list(range(n)), list(peq), 0.0
+    if max_count <= 0:
+        kept = []
+    else:
+        responses = np.array(
+            [w * iir.np_log_result(freq_array) for w, iir in peq]
+        )
+        # weighted dB of response per dB of biquad gain for filters with a
+        # gain: the refitted gains are biquad gains, the weights are kept
+        gains = np.array([iir.db_gain for _, iir in peq])
+        weights = np.array([w for w, _ in peq])
+        adjustable = (
+            np.array([iir.typ in GAIN_TYPES for _, iir in peq])
+            & (np.abs(gains) > 1.0e-6)
+            & (np.abs(weights) > 1.0e-6)
+        )
+        basis = np.where(
+            adjustable[:, None],
+            responses / np.where(adjustable, gains, 1.0)[:, None],
+            0.0,
+        )
+        target = responses.sum(axis=0)
+        gram = basis @ basis.T
+        cross = basis @ responses.T
+        rr = responses @ responses.T
+        bt = basis @ target
+        rt = responses @ target
+        tt = float(target @ target)
+
+        if math.comb(n, max_count) <= REDUCE_EXHAUSTIVE_MAX:
+            subsets = np.array(
+                list(itertools.combinations(range(n), max_count)), dtype=int
+            )
+            err2, _ = _subset_errors(
+                subsets, adjustable, gram, cross, rr, bt, rt, tt, refit=refit
+            )
+            kept = subsets[int(np.argmin(err2))].tolist()
+        else:
+            # greedy backward elimination: drop the filter that hurts least
+            kept = list(range(n))
+            while len(kept) > max_count:
+                current = np.array(kept)
+                drop = ~np.eye(len(kept), dtype=bool)
+                subsets = np.array([current[d] for d in drop])
+                err2, _ = _subset_errors(
+                    subsets,
+                    adjustable,
+                    gram,
+                    cross,
+                    rr,
+                    bt,
+                    rt,
+                    tt,
+                    refit=refit,
+                )
+                kept.pop(int(np.argmin(err2)))
+
+    reduced = []
+    if len(kept) > 0 and refit:
+        subset = np.array([kept])
+        _, refitted = _subset_errors(
+            subset, adjustable, gram, cross, rr, bt, rt, tt, refit=True
+        )
+        for i, refitted_gain in zip(kept, refitted[0].tolist(), strict=True):
+            w, iir = peq[i]
+            if not adjustable[i]:
+                reduced.append((w, iir))
+                continue
+            gain = refitted_gain
+            if gain_step > 0.0:
+                gain = round(round(gain / gain_step) * gain_step, 6)
+            reduced.append(
+                (w, Biquad(iir.typ, iir.freq, iir.srate, iir.q, gain))
+            )
+    else:
+        reduced = [peq[i] for i in kept]
+
+    full = peq_build(freq_array, peq)
+    approx = peq_build(freq_array, reduced)
+    error = float(np.sqrt(np.mean(np.square(full - approx))))
+    return kept, reduced, error
@@ -52,6 +52,7 @@ const formUploadFilename = stepSelect.querySelector('#file-name');
 const plots = document.querySelector('#plots');
 
 const selectSpeakers = document.querySelector('#selectSpeakers');
+const searchSpeakers = document.querySelector('#searchSpeakers');
 const selectSpeakerEQ = document.querySelector('#selectSpeakerEQ');
 
 const stepConvert = document.querySelector('#stepConvert');
@@ -62,9 +63,14 @@ const formConvertSubmit = formConvert.querySelector('#submitButton');
 // ----------------------------------------------------------------------
 // state abstraction
 // ----------------------------------------------------------------------
+// canonical hashes are 64 characters, hashes of older uploads 128
+function validHash(hash) {
+    return hash.length === 64 || hash.length === 128;
+}
+
 class EQState {
     constructor(hash, name) {
-        if (hash.length === 128) {
+        if (validHash(hash)) {
             this._hash = hash;
             this._name = name;
         } else {
@@ -73,7 +79,7 @@ class EQState {
     }
 
     set hash(h) {
-        if (h.length === 128) {
+        if (validHash(h)) {
             this._hash = h;
         } else {
             console.log('Len of hash is not correct ' + h.length);
@@ -91,7 +97,7 @@ class EQState {
     }
 
     valid() {
-        return true; // this._hash.length === 128 && this._name.length > 0;
+        return true; // validHash(this._hash) && this._name.length > 0;
     }
 }
 
@@ -284,6 +290,20 @@ async function loadFromSpinorama() {
         assignDiv(selectSpeakers, data, 'Select a speaker ...', '');
     }
 
+    // the backend filters on the prefix, ask again after a short pause in typing
+    let searchTimer = null;
+    if (searchSpeakers) {
+        searchSpeakers.oninput = () => {
+            clearTimeout(searchTimer);
+            searchTimer = setTimeout(async () => {
+                const prefix = encodeURIComponent(searchSpeakers.value);
+                const query = prefix === '' ? '' : '?limit=100&prefix=' + prefix;
+                const found = await fetch(url + query, https_headers);
+                assignDiv(selectSpeakers, await found.json(), 'Select a speaker ...', '');
+            }, 150);
+        };
+    }
+
     selectSpeakers.onchange = async () => {
         const selectedSpeaker = selectSpeakers.value;
         if (selectedSpeaker !== '') {
@@ -365,6 +385,17 @@ function downloadViaData(fileName, returnType, data) {
     document.body.removeChild(element);
 }
 
+// the backend sends the file, the browser saves it under fileName
+function downloadViaURL(fileName, url) {
+    let element = document.createElement('a');
+    element.setAttribute('href', url);
+    element.setAttribute('download', fileName);
+    console.log('download: ' + fileName);
+    document.body.appendChild(element);
+    element.click();
+    document.body.removeChild(element);
+}
+
 class APO extends Format {
     async display(fileName, div, hash) {
         const url = backend + '/eq/target/apo';
@@ -378,10 +409,7 @@ class APO extends Format {
     }
 
     async download(fileName, hash) {
-        const url = backend + '/eq/target/apo';
-        const response = await fetch(url + '?eq_hash=' + hash, https_headers);
-        const data = await response.json();
-        downloadViaData(fileName, 'plain', data);
+        downloadViaURL(fileName, backend + '/eq/download/apo?eq_hash=' + hash);
     }
 }
 
@@ -400,15 +428,11 @@ class AUPreset extends Format {
     }
 
     async download(fileName, hash) {
-        const url = backend + '/eq/target/aupreset';
-        const response = await fetch(url + '?eq_hash=' + hash, https_headers);
-        const data = await response.json();
-
         let aupresetName = fileName;
         if (aupresetName.length > 4) {
             aupresetName = fileName.slice(0, -4) + '.aupreset';
         }
-        downloadViaData(aupresetName, 'xml', data[1]);
+        downloadViaURL(aupresetName, backend + '/eq/download/aupreset?eq_hash=' + hash);
     }
 }
 
@@ -427,15 +451,11 @@ class RMETotalMixChannel extends Format {
     }
 
     async download(fileName, hash) {
-        const url = backend + '/eq/target/rme_totalmix_channel';
-        const response = await fetch(url + '?eq_hash=' + hash, https_headers);
-        const data = await response.json();
-
         let tmeqName = fileName;
         if (tmeqName.length > 4) {
             tmeqName = fileName.slice(0, -4) + '.tmeq';
         }
-        downloadViaData(tmeqName, 'xml', data);
+        downloadViaURL(tmeqName, backend + '/eq/download/rme_totalmix_channel?eq_hash=' + hash);
     }
 }
 
@@ -454,15 +474,14 @@ class RmeTotalMixRoom extends Format {
     }
 
     async download(fileName, hash0, hash1) {
-        const url = backend + '/eq/target/rme_totalmix_room';
-        const response = await fetch(url + '?eq_hash_left=' + hash0 + '&eq_hash_right=' + hash1, https_headers);
-        const data = await response.json();
-
         let tmreqName = fileName;
         if (tmreqName.length > 4) {
             tmreqName = fileName.slice(0, -4) + '.tmreq';
         }
-        downloadViaData(tmreqName, 'xml', data);
+        downloadViaURL(
+            tmreqName,
+            backend + '/eq/download/rme_totalmix_room?eq_hash=' + hash0 + '&eq_hash_right=' + hash1
+        );
     }
 }
 
@@ -570,27 +589,41 @@ function iir2graph(freq, spls) {
     return [data, layout, config];
 }
 
-async function plotlyPEQ(div, hash) {
-    const url = backend + '/eq/graph_spl';
-    if (hash === null || hash.length !== 128) {
-        return;
-    }
-    const response = await fetch(url + '?eq_hash=' + hash, https_headers);
-    const data = await response.json();
-    const specs = peq2graph(data.freq, data.spl);
-    Plotly.newPlot(div, specs[0], specs[1], specs[2]);
-    return true;
+// graphs are fetched as float32, see graphs.py for the layout
+async function fetchGraph(url, hash) {
+    const response = await fetch(url + '?format=f32&eq_hash=' + hash, https_headers);
+    if (!response.ok) {
+        throw new Error('Fetching ' + url + ' failed with status ' + response.status);
+    }
+    const buffer = await response.arrayBuffer();
+    const header = new DataView(buffer, 0, 16);
+    const nPoints = header.getUint32(8, true);
+    const nCurves = header.getUint32(12, true);
+    const freq = Array.from(new Float32Array(buffer, 16, nPoints));
+    const curves = [];
+    for (let i = 0; i < nCurves; i++) {
+        curves.push(Array.from(new Float32Array(buffer, 16 + 4 * nPoints * (i + 1), nPoints)));
+    }
+    return [freq, curves];
 }
 
-async function plotlyIIR(div, hash) {
-    const url = backend + '/eq/graph_spl_details';
-    if (hash === null || hash.length !== 128) {
+// one request for the total and the per band curves
+async function plotlyEQ(divPEQ, divIIR, hash) {
+    const url = backend + '/eq/graph';
+    if (hash === null || !validHash(hash)) {
         return;
     }
-    const response = await fetch(url + '?eq_hash=' + hash, https_headers);
-    const data = await response.json();
-    const specs = iir2graph(data.freq, data.spl);
-    Plotly.newPlot(div, specs[0], specs[1], specs[2]);
+    let freq, curves;
+    try {
+        [freq, curves] = await fetchGraph(url, hash);
+    } catch (error) {
+        console.log(error.message);
+        return false;
+    }
+    const specsPEQ = peq2graph(freq, curves[0]);
+    Plotly.newPlot(divPEQ, specsPEQ[0], specsPEQ[1], specsPEQ[2]);
+    const specsIIR = iir2graph(freq, curves.slice(1));
+    Plotly.newPlot(divIIR, specsIIR[0], specsIIR[1], specsIIR[2]);
     return true;
 }
 
@@ -637,13 +670,9 @@ ${contentBlocks}
         const plot = plots.querySelector('#plot' + k);
         const plotPEQ = plot.querySelector('#plotPEQ');
         const plotIIR = plot.querySelector('#plotIIR');
-        const status1 = await plotlyPEQ(plotPEQ, state.hash(k));
-        const status2 = await plotlyIIR(plotIIR, state.hash(k));
-        if (!status1) {
-            console.log('Plotting PEQ failed for hash=' + state.hash(k));
-        }
-        if (!status2) {
-            console.log('Plotting IIR failed for hash=' + state.hash(k));
+        const status = await plotlyEQ(plotPEQ, plotIIR, state.hash(k));
+        if (!status) {
+            console.log('Plotting EQ failed for hash=' + state.hash(k));
         }
     }
     tabsAddEvents(plots);
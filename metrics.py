@@ -0,0 +1,334 @@
+# -*- coding: utf-8 -*-
+"""Latency and stage metrics in Prometheus text format.
+
+The backend times every request per route and, inside a request, named
+stages (database, parsing, DSP, rendering, serialization...). Stages nest:
+a stage includes the time of the stages it runs. Outside of a request
+stage() only costs a context variable lookup, so shared modules can be
+instrumented without slowing down the command line.
+
+Metrics live in the process; with several workers each one exposes its own.
+"""
+
+import contextlib
+import contextvars
+import threading
+import time
+from collections.abc import Callable, Iterator
+
+# seconds, the Prometheus client defaults
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = tuple[str, ...]
+
+
+def _format_labels(names: Labels, values: Labels, extra: str = "") -> str:
+    pairs = [
+        '{}="{}"'.format(
+            name, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        )
+        for name, value in zip(names, values, strict=True)
+    ]
+    if extra:
+        pairs.append(extra)
+    if len(pairs) == 0:
+        return ""
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Counter:
+    """a monotonic count per label values"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Labels = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            yield "{}{} {}".format(
+                self.name, _format_labels(self.labelnames, labels), _format_value(value)
+            )
+
+
+class Gauge(Counter):
+    """a value that goes up and down"""
+
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1.0) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels: str, value: float) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+
+class CallbackGauge:
+    """gauges computed when the metrics are scraped"""
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Labels,
+        callback: Callable[[], dict[Labels, float]],
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.callback = callback
+
+    def samples(self) -> Iterator[str]:
+        for labels, value in sorted(self.callback().items()):
+            yield "{}{} {}".format(
+                self.name, _format_labels(self.labelnames, labels), _format_value(value)
+            )
+
+
+class Histogram:
+    """cumulative buckets, sum and count per label values"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Labels = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = (*sorted(buckets), float("inf"))
+        # per labels: count per bucket (not cumulative), sum
+        self._values: dict[Labels, tuple[list[int], list[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        with self._lock:
+            counts, total = self._values.setdefault(
+                labels, ([0] * len(self.buckets), [0.0])
+            )
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            total[0] += value
+
+    def count(self, *labels: str) -> int:
+        counts, _ = self._values.get(labels, ([0], [0.0]))
+        return sum(counts)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = sorted(
+                (labels, (list(counts), total[0]))
+                for labels, (counts, total) in self._values.items()
+            )
+        for labels, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts, strict=True):
+                cumulative += count
+                yield "{}_bucket{} {}".format(
+                    self.name,
+                    _format_labels(
+                        self.labelnames, labels, 'le="{}"'.format(_format_value(bound))
+                    ),
+                    cumulative,
+                )
+            yield "{}_sum{} {}".format(
+                self.name, _format_labels(self.labelnames, labels), _format_value(total)
+            )
+            yield "{}_count{} {}".format(
+                self.name, _format_labels(self.labelnames, labels), cumulative
+            )
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, Counter | CallbackGauge | Histogram] = {}
+
+    def register(self, metric):
+        if metric.name in self._metrics:
+            msg = "metric {} is already registered".format(metric.name)
+            raise ValueError(msg)
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """the text exposition format, version 0.0.4"""
+        lines = []
+        for name, metric in self._metrics.items():
+            lines.append("# HELP {} {}".format(name, metric.documentation))
+            lines.append("# TYPE {} {}".format(name, metric.kind))
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+REGISTRY = Registry()
+
+REQUEST_LATENCY = REGISTRY.register(
+    Histogram(
+        "eqconverter_request_duration_seconds",
+        "Time spent handling a request.",
+        ("method", "route", "status"),
+    )
+)
+
+STAGE_LATENCY = REGISTRY.register(
+    Histogram(
+        "eqconverter_stage_duration_seconds",
+        "Time spent in a stage of a request, stages include the stages they run.",
+        ("route", "stage"),
+        buckets=(0.0001, 0.0005, 0.001, 0.0025, *DEFAULT_BUCKETS),
+    )
+)
+
+DB_CONNECTIONS = REGISTRY.register(
+    Counter(
+        "eqconverter_db_connections_total",
+        "Database connections opened.",
+    )
+)
+
+DB_CONNECTIONS_OPEN = REGISTRY.register(
+    Gauge(
+        "eqconverter_db_connections_open",
+        "Database connections currently open.",
+    )
+)
+
+DB_QUERIES = REGISTRY.register(
+    Counter(
+        "eqconverter_db_queries_total",
+        "Database statements executed.",
+    )
+)
+
+DB_QUEUE_LATENCY = REGISTRY.register(
+    Histogram(
+        "eqconverter_db_queue_seconds",
+        "Time a query waited for a database thread.",
+        ("kind",),
+        buckets=(0.0001, 0.0005, 0.001, 0.0025, *DEFAULT_BUCKETS),
+    )
+)
+
+DB_WRITE_BATCH = REGISTRY.register(
+    Histogram(
+        "eqconverter_db_write_batch_size",
+        "Writes committed together in one transaction.",
+        buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+    )
+)
+
+# name -> cache_info() of a functools cache
+_CACHES: dict[str, Callable[[], object]] = {}
+
+
+def register_cache(name: str, cache_info: Callable[[], object]) -> None:
+    """expose hits, misses and size of a functools cache"""
+    _CACHES[name] = cache_info
+
+
+def _cache_values(field: str) -> Callable[[], dict[Labels, float]]:
+    def values():
+        result = {}
+        for name, cache_info in _CACHES.items():
+            info = cache_info()
+            if field == "ratio":
+                lookups = info.hits + info.misses
+                result[(name,)] = info.hits / lookups if lookups > 0 else 0.0
+            else:
+                result[(name,)] = getattr(info, field)
+        return result
+
+    return values
+
+
+for _field, _doc in (
+    ("hits", "Cache hits."),
+    ("misses", "Cache misses."),
+    ("currsize", "Entries in the cache."),
+    ("ratio", "Cache hits over lookups."),
+):
+    REGISTRY.register(
+        CallbackGauge(
+            "eqconverter_cache_{}".format(_field),
+            _doc,
+            ("cache",),
+            _cache_values(_field),
+        )
+    )
+
+
+# ----------------------------------------------------------------------
+# timers
+# ----------------------------------------------------------------------
+
+# stages timed in the current request, None outside of a request
+_stages: contextvars.ContextVar[list[tuple[str, float]] | None] = contextvars.ContextVar(
+    "eqconverter_stages", default=None
+)
+
+
+@contextlib.contextmanager
+def stage(name: str) -> Iterator[None]:
+    """time a stage of the current request"""
+    stages = _stages.get()
+    if stages is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stages.append((name, time.perf_counter() - start))
+
+
+@contextlib.contextmanager
+def request_stages() -> Iterator[list[tuple[str, float]]]:
+    """collect the stages timed while handling a request"""
+    stages: list[tuple[str, float]] = []
+    token = _stages.set(stages)
+    try:
+        yield stages
+    finally:
+        _stages.reset(token)
+
+
+def observe_request(
+    method: str, route: str, status: int, elapsed: float, stages: list[tuple[str, float]]
+) -> None:
+    REQUEST_LATENCY.observe(elapsed, method, route, str(status))
+    for name, duration in stages:
+        STAGE_LATENCY.observe(duration, route, name)
+
+
+def render() -> str:
+    return REGISTRY.render()
@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+"""The catalog in one read-only file that all workers map.
+
+Every worker used to parse metadata.json, index eqdata.json and compute
+the same filter banks. The packed file holds all of it once: the gunicorn
+master writes it (see gunicorn.conf.py and scripts/pack.py) and workers
+mmap it. Pages live in the page cache and are shared, so a worker costs
+the same memory whatever the size of the catalog.
+
+Layout, little endian, every section aligned on 8 bytes:
+
+    magic      4 bytes  b"EQK1"
+    padding    4 bytes
+    position   uint64   position of the directory
+    size       uint64   length of the directory
+    tables     per table: key offsets (uint64 * (count + 1)), keys,
+               value offsets (uint64 * (count + 1)), values
+    directory  json     sources, points and, per table, its count and
+                        the position of its four sections
+
+Keys are utf-8 and sorted bytewise, which is the order of sorted() on the
+decoded strings, so lookups and prefix searches bisect the mapping
+directly. Tables:
+
+    metadata         speaker -> json entry of metadata.json
+    eqdata           speaker -> json entry of eqdata.json, as in the file
+    speakers_folded  casefolded speaker NUL speaker -> speaker
+    brands           brand -> b""
+    brands_folded    casefolded brand NUL brand -> brand
+    banks            EQ hash -> float64 filter bank at `points` frequencies
+
+The directory records the mtime and size of the sources: a packed file
+older than its sources is ignored until it is rebuilt.
+"""
+
+import bisect
+import functools
+import json
+import mmap
+import os
+import struct
+from collections.abc import Iterable
+from dataclasses import dataclass
+
+import numpy as np
+
+PACKED_MAGIC = b"EQK1"
+PACKED_HEADER = struct.Struct("<4s4xQQ")
+# upper bound of every string starting with a given prefix
+PREFIX_END = "\U0010ffff".encode("utf-8")
+
+
+def _align(fd) -> int:
+    pos = fd.tell()
+    padding = -pos % 8
+    fd.write(b"\0" * padding)
+    return pos + padding
+
+
+def _write_table(fd, items: Iterable[tuple[bytes, bytes]]) -> dict:
+    items = sorted(items)
+    sections = {"count": len(items)}
+    for section, column in (("keys", 0), ("values", 1)):
+        blobs = [item[column] for item in items]
+        offsets = np.zeros(len(blobs) + 1, dtype="<u8")
+        np.cumsum([len(blob) for blob in blobs], out=offsets[1:])
+        sections[section + "_offsets"] = _align(fd)
+        fd.write(offsets.tobytes())
+        sections[section] = _align(fd)
+        fd.write(b"".join(blobs))
+    return sections
+
+
+def folded(names: Iterable[str]) -> list[tuple[bytes, bytes]]:
+    return [
+        ("{}\0{}".format(name.casefold(), name).encode("utf-8"), name.encode("utf-8"))
+        for name in names
+    ]
+
+
+def sources_version(paths: Iterable[str]) -> list[tuple[str, int, int]]:
+    version = []
+    for path in paths:
+        stat = os.stat(path)
+        version.append((path, stat.st_mtime_ns, stat.st_size))
+    return version
+
+
+def write_packed(
+    path: str,
+    tables: dict[str, Iterable[tuple[bytes, bytes]]],
+    sources: list[tuple[str, int, int]],
+    points: int,
+) -> None:
+    """write the tables to path atomically"""
+    tmp = "{}.{}.tmp".format(path, os.getpid())
+    with open(tmp, "wb") as fd:
+        # the directory is only known at the end
+        fd.seek(PACKED_HEADER.size)
+        directory = {
+            "sources": sources,
+            "points": points,
+            "tables": {name: _write_table(fd, items) for name, items in tables.items()},
+        }
+        encoded = json.dumps(directory).encode("utf-8")
+        position = _align(fd)
+        fd.write(encoded)
+        fd.seek(0)
+        fd.write(PACKED_HEADER.pack(PACKED_MAGIC, position, len(encoded)))
+    os.replace(tmp, path)
+
+
+class PackedTable:
+    """sorted key -> value table read from the mapping, nothing is copied"""
+
+    def __init__(self, buffer, sections: dict):
+        self.buffer = buffer
+        self.count = sections["count"]
+        self.key_offsets = np.frombuffer(
+            buffer, dtype="<u8", count=self.count + 1, offset=sections["keys_offsets"]
+        )
+        self.value_offsets = np.frombuffer(
+            buffer, dtype="<u8", count=self.count + 1, offset=sections["values_offsets"]
+        )
+        self.keys_at = sections["keys"]
+        self.values_at = sections["values"]
+
+    def __len__(self) -> int:
+        return self.count
+
+    def key(self, i: int) -> bytes:
+        start = self.keys_at + int(self.key_offsets[i])
+        return self.buffer[start : self.keys_at + int(self.key_offsets[i + 1])]
+
+    def value_range(self, i: int) -> tuple[int, int]:
+        start = self.values_at + int(self.value_offsets[i])
+        return start, self.values_at + int(self.value_offsets[i + 1])
+
+    def value(self, i: int) -> bytes:
+        start, end = self.value_range(i)
+        return self.buffer[start:end]
+
+    def bisect(self, key: bytes, lo: int = 0) -> int:
+        return bisect.bisect_left(range(self.count), key, lo=lo, key=self.key)
+
+    def find(self, key: bytes) -> int | None:
+        i = self.bisect(key)
+        if i < self.count and self.key(i) == key:
+            return i
+        return None
+
+    def prefix_range(self, prefix: bytes) -> tuple[int, int]:
+        start = self.bisect(prefix)
+        return start, self.bisect(prefix + PREFIX_END, lo=start)
+
+
+class PackedEntries:
+    """json entries by name, with the get() of a dict"""
+
+    def __init__(self, table: PackedTable):
+        self.table = table
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    def __contains__(self, name: str) -> bool:
+        return self.table.find(name.encode("utf-8")) is not None
+
+    def get(self, name: str, default=None):
+        i = self.table.find(name.encode("utf-8"))
+        if i is None:
+            return default
+        return json.loads(self.table.value(i))
+
+
+class PackedNames:
+    """the search() and count() of catalog.SortedNames over two tables"""
+
+    def __init__(self, names: PackedTable, folded_names: PackedTable):
+        self.names = names
+        self.folded_names = folded_names
+
+    def _range(self, prefix: str) -> tuple[int, int]:
+        if not prefix:
+            return 0, len(self.names)
+        return self.folded_names.prefix_range(prefix.casefold().encode("utf-8"))
+
+    def search(self, prefix: str = "", limit: int | None = None, offset: int = 0) -> list[str]:
+        start, end = self._range(prefix)
+        start += offset
+        if limit is not None:
+            end = min(end, start + limit)
+        if not prefix:
+            return [self.names.key(i).decode("utf-8") for i in range(start, end)]
+        return [self.folded_names.value(i).decode("utf-8") for i in range(start, end)]
+
+    def count(self, prefix: str = "") -> int:
+        start, end = self._range(prefix)
+        return end - start
+
+
+class PackedBanks:
+    """read only filter banks by EQ hash"""
+
+    def __init__(self, table: PackedTable, points: int):
+        self.table = table
+        self.points = points
+
+    def get(self, eq_hash: str) -> np.ndarray | None:
+        i = self.table.find(eq_hash.encode("utf-8"))
+        if i is None:
+            return None
+        start, end = self.table.value_range(i)
+        count = (end - start) // 8
+        bank = np.frombuffer(self.table.buffer, dtype="<f8", count=count, offset=start)
+        return bank.reshape(count // self.points, self.points)
+
+
+@dataclass(frozen=True, eq=False)
+class PackedCatalog:
+    path: str
+    sources: tuple[tuple[str, int, int], ...]
+    speakers: PackedNames
+    brands: PackedNames
+    metadata: PackedEntries
+    eqdata: PackedEntries
+    banks: PackedBanks
+
+    @classmethod
+    def open(cls, path: str) -> "PackedCatalog":
+        with open(path, "rb") as fd:
+            buffer = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, position, size = PACKED_HEADER.unpack_from(buffer)
+        if magic != PACKED_MAGIC:
+            msg = "{} is not a packed catalog".format(path)
+            raise ValueError(msg)
+        directory = json.loads(buffer[position : position + size])
+        tables = {
+            name: PackedTable(buffer, sections)
+            for name, sections in directory["tables"].items()
+        }
+        return cls(
+            path=path,
+            sources=tuple(tuple(source) for source in directory["sources"]),
+            speakers=PackedNames(tables["metadata"], tables["speakers_folded"]),
+            brands=PackedNames(tables["brands"], tables["brands_folded"]),
+            metadata=PackedEntries(tables["metadata"]),
+            eqdata=PackedEntries(tables["eqdata"]),
+            banks=PackedBanks(tables["banks"], directory["points"]),
+        )
+
+    def fresh(self) -> bool:
+        """true while the sources have not changed since packing"""
+        try:
+            return tuple(sources_version(path for path, _, _ in self.sources)) == self.sources
+        except OSError:
+            return False
+
+
+@functools.lru_cache(maxsize=1)
+def _open_packed(path: str, mtime_ns: int, size: int) -> PackedCatalog:
+    return PackedCatalog.open(path)
+
+
+def packed_catalog(path: str) -> PackedCatalog | None:
+    """the packed catalog in path, None if missing, invalid or stale"""
+    try:
+        stat = os.stat(path)
+        catalog = _open_packed(path, stat.st_mtime_ns, stat.st_size)
+    except (OSError, ValueError, KeyError, struct.error):
+        return None
+    if not catalog.fresh():
+        return None
+    return catalog
+
+
+def packed_cache_info():
+    return _open_packed.cache_info()
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""Opt-in profiling of backend requests and of the command line.
+
+Profiling is configured with environment variables:
+
+    EQCONVERTER_PROFILE           cprofile or sample (default: off)
+    EQCONVERTER_PROFILE_RATE      fraction of requests profiled, default 0
+    EQCONVERTER_PROFILE_SECRET    key to profile a request with a signed header
+    EQCONVERTER_PROFILE_DIR       where profiles are written, default profiles
+    EQCONVERTER_PROFILE_KEEP      number of profiles kept, default 100
+    EQCONVERTER_PROFILE_INTERVAL  sampling interval in seconds, default 0.005
+
+A request is profiled when it is randomly selected or when it carries a
+valid X-EQConverter-Profile header: "<expires>:<signature>" where expires is
+a unix time and signature the hex HMAC-SHA256 of "<expires>:<path>" with the
+secret. The header works even if EQCONVERTER_PROFILE is not set, the sampler
+is then used. The response of a profiled request carries the profile id in
+the same header; the id, not the server path, is part of the file name.
+
+cprofile writes a .prof file (python -m pstats, snakeviz, flameprof); sample
+writes a .collapsed file of folded stacks (flamegraph.pl, speedscope). To
+bound the overhead only one profile runs at a time, the sampler stops after
+MAX_SAMPLES samples and old profiles are deleted. Both profilers see
+everything running on the profiled thread, including other requests served
+by the same event loop.
+"""
+
+import contextlib
+import cProfile
+import hashlib
+import hmac
+import os
+import pathlib
+import random
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass
+
+HEADER = "X-EQConverter-Profile"
+MODES = ("cprofile", "sample")
+MAX_SAMPLES = 20000
+
+
+@dataclass(frozen=True)
+class ProfileSettings:
+    mode: str = ""
+    rate: float = 0.0
+    secret: str = ""
+    directory: pathlib.Path = pathlib.Path("profiles")
+    keep: int = 100
+    interval: float = 0.005
+
+    @classmethod
+    def from_env(cls) -> "ProfileSettings":
+        mode = os.getenv("EQCONVERTER_PROFILE", "")
+        if mode not in ("", *MODES):
+            print("Warning: unknown profiling mode {}, using sample".format(mode))
+            mode = "sample"
+        return cls(
+            mode=mode,
+            rate=float(os.getenv("EQCONVERTER_PROFILE_RATE", "0")),
+            secret=os.getenv("EQCONVERTER_PROFILE_SECRET", ""),
+            directory=pathlib.Path(os.getenv("EQCONVERTER_PROFILE_DIR", "profiles")),
+            keep=int(os.getenv("EQCONVERTER_PROFILE_KEEP", "100")),
+            interval=float(os.getenv("EQCONVERTER_PROFILE_INTERVAL", "0.005")),
+        )
+
+
+SETTINGS = ProfileSettings.from_env()
+
+# only one profile at a time
+_busy = threading.Lock()
+
+
+def sign(path: str, expires: int, secret: str) -> str:
+    """the header value that enables profiling of path until expires"""
+    message = "{}:{}".format(expires, path).encode("utf-8")
+    signature = hmac.new(secret.encode("utf-8"), message, hashlib.sha256).hexdigest()
+    return "{}:{}".format(expires, signature)
+
+
+def check_signature(path: str, header: str, secret: str) -> bool:
+    if not secret or not header or ":" not in header:
+        return False
+    expires, _ = header.split(":", 1)
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+    return hmac.compare_digest(header, sign(path, int(expires), secret))
+
+
+def wanted(
+    path: str, header: str | None, settings: ProfileSettings = SETTINGS
+) -> str | None:
+    """the mode to profile a request with, None if it should not be profiled"""
+    if header and check_signature(path, header, settings.secret):
+        return settings.mode or "sample"
+    # picking requests to sample is not security sensitive
+    if settings.mode and settings.rate > 0.0 and random.random() < settings.rate:  # noqa: S311
+        return settings.mode
+    return None
+
+
+class Sampler:
+    """sample the stack of one thread at a fixed interval"""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        samples = 0
+        while not self._stop.wait(self.interval) and samples < MAX_SAMPLES:
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(
+                    "{} ({}:{})".format(
+                        code.co_name, os.path.basename(code.co_filename), code.co_firstlineno
+                    )
+                )
+                frame = frame.f_back
+            self.stacks[";".join(reversed(names))] += 1
+            samples += 1
+
+    def dump(self, path: pathlib.Path) -> None:
+        with open(path, "w", encoding="utf-8") as fd:
+            for stack, count in sorted(self.stacks.items()):
+                fd.write("{} {}\n".format(stack, count))
+
+
+def _slug(name: str) -> str:
+    return "".join(c if c.isalnum() else "_" for c in name).strip("_")[:64]
+
+
+def _prune(directory: pathlib.Path, keep: int) -> None:
+    profiles = sorted(
+        (p for p in directory.iterdir() if p.suffix in (".prof", ".collapsed")),
+        key=lambda p: p.stat().st_mtime,
+    )
+    for path in profiles[: max(0, len(profiles) - keep)]:
+        path.unlink(missing_ok=True)
+
+
+@dataclass
+class ProfileResult:
+    path: pathlib.Path | None = None
+    profile_id: str = ""
+
+
+@contextlib.contextmanager
+def profiled(
+    name: str, mode: str, settings: ProfileSettings = SETTINGS
+) -> Iterator[ProfileResult]:
+    """profile the current thread, the file written is in result.path
+
+    Nothing is profiled if another profile is running. result.profile_id is
+    random and unique to the file, it can be shown to clients.
+    """
+    result = ProfileResult()
+    if not _busy.acquire(blocking=False):
+        yield result
+        return
+    try:
+        settings.directory.mkdir(parents=True, exist_ok=True)
+        result.profile_id = secrets.token_hex(8)
+        base = settings.directory / "{}-{}-{}".format(
+            time.strftime("%Y%m%d-%H%M%S"), result.profile_id, _slug(name)
+        )
+        if mode == "cprofile":
+            profile = cProfile.Profile()
+            profile.enable()
+            try:
+                yield result
+            finally:
+                profile.disable()
+                result.path = base.with_suffix(".prof")
+                profile.dump_stats(result.path)
+        else:
+            sampler = Sampler(threading.get_ident(), settings.interval)
+            sampler.start()
+            try:
+                yield result
+            finally:
+                sampler.stop()
+                result.path = base.with_suffix(".collapsed")
+                sampler.dump(result.path)
+        _prune(settings.directory, settings.keep)
+    finally:
+        _busy.release()
+
+
+def run(name: str, fn: Callable[[], int], settings: ProfileSettings = SETTINGS) -> int:
+    """call fn, under the profiler when profiling is enabled"""
+    if not settings.mode:
+        return fn()
+    with profiled(name, settings.mode, settings) as result:
+        status = fn()
+    if result.path is not None:
+        print("Profile written to {}".format(result.path), file=sys.stderr)
+    return status
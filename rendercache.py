@@ -0,0 +1,422 @@
+# -*- coding: utf-8 -*-
+"""Caches for rendered bodies that outlive a worker.
+
+The backend keeps rendered targets and graph payloads in a cache chosen
+with EQCONVERTER_CACHE:
+
+    memory                  in-process LRU, the default
+    sqlite:/path/cache.db   a sqlite file shared by the workers on a host
+    redis://host:port/db    any server speaking the Redis protocol
+
+All caches are async and batched: get_many returns one body or None per
+key, set_many stores several bodies. Keys must change when the body would,
+the backend puts the software version in them. A cache that cannot be
+reached raises CacheUnavailableError; callers treat it as a miss.
+
+RespStandIn is a minimal in-memory server speaking the Redis protocol for
+tests and development:
+
+    python3 -m rendercache --port 6379
+"""
+
+import argparse
+import asyncio
+import collections
+import sqlite3
+import sys
+import time
+import urllib.parse
+from typing import NamedTuple
+
+RENDER_CACHE_SIZE = 2048
+
+
+class CacheUnavailableError(Exception):
+    pass
+
+
+class CacheInfo(NamedTuple):
+    """the fields metrics.register_cache reads; currsize is 0 when not known"""
+
+    hits: int
+    misses: int
+    maxsize: int | None
+    currsize: int
+
+
+class RenderCache:
+    """counts hits and misses, subclasses implement _get_many and _set_many"""
+
+    maxsize: int | None = None
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    async def get_many(self, keys: list[str]) -> list[bytes | None]:
+        values = await self._get_many(keys)
+        found = sum(value is not None for value in values)
+        self.hits += found
+        self.misses += len(values) - found
+        return values
+
+    async def set_many(self, items: dict[str, bytes]) -> None:
+        if items:
+            await self._set_many(items)
+
+    async def close(self) -> None:
+        pass
+
+    def currsize(self) -> int:
+        return 0
+
+    def cache_info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.maxsize, self.currsize())
+
+    async def _get_many(self, keys: list[str]) -> list[bytes | None]:
+        raise NotImplementedError
+
+    async def _set_many(self, items: dict[str, bytes]) -> None:
+        raise NotImplementedError
+
+
+class MemoryCache(RenderCache):
+    def __init__(self, maxsize: int = RENDER_CACHE_SIZE):
+        super().__init__()
+        self.maxsize = maxsize
+        self._entries = collections.OrderedDict()
+
+    async def _get_many(self, keys: list[str]) -> list[bytes | None]:
+        values = []
+        for key in keys:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            values.append(value)
+        return values
+
+    async def _set_many(self, items: dict[str, bytes]) -> None:
+        for key, value in items.items():
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def currsize(self) -> int:
+        return len(self._entries)
+
+
+class SqliteCache(RenderCache):
+    """a table in a sqlite file; past maxsize the oldest entries go first
+
+    Queries run in a thread. WAL lets the workers of a host read while one
+    of them writes. The file and the table are created on first use: a path
+    that cannot be opened is a miss, not a worker that fails to start.
+    """
+
+    def __init__(self, path: str, maxsize: int = 100 * RENDER_CACHE_SIZE):
+        super().__init__()
+        self.path = path
+        self.maxsize = maxsize
+        self._sets = 0
+        self._created = False
+
+    def _connect(self) -> sqlite3.Connection:
+        try:
+            connection = sqlite3.connect(self.path, timeout=5.0)
+        except sqlite3.Error as e:
+            raise CacheUnavailableError(str(e)) from e
+        if not self._created:
+            try:
+                with connection:
+                    connection.execute("PRAGMA journal_mode=WAL")
+                    connection.execute(
+                        "CREATE TABLE IF NOT EXISTS cache "
+                        "(key TEXT PRIMARY KEY, value BLOB NOT NULL)"
+                    )
+            except sqlite3.Error as e:
+                connection.close()
+                raise CacheUnavailableError(str(e)) from e
+            self._created = True
+        return connection
+
+    def _get_many_sync(self, keys: list[str]) -> list[bytes | None]:
+        connection = self._connect()
+        try:
+            found = dict(
+                connection.execute(
+                    "SELECT key, value FROM cache WHERE key IN ({})".format(  # noqa: S608
+                        ",".join("?" * len(keys))
+                    ),
+                    keys,
+                )
+            )
+        except sqlite3.Error as e:
+            raise CacheUnavailableError(str(e)) from e
+        finally:
+            connection.close()
+        return [found.get(key) for key in keys]
+
+    def _set_many_sync(self, items: dict[str, bytes]) -> None:
+        connection = self._connect()
+        try:
+            with connection:
+                # REPLACE moves the row to the end of the rowid order
+                connection.executemany(
+                    "REPLACE INTO cache (key, value) VALUES (?, ?)", items.items()
+                )
+                self._sets += len(items)
+                if self._sets >= self.maxsize // 100 + 1:
+                    self._sets = 0
+                    connection.execute(
+                        "DELETE FROM cache WHERE rowid <= "
+                        "(SELECT MAX(rowid) FROM cache) - ?",
+                        (self.maxsize,),
+                    )
+        except sqlite3.Error as e:
+            raise CacheUnavailableError(str(e)) from e
+        finally:
+            connection.close()
+
+    async def _get_many(self, keys: list[str]) -> list[bytes | None]:
+        return await asyncio.to_thread(self._get_many_sync, keys)
+
+    async def _set_many(self, items: dict[str, bytes]) -> None:
+        await asyncio.to_thread(self._set_many_sync, items)
+
+
+# ----------------------------------------------------------------------
+# Redis protocol
+# ----------------------------------------------------------------------
+
+
+def resp_command(*args) -> bytes:
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if isinstance(arg, str):
+            data = arg.encode("utf-8")
+        elif isinstance(arg, int):
+            data = b"%d" % arg
+        else:
+            data = arg
+        parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(parts)
+
+
+class RespError(Exception):
+    pass
+
+
+async def resp_read(reader: asyncio.StreamReader):
+    """one reply; errors are returned as RespError, not raised"""
+    line = await reader.readline()
+    if not line.endswith(b"\r\n"):
+        msg = "connection closed"
+        raise ConnectionError(msg)
+    kind, payload = line[:1], line[1:-2]
+    if kind == b"+":
+        return payload.decode("utf-8")
+    if kind == b"-":
+        return RespError(payload.decode("utf-8"))
+    if kind == b":":
+        return int(payload)
+    if kind == b"$":
+        size = int(payload)
+        if size < 0:
+            return None
+        data = await reader.readexactly(size + 2)
+        return data[:-2]
+    if kind == b"*":
+        size = int(payload)
+        if size < 0:
+            return None
+        return [await resp_read(reader) for _ in range(size)]
+    msg = "unexpected reply {!r}".format(line)
+    raise ConnectionError(msg)
+
+
+class RedisCache(RenderCache):
+    """MGET and pipelined SET over one connection per event loop"""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 6379,
+        db: int = 0,
+        ttl: int | None = None,
+        prefix: str = "eqconverter:",
+        timeout: float = 1.0,
+    ):
+        super().__init__()
+        self.host = host
+        self.port = port
+        self.db = db
+        self.ttl = ttl
+        self.prefix = prefix
+        self.timeout = timeout
+        self._loop = None
+        self._lock = None
+        self._streams = None
+
+    async def _pipeline(self, commands: list[bytes]) -> list:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # streams and locks belong to the loop that created them
+            self._loop, self._lock, self._streams = loop, asyncio.Lock(), None
+        selected = False
+        async with self._lock:
+            try:
+                if self._streams is None:
+                    self._streams = await asyncio.wait_for(
+                        asyncio.open_connection(self.host, self.port), self.timeout
+                    )
+                    if self.db:
+                        selected = True
+                        commands = [resp_command("SELECT", self.db), *commands]
+                reader, writer = self._streams
+                writer.write(b"".join(commands))
+                await writer.drain()
+                replies = [
+                    await asyncio.wait_for(resp_read(reader), self.timeout) for _ in commands
+                ]
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as e:
+                await self._drop()
+                raise CacheUnavailableError(str(e) or type(e).__name__) from e
+        for reply in replies:
+            if isinstance(reply, RespError):
+                raise CacheUnavailableError(str(reply))
+        return replies[1:] if selected else replies
+
+    async def _drop(self) -> None:
+        if self._streams is not None:
+            _, writer = self._streams
+            self._streams = None
+            writer.close()
+
+    async def _get_many(self, keys: list[str]) -> list[bytes | None]:
+        (values,) = await self._pipeline(
+            [resp_command("MGET", *(self.prefix + key for key in keys))]
+        )
+        return values
+
+    async def _set_many(self, items: dict[str, bytes]) -> None:
+        expiry = () if self.ttl is None else ("EX", self.ttl)
+        await self._pipeline(
+            [resp_command("SET", self.prefix + key, value, *expiry) for key, value in items.items()]
+        )
+
+    async def close(self) -> None:
+        if self._streams is not None and self._loop is asyncio.get_running_loop():
+            await self._drop()
+
+
+class RespStandIn:
+    """an in-memory server with the few Redis commands RedisCache uses"""
+
+    def __init__(self):
+        self.data: dict[bytes, tuple[bytes, float | None]] = {}
+        self.server = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        self.server = await asyncio.start_server(self._serve, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        self.server.close()
+        await self.server.wait_closed()
+
+    def _get(self, key: bytes) -> bytes | None:
+        value, expires = self.data.get(key, (None, None))
+        if expires is not None and expires < time.monotonic():
+            del self.data[key]
+            return None
+        return value
+
+    def _reply(self, value) -> bytes:
+        if value is None:
+            return b"$-1\r\n"
+        if isinstance(value, list):
+            return b"*%d\r\n" % len(value) + b"".join(self._reply(v) for v in value)
+        if isinstance(value, int):
+            return b":%d\r\n" % value
+        if isinstance(value, RespError):
+            return b"-%s\r\n" % str(value).encode("utf-8")
+        if isinstance(value, str):
+            return b"+%s\r\n" % value.encode("utf-8")
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+
+    def _execute(self, command: list[bytes]):
+        name, args = command[0].upper(), command[1:]
+        if name == b"PING":
+            return "PONG"
+        if name == b"SELECT":
+            return "OK"
+        if name == b"FLUSHDB":
+            self.data.clear()
+            return "OK"
+        if name == b"GET" and len(args) == 1:
+            return self._get(args[0])
+        if name == b"MGET" and args:
+            return [self._get(key) for key in args]
+        if name == b"SET" and len(args) in (2, 4):
+            expires = None
+            if len(args) == 4:
+                expires = time.monotonic() + int(args[3])
+            self.data[args[0]] = (args[1], expires)
+            return "OK"
+        if name == b"DEL":
+            return sum(self.data.pop(key, None) is not None for key in args)
+        if name == b"DBSIZE":
+            return len(self.data)
+        return RespError("ERR unknown command '{}'".format(name.decode("utf-8", "replace")))
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                command = await resp_read(reader)
+                if not isinstance(command, list) or not command:
+                    break
+                writer.write(self._reply(self._execute(command)))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+def cache_from_url(url: str) -> RenderCache:
+    """memory, sqlite:/path or redis://host:port/db?ttl=seconds"""
+    parsed = urllib.parse.urlparse(url)
+    if parsed.scheme in ("", "memory"):
+        return MemoryCache()
+    if parsed.scheme == "sqlite":
+        return SqliteCache(parsed.path)
+    if parsed.scheme == "redis":
+        query = urllib.parse.parse_qs(parsed.query)
+        return RedisCache(
+            host=parsed.hostname or "127.0.0.1",
+            port=parsed.port or 6379,
+            db=int(parsed.path.strip("/") or 0),
+            ttl=int(query["ttl"][0]) if "ttl" in query else None,
+        )
+    msg = "unknown cache {}".format(url)
+    raise ValueError(msg)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Redis protocol stand-in")
+    parser.add_argument("--port", type=int, default=6379)
+    args = parser.parse_args()
+
+    async def serve():
+        stand_in = RespStandIn()
+        port = await stand_in.start(port=args.port)
+        print("listening on 127.0.0.1:{}".format(port))
+        await stand_in.server.serve_forever()
+
+    asyncio.run(serve())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
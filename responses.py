@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""JSON responses serialized in one pass.
+
+FastJSONResponse encodes its content with orjson directly: no
+jsonable_encoder walk, NumPy arrays and msgspec structs are serialized
+natively. Non finite floats become null.
+"""
+
+import msgspec
+import numpy as np
+import orjson
+from starlette.responses import JSONResponse
+
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def _default(obj):
+    """types orjson does not know about"""
+    if isinstance(obj, msgspec.Struct):
+        return msgspec.to_builtins(obj)
+    if isinstance(obj, np.ndarray):
+        # non contiguous or exotic dtypes
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    msg = "Type is not JSON serializable: {}".format(type(obj).__name__)
+    raise TypeError(msg)
+
+
+def dumps(content) -> bytes:
+    return orjson.dumps(content, default=_default, option=ORJSON_OPTIONS)
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return dumps(content)
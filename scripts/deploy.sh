@@ -30,6 +30,11 @@ else
 fi
 chown -R $USER:$USER "$BACK"
 
+# new or changed EQs of the catalog into the database
+(cd "$BACK" && EQCONVERTER_ENV=prod python3 -m scripts.ingest)
+# static copy of the catalog, only speakers whose EQs changed are rendered
+(cd "$BACK" && EQCONVERTER_ENV=prod python3 -m scripts.prerender --out "$WWW/static")
+
 # ----------------------------------------------------------------------
 # 2 options for running
 # ----------------------------------------------------------------------
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Store the EQs of a new eqdata.json in the database, incrementally.
+
+Usage:
+    python3 -m scripts.ingest                        EQDATA into EQCONVERTER_DB
+    python3 -m scripts.ingest --eqdata eqdata.json --batch 1000
+
+eqdata.json is streamed one speaker at a time. The raw bytes of each
+speaker's entry are hashed and compared with the eqdata_manifest table:
+unchanged speakers are not even parsed. A changed speaker is parsed and
+its EQs are hashed the way the backend hashes them; only EQs that the
+speaker did not have before are upserted. Rows and manifest updates are
+written together in batched transactions, so an interrupted run leaves a
+consistent database and the next run picks up where it stopped.
+
+Speakers that left the catalog are removed from the manifest. Their EQs
+stay in the eqs table: their hashes may have been shared.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, BASE_DIR)
+
+from backend import EQ, EQ_UPSERT, EQDATA, create_connection, create_table, parse_eq
+from converter import EQ_HASH_KEY, spin_eq2text
+from eqdata import iter_eqdata
+
+BATCH_SIZE = 500
+
+
+def entry_digest(raw: bytes) -> str:
+    # keyed like the EQ hashes: a new hashing scheme stores every speaker again
+    return hashlib.blake2b(raw, digest_size=16, key=EQ_HASH_KEY).hexdigest()
+
+
+def speaker_rows(speaker_name: str, entry: dict) -> tuple[dict[str, str], list[EQ], list[str]]:
+    """EQ hash per key, rows to store and errors of a speaker"""
+    hashes = {}
+    rows = []
+    errors = []
+    for key, eq in entry.get("eqs", {}).items():
+        text = spin_eq2text(eq)
+        success, eq_or_msg = parse_eq(speaker_name, text.encode("utf-8"))
+        if not success:
+            errors.append("{} {}: {}".format(speaker_name, key, eq_or_msg))
+            continue
+        hashes[key] = eq_or_msg.eq_hash
+        rows.append(eq_or_msg)
+    return hashes, rows, errors
+
+
+def flush(connection, rows: list[EQ], manifest: list[tuple[str, str, str]], removed: list[str]) -> None:
+    """one transaction for a batch of rows and the speakers they belong to"""
+    with connection:
+        cursor = connection.cursor()
+        cursor.executemany(EQ_UPSERT, [(eq.eq_hash, eq.name, eq.peq) for eq in rows])
+        cursor.executemany(
+            "INSERT INTO eqdata_manifest (speaker, digest, eqs) VALUES (?, ?, ?) "
+            "ON CONFLICT (speaker) DO UPDATE SET digest=excluded.digest, eqs=excluded.eqs",
+            manifest,
+        )
+        cursor.executemany(
+            "DELETE FROM eqdata_manifest WHERE speaker=?", [(name,) for name in removed]
+        )
+
+
+def ingest(path: str, batch_size: int = BATCH_SIZE) -> dict[str, int]:
+    """store what changed in the eqdata.json at path and return counts"""
+    create_table()
+    connection = create_connection()
+    try:
+        previous = {
+            speaker: (digest, eqs)
+            for speaker, digest, eqs in connection.execute(
+                "SELECT speaker, digest, eqs FROM eqdata_manifest"
+            )
+        }
+        counts = {"speakers": 0, "changed": 0, "eqs": 0, "removed": 0, "errors": 0}
+        seen = set()
+        rows = []
+        manifest = []
+        for speaker_name, raw in iter_eqdata(path):
+            seen.add(speaker_name)
+            counts["speakers"] += 1
+            digest = entry_digest(raw)
+            old_digest, old_eqs = previous.get(speaker_name, ("", "{}"))
+            if digest == old_digest:
+                continue
+            counts["changed"] += 1
+            hashes, speaker_eqs, errors = speaker_rows(speaker_name, json.loads(raw))
+            for error in errors:
+                print("Warning: {}".format(error))
+            counts["errors"] += len(errors)
+            known = set(json.loads(old_eqs).values())
+            rows.extend(eq for eq in speaker_eqs if eq.eq_hash not in known)
+            # a speaker with errors is parsed again next time
+            manifest.append((speaker_name, "" if errors else digest, json.dumps(hashes)))
+            if len(rows) >= batch_size:
+                counts["eqs"] += len(rows)
+                flush(connection, rows, manifest, [])
+                rows, manifest = [], []
+        removed = [name for name in previous if name not in seen]
+        counts["eqs"] += len(rows)
+        counts["removed"] = len(removed)
+        flush(connection, rows, manifest, removed)
+    finally:
+        connection.close()
+    return counts
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--eqdata", default=EQDATA)
+    parser.add_argument("--batch", type=int, default=BATCH_SIZE, help="EQs per transaction")
+    args = parser.parse_args()
+
+    counts = ingest(args.eqdata, args.batch)
+    print(
+        "{speakers} speakers, {changed} changed, {eqs} EQs stored, {removed} removed, {errors} errors".format(
+            **counts
+        )
+    )
+    return 1 if counts["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
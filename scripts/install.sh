@@ -1,9 +1,21 @@
 #!/bin/sh
 
+# catch performance regressions before deploying, against a baseline of
+# this machine: the committed one comes from another host and only warns
+if test -z "$EQCONVERTER_SKIP_BENCH"; then
+    baseline=benchmarks/baseline.local.json
+    if test -f "$baseline"; then
+        python3 -m benchmarks.hotpaths --baseline "$baseline" || exit 1
+    else
+        echo "Recording the benchmark baseline of this machine in $baseline"
+        python3 -m benchmarks.hotpaths --save --baseline "$baseline" || exit 1
+    fi
+fi
+
 mkdir -p dist
 
 tar zcvf dist/frontend.tgz index.html index.js package.json package-lock.json assets
-tar zcvf dist/backend.tgz __init__.py backend.py converter.py iir requirements.txt
+tar zcvf dist/backend.tgz __init__.py backend.py converter.py targets.py metrics.py profiling.py graphs.py responses.py catalog.py eqdata.py packed.py rendercache.py artifacts.py database.py uploads.py gunicorn.conf.py iir scripts/__init__.py scripts/prerender.py scripts/ingest.py scripts/pack.py requirements.txt
 
 rsync -arv --delete \
   dist/frontend.tgz \
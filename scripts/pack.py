@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Pack metadata.json, eqdata.json and the catalog filter banks in one file.
+
+Usage:
+    python3 -m scripts.pack                     METADATA and EQDATA into EQCONVERTER_PACKED
+    python3 -m scripts.pack --out catalog.pack
+
+The gunicorn master runs pack() before forking its workers (see
+gunicorn.conf.py); workers map the file, see packed.py.
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+sys.path.insert(0, str(BASE_DIR))
+
+from backend import EQDATA, METADATA, PACKED
+from converter import iir2hash, iir2peq, lines2iir, spin_eq2text
+from eqdata import iter_eqdata
+from graphs import GRAPH_DEFAULT_POINTS
+from iir.filter_peq import peq_batch_banks, peq_freq_grid
+from packed import folded, packed_catalog, sources_version, write_packed
+
+
+def eqdata_banks(eqdata: list[tuple[str, bytes]], points: int) -> dict[bytes, bytes]:
+    """filter bank of every EQ of the catalog, by hash"""
+    peqs = {}
+    for _, raw in eqdata:
+        for eq in json.loads(raw).get("eqs", {}).values():
+            text = spin_eq2text(eq)
+            success, iir = lines2iir(text.split("\n"))
+            if not success:
+                continue
+            peqs.setdefault(iir2hash(iir).encode("utf-8"), iir2peq(iir))
+    # all the EQs are evaluated together, by chunks
+    hashes = list(peqs)
+    banks = {}
+    for start, bank, mask in peq_batch_banks(peq_freq_grid(points), list(peqs.values())):
+        for i, rows in enumerate(mask):
+            banks[hashes[start + i]] = bank[i][rows].astype("<f8").tobytes()
+    return banks
+
+
+def pack(
+    out: str,
+    metadata_path: str = METADATA,
+    eqdata_path: str = EQDATA,
+    points: int = GRAPH_DEFAULT_POINTS,
+    *,
+    force: bool = False,
+) -> bool:
+    """write the packed catalog unless an up to date one exists, true if written"""
+    if not force and packed_catalog(out) is not None:
+        return False
+    sources = sources_version((metadata_path, eqdata_path))
+    with open(metadata_path, "r", encoding="utf-8") as fd:
+        metadata = json.load(fd)
+    eqdata = list(iter_eqdata(eqdata_path))
+    brands = {v.get("brand") for v in metadata.values()}
+    brands.discard(None)
+    tables = {
+        "metadata": [
+            (name.encode("utf-8"), json.dumps(entry).encode("utf-8"))
+            for name, entry in metadata.items()
+        ],
+        "eqdata": [(name.encode("utf-8"), raw) for name, raw in eqdata],
+        "speakers_folded": folded(metadata),
+        "brands": [(brand.encode("utf-8"), b"") for brand in brands],
+        "brands_folded": folded(brands),
+        "banks": eqdata_banks(eqdata, points).items(),
+    }
+    write_packed(out, tables, sources, points)
+    return True
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--out", default=PACKED or "catalog.pack")
+    parser.add_argument("--metadata", default=METADATA)
+    parser.add_argument("--eqdata", default=EQDATA)
+    parser.add_argument("--force", action="store_true", help="rebuild even if up to date")
+    args = parser.parse_args()
+
+    written = pack(args.out, args.metadata, args.eqdata, force=args.force)
+    print("{} {}".format(args.out, "written" if written else "up to date"))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Render the whole spinorama catalog to static files.
+
+Usage:
+    python3 -m scripts.prerender                    incremental build into FILES/static
+    python3 -m scripts.prerender --jobs 8 --force   re-render every speaker
+    python3 -m scripts.prerender --out /tmp/static --eqdata eqdata.json
+
+Every EQ of eqdata.json is formatted, converted to each target and its
+graphs are computed by a pool of processes. The bodies are exactly the ones
+the backend returns for a request with only eq_hash as argument, so nginx
+can serve them without reaching Python (see etc/nginx-prod.conf):
+
+    static/eq/<hash[:2]>/<hash>/target/rme_totalmix_channel.json
+    static/eq/<hash[:2]>/<hash>/target/rme_totalmix_room.json   left = right
+    static/eq/<hash[:2]>/<hash>/graph.json
+    static/eq/<hash[:2]>/<hash>/graph_spl.json
+    static/eq/<hash[:2]>/<hash>/graph_spl_details.json
+    static/eq/<hash[:2]>/<hash>/graph.f32                 format=f32 first
+    static/eq/<hash[:2]>/<hash>/graph_spl.f32
+    static/eq/<hash[:2]>/<hash>/graph_spl_details.f32
+    static/speaker/<speaker name>/eqdata.json
+    static/manifest.json
+
+The aupreset and apo bodies show the EQ name, and speakers or uploads with
+the same filters share the hash: they are left to the backend, which keys
+them on the name.
+
+The manifest records a digest of each speaker's entry in eqdata.json and
+the hashes of its EQs: the next run only renders speakers whose digest
+changed, removes speakers that left the catalog and the EQs nobody uses
+anymore. Rendered EQs are also stored in the database (EQCONVERTER_DB) so
+requests that nginx passes to the backend know them.
+"""
+
+import argparse
+import concurrent.futures
+import contextlib
+import hashlib
+import io
+import json
+import os
+import pathlib
+import shutil
+import sys
+
+import numpy as np
+
+BASE_DIR = pathlib.Path(__file__).resolve().parent.parent
+
+sys.path.insert(0, str(BASE_DIR))
+
+from backend import EQDATA, FILES, SOFTWARE_VERSION, create_table, store_eq
+from converter import iir2hash, iir2peq, lines2iir, spin_eq2text
+from graphs import (
+    GRAPH_DEFAULT_POINTS,
+    graph_content,
+    graph_encode,
+    graph_curves,
+    graph_spl_content,
+    graph_spl_details_content,
+)
+from iir.filter_peq import peq_bank, peq_freq_grid
+from responses import dumps
+from targets import convert
+
+MANIFEST = "manifest.json"
+# a change of version re-renders everything
+MANIFEST_VERSION = 3
+# targets whose body shows the EQ name, not pre-rendered
+NAMED_TARGETS = ("aupreset", "apo")
+
+
+def speaker_digest(speaker: dict) -> str:
+    """digest of a speaker entry of eqdata.json, independent of key order"""
+    canonical = json.dumps(speaker, sort_keys=True, separators=(",", ":"))
+    return hashlib.blake2b(canonical.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def eq_dir(root: pathlib.Path, eq_hash: str) -> pathlib.Path:
+    return root / "eq" / eq_hash[:2] / eq_hash
+
+
+def speaker_dir(root: pathlib.Path, speaker_name: str) -> pathlib.Path | None:
+    """None when the name cannot be a single path component"""
+    if not speaker_name or "/" in speaker_name or speaker_name.startswith("."):
+        return None
+    return root / "speaker" / speaker_name
+
+
+def write_atomic(path: pathlib.Path, body: bytes) -> None:
+    """readers see the old file or the new one, never a partial one"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name("{}.{}.tmp".format(path.name, os.getpid()))
+    tmp.write_bytes(body)
+    os.replace(tmp, path)
+
+
+def render_eq(title: str, iir: list) -> dict[str, bytes] | None:
+    """file name -> body of every static file of an EQ, None if a target fails"""
+    files = {}
+    for name, iirs in (
+        ("rme_totalmix_channel", [iir]),
+        ("rme_totalmix_room", [iir, iir]),
+    ):
+        success, content = convert(name, iirs, title)
+        if not success:
+            return None
+        files["target/{}.json".format(name)] = dumps(content)
+
+    freq = peq_freq_grid(GRAPH_DEFAULT_POINTS)
+    bank = peq_bank(freq, iir2peq(iir))
+    curves = graph_curves(bank)
+    spl = bank.sum(axis=0)
+    files["graph.json"] = dumps(graph_content(freq, curves))
+    files["graph_spl.json"] = dumps(graph_spl_content(freq, spl))
+    files["graph_spl_details.json"] = dumps(graph_spl_details_content(freq, bank))
+    # what the frontend fetches
+    files["graph.f32"] = graph_encode(freq, curves, "f32")
+    files["graph_spl.f32"] = graph_encode(freq, spl[np.newaxis, :], "f32")
+    files["graph_spl_details.f32"] = graph_encode(freq, bank, "f32")
+    return files
+
+
+def render_speaker(job: tuple[str, dict, str]) -> tuple[str, list[tuple[str, str]], list[str]]:
+    """render one speaker, return its name, its (hash, text) and the errors"""
+    speaker_name, speaker, out = job
+    root = pathlib.Path(out)
+    eqs = []
+    errors = []
+    flat = []
+    # the fits print their warnings
+    with contextlib.redirect_stdout(io.StringIO()):
+        for key, eq in speaker.get("eqs", {}).items():
+            text = spin_eq2text(eq)
+            success, iir = lines2iir(text.split("\n"))
+            if not success:
+                errors.append("{} {}: cannot parse the EQ".format(speaker_name, key))
+                continue
+            eq_hash = iir2hash(iir)
+            files = render_eq(speaker_name, iir)
+            if files is None:
+                errors.append("{} {}: a target failed".format(speaker_name, key))
+                continue
+            directory = eq_dir(root, eq_hash)
+            for name, body in files.items():
+                write_atomic(directory / name, body)
+            # left by an older version
+            for name in NAMED_TARGETS:
+                (directory / "target" / "{}.json".format(name)).unlink(missing_ok=True)
+            eqs.append((eq_hash, text))
+            flat.append(
+                {
+                    "hash": eq_hash,
+                    "eq": text,
+                    "display_name": eq["display_name"],
+                    "name": key,
+                }
+            )
+    directory = speaker_dir(root, speaker_name)
+    if directory is not None:
+        write_atomic(directory / "eqdata.json", dumps(flat))
+    return speaker_name, eqs, errors
+
+
+def load_manifest(root: pathlib.Path) -> dict:
+    empty = {"version": MANIFEST_VERSION, "software": SOFTWARE_VERSION, "speakers": {}}
+    try:
+        with open(root / MANIFEST, "r", encoding="utf-8") as fd:
+            manifest = json.load(fd)
+    except (OSError, ValueError):
+        return empty
+    if (
+        manifest.get("version") != MANIFEST_VERSION
+        or manifest.get("software") != SOFTWARE_VERSION
+    ):
+        return empty
+    return manifest
+
+
+def up_to_date(root: pathlib.Path, previous: dict | None, digest: str) -> bool:
+    if previous is None or previous["digest"] != digest:
+        return False
+    return all((eq_dir(root, eq_hash) / "graph.json").exists() for eq_hash in previous["eqs"])
+
+
+def prune(root: pathlib.Path, speakers: dict, removed: list[str], stale: set[str]) -> None:
+    """remove the files of speakers and EQs that are not in the catalog anymore"""
+    for speaker_name in removed:
+        directory = speaker_dir(root, speaker_name)
+        if directory is not None:
+            shutil.rmtree(directory, ignore_errors=True)
+    used = {eq_hash for entry in speakers.values() for eq_hash in entry["eqs"]}
+    for eq_hash in stale - used:
+        shutil.rmtree(eq_dir(root, eq_hash), ignore_errors=True)
+
+
+def prerender(
+    eqdata: dict,
+    root: pathlib.Path,
+    jobs: int | None = None,
+    *,
+    force: bool = False,
+    store: bool = True,
+) -> dict[str, int]:
+    """render what changed in eqdata under root and return counts"""
+    root.mkdir(parents=True, exist_ok=True)
+    manifest = {"speakers": {}} if force else load_manifest(root)
+    previous = manifest["speakers"]
+
+    speakers = {}
+    todo = []
+    for speaker_name, speaker in eqdata.items():
+        digest = speaker_digest(speaker)
+        if up_to_date(root, previous.get(speaker_name), digest):
+            speakers[speaker_name] = previous[speaker_name]
+        else:
+            todo.append((speaker_name, speaker, digest))
+
+    if store and todo:
+        create_table()
+    errors = []
+    n_eqs = 0
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+        rendered = pool.map(
+            render_speaker,
+            [(name, speaker, str(root)) for name, speaker, _ in todo],
+            chunksize=16,
+        )
+        for (speaker_name, eqs, speaker_errors), (_, _, rendered_digest) in zip(
+            rendered, todo, strict=True
+        ):
+            errors.extend(speaker_errors)
+            # a speaker with errors is retried on the next run
+            digest = "" if speaker_errors else rendered_digest
+            if store:
+                for _, text in eqs:
+                    success, msg = store_eq(speaker_name, text.encode("utf-8"))
+                    if not success:
+                        errors.append("{}: {}".format(speaker_name, msg))
+            speakers[speaker_name] = {"digest": digest, "eqs": [eq_hash for eq_hash, _ in eqs]}
+            n_eqs += len(eqs)
+
+    removed = [name for name in previous if name not in eqdata]
+    stale = {eq_hash for entry in previous.values() for eq_hash in entry["eqs"]}
+    prune(root, speakers, removed, stale)
+
+    manifest = {"version": MANIFEST_VERSION, "software": SOFTWARE_VERSION, "speakers": speakers}
+    write_atomic(root / MANIFEST, json.dumps(manifest, indent=1, sort_keys=True).encode("utf-8"))
+    for error in errors:
+        print("Warning: {}".format(error))
+    return {
+        "speakers": len(speakers),
+        "rendered": len(todo),
+        "eqs": n_eqs,
+        "removed": len(removed),
+        "errors": len(errors),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--eqdata", default=EQDATA)
+    parser.add_argument("--out", default=os.path.join(FILES, "static"))
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="default: number of cpus")
+    parser.add_argument("--force", action="store_true", help="ignore the manifest")
+    parser.add_argument("--no-store", action="store_true", help="do not fill the database")
+    args = parser.parse_args()
+
+    with open(args.eqdata, "r", encoding="utf-8") as fd:
+        eqdata = json.load(fd)
+    counts = prerender(
+        eqdata, pathlib.Path(args.out), args.jobs, force=args.force, store=not args.no_store
+    )
+    print(
+        "{speakers} speakers, {rendered} rendered ({eqs} EQs), {removed} removed, {errors} errors".format(
+            **counts
+        )
+    )
+    return 1 if counts["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
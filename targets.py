@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""Registry of the targets we can write an EQ to.
+
+Each target declares what it can represent (bands, types per slot,
+parameter ranges, number of channels) and comes with a writer. All
+conversions go through convert(), which validates the request, caches the
+result and is shared by the command line and the backend.
+"""
+
+import functools
+import pathlib
+from collections.abc import Callable
+from dataclasses import dataclass
+from types import MappingProxyType
+
+from iir.filter_iir import Biquad
+from iir.filter_fit import PeqConstraints
+from iir.filter_peq import peq_format_apo
+from converter import (
+    AUNBANDEQ_CONSTRAINTS,
+    IIR,
+    PRESET_DIR,
+    RME_CHANNEL_CONSTRAINTS,
+    RME_ROOM_CONSTRAINTS,
+    STATUS,
+    iir2aupreset,
+    iir2peq,
+    iir2rme_totalmix_channel,
+    iir2rme_totalmix_room,
+)
+from metrics import stage
+
+Writer = Callable[[list[IIR], str], tuple[STATUS, str]]
+
+# number of entries kept in the conversion cache
+CONVERT_CACHE_SIZE = 1024
+
+
+@dataclass(frozen=True)
+class Target:
+    """a device or software we can write an EQ for"""
+
+    name: str
+    description: str
+    extension: str
+    constraints: PeqConstraints | None
+    writer: Writer
+    max_channels: int = 1
+    aliases: tuple[str, ...] = ()
+    install_dir: pathlib.Path | None = None
+    media_type: str = "text/plain"
+
+    def capabilities(self) -> dict:
+        """describe the target in a json friendly way"""
+        constraints = {}
+        if self.constraints is not None:
+            constraints = {
+                "max_bands": self.constraints.max_bands,
+                "slot_types": [
+                    sorted(Biquad.type2name[t][1] for t in slot)
+                    for slot in self.constraints.slot_types
+                ],
+                "freq_range": list(self.constraints.freq_range),
+                "q_range": list(self.constraints.q_range),
+                "gain_range": list(self.constraints.gain_range),
+                "gain_step": self.constraints.gain_step,
+            }
+        return {
+            "name": self.name,
+            "description": self.description,
+            "extension": self.extension,
+            "max_channels": self.max_channels,
+            **constraints,
+        }
+
+
+_TARGETS: dict[str, Target] = {}
+_ALIASES: dict[str, str] = {}
+
+# read only views on the registry
+TARGETS = MappingProxyType(_TARGETS)
+
+
+def register_target(target: Target) -> Target:
+    """add a target to the registry, names and aliases must be unique"""
+    for key in (target.name, *target.aliases):
+        if key in _ALIASES:
+            msg = "target {} is already registered".format(key)
+            raise ValueError(msg)
+    _TARGETS[target.name] = target
+    for key in (target.name, *target.aliases):
+        _ALIASES[key] = target.name
+    _convert_cached.cache_clear()
+    return target
+
+
+def get_target(name: str) -> Target | None:
+    """find a target by name or alias"""
+    key = _ALIASES.get(name)
+    if key is None:
+        return None
+    return _TARGETS[key]
+
+
+def known_targets() -> list[str]:
+    """all names and aliases accepted by get_target"""
+    return sorted(_ALIASES.keys())
+
+
+def _freeze(iirs: list[IIR]) -> tuple:
+    return tuple(
+        tuple(tuple(sorted(iir.items())) for iir in channel)
+        for channel in iirs
+    )
+
+
+def _thaw(frozen: tuple) -> list[IIR]:
+    return [[dict(iir) for iir in channel] for channel in frozen]
+
+
+@functools.lru_cache(maxsize=CONVERT_CACHE_SIZE)
+def _convert_cached(name: str, frozen: tuple, title: str) -> tuple[STATUS, str]:
+    return _TARGETS[name].writer(_thaw(frozen), title)
+
+
+def validate(target: Target, iirs: list[IIR]) -> tuple[STATUS, str]:
+    """check that a conversion request makes sense for a target"""
+    if len(iirs) == 0 or len(iirs) > target.max_channels:
+        return False, "{} takes between 1 and {} EQs, got {}".format(
+            target.name, target.max_channels, len(iirs)
+        )
+    for channel in iirs:
+        for iir in channel:
+            if "type" not in iir or "freq" not in iir:
+                msg = "filter {} is missing a type or a frequency".format(iir)
+                return False, msg
+    return True, ""
+
+
+def convert(name: str, iirs: list[IIR], title: str) -> tuple[STATUS, str]:
+    """write one EQ per channel to the target called name
+
+    Return the status and either the generated file or an error message.
+    """
+    target = get_target(name)
+    if target is None:
+        return False, "unknown target {}".format(name)
+    status, msg = validate(target, iirs)
+    if not status:
+        return status, msg
+    with stage("render"):
+        return _convert_cached(target.name, _freeze(iirs), title)
+
+
+def convert_many(
+    name: str, batch: list[tuple[list[IIR], str]]
+) -> list[tuple[STATUS, str]]:
+    """convert a batch of (iirs, title) to the same target"""
+    return [convert(name, iirs, title) for iirs, title in batch]
+
+
+def convert_cache_info():
+    return _convert_cached.cache_info()
+
+
+# ----------------------------------------------------------------------
+# known targets
+# ----------------------------------------------------------------------
+
+
+def _write_aupreset(iirs: list[IIR], title: str) -> tuple[STATUS, str]:
+    return iir2aupreset(iirs[0], title)
+
+
+def _write_apo(iirs: list[IIR], title: str) -> tuple[STATUS, str]:
+    return True, peq_format_apo(comment=title, peq=iir2peq(iirs[0]))
+
+
+def _write_rme_channel(iirs: list[IIR], _title: str) -> tuple[STATUS, str]:
+    return iir2rme_totalmix_channel(iirs[0])
+
+
+def _write_rme_room(iirs: list[IIR], _title: str) -> tuple[STATUS, str]:
+    right = iirs[1] if len(iirs) > 1 else []
+    return iir2rme_totalmix_room(iirs[0], right)
+
+
+register_target(
+    Target(
+        name="aupreset",
+        description="Apple AUNBandEQ preset",
+        extension="aupreset",
+        constraints=AUNBANDEQ_CONSTRAINTS,
+        writer=_write_aupreset,
+        media_type="application/xml",
+        install_dir=PRESET_DIR,
+    )
+)
+
+register_target(
+    Target(
+        name="apo",
+        description="Equalizer APO / AutoEQ parametric EQ",
+        extension="txt",
+        constraints=None,
+        writer=_write_apo,
+    )
+)
+
+register_target(
+    Target(
+        name="rme_totalmix_channel",
+        description="RME TotalMix channel EQ",
+        extension="tmeq",
+        constraints=RME_CHANNEL_CONSTRAINTS,
+        writer=_write_rme_channel,
+        media_type="application/xml",
+        aliases=("rmetmeq",),
+    )
+)
+
+register_target(
+    Target(
+        name="rme_totalmix_room",
+        description="RME TotalMix room EQ",
+        extension="tmreq",
+        constraints=RME_ROOM_CONSTRAINTS,
+        writer=_write_rme_room,
+        media_type="application/xml",
+        max_channels=2,
+        aliases=("rmetmreq",),
+    )
+)
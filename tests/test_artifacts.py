@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""Tests for the artifact store and the download endpoint"""
+
+import unittest
+import os
+import sys
+import tempfile
+import time
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from artifacts import ArtifactKey, ArtifactStore
+    ARTIFACTS_AVAILABLE = True
+except ImportError as e:
+    print(f"Warning: Could not import artifacts module: {e}")
+    ARTIFACTS_AVAILABLE = False
+
+try:
+    from fastapi.testclient import TestClient
+    import backend
+    BACKEND_AVAILABLE = True
+except ImportError as e:
+    print(f"Warning: Could not import backend module: {e}")
+    BACKEND_AVAILABLE = False
+
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HASH = "ab" + "c" * 126
+
+
+@unittest.skipUnless(ARTIFACTS_AVAILABLE, "artifacts module not available")
+class TestArtifactStore(unittest.TestCase):
+    """Test layout, writes and eviction"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = ArtifactStore(self.tmp.name, max_bytes=250)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_layout(self):
+        """Test the sharded path and that parameters change it"""
+        key = ArtifactKey(HASH, "apo", "txt", "v1.3")
+        self.assertEqual(key.relative_path(), "v1.3/apo/ab/cc/{}.txt".format(HASH))
+        right = ArtifactKey(HASH, "apo", "txt", "v1.3", (("right", "x"),))
+        other = ArtifactKey(HASH, "apo", "txt", "v1.3", (("right", "y"),))
+        self.assertNotEqual(right.relative_path(), key.relative_path())
+        self.assertNotEqual(right.relative_path(), other.relative_path())
+        self.assertNotEqual(
+            key.relative_path(), ArtifactKey(HASH, "apo", "txt", "v1.4").relative_path()
+        )
+
+    def test_put_get(self):
+        """Test a miss, a write and a hit, without temporary files left"""
+        key = ArtifactKey(HASH, "apo", "txt", "v1")
+        self.assertIsNone(self.store.get(key))
+        path = self.store.put(key, b"Preamp: -1 dB\n")
+        self.assertEqual(self.store.get(key), path)
+        self.assertEqual(path.read_bytes(), b"Preamp: -1 dB\n")
+        self.assertEqual(os.listdir(path.parent), [path.name])
+
+    def test_sweep(self):
+        """Test that least recently used files go first"""
+        keys = [ArtifactKey("{:02d}".format(i) * 64, "apo", "txt", "v1") for i in range(5)]
+        now = time.time()
+        for i, key in enumerate(keys):
+            path = self.store.put(key, b"x" * 100)
+            os.utime(path, (now - 100 + i, now - 100 + i))
+        # used recently: kept
+        self.store.get(keys[0])
+        self.assertTrue(self.store.sweep_due())
+        self.assertEqual(self.store.sweep(), (3, 300))
+        self.assertFalse(self.store.sweep_due())
+        self.assertEqual(
+            [self.store.get(key) is not None for key in keys], [True, False, False, False, True]
+        )
+
+
+@unittest.skipUnless(BACKEND_AVAILABLE, "Requires the backend dependencies")
+class TestDownload(unittest.TestCase):
+    """Test that downloads are the converted files"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.saved = (backend.DATABASE, backend.ARTIFACT_STORE, backend.ACCEL_REDIRECT)
+        backend.DATABASE = os.path.join(self.tmp.name, "eqs.db")
+        backend.ARTIFACT_STORE = ArtifactStore(os.path.join(self.tmp.name, "artifacts"))
+        backend.create_table()
+        with open(os.path.join(BASE_DIR, "examples_rews", "eq.txt"), "rb") as fd:
+            success, self.eq_hash = backend.store_eq("my eq.txt", fd.read())
+        self.assertTrue(success)
+        self.client = TestClient(backend.backend)
+
+    def tearDown(self):
+        backend.DATABASE, backend.ARTIFACT_STORE, backend.ACCEL_REDIRECT = self.saved
+        self.tmp.cleanup()
+
+    def test_targets(self):
+        """Test every target against the json endpoints"""
+        for target, url in (
+            ("apo", "/v1/eq/target/apo?eq_hash={}"),
+            ("rme_totalmix_channel", "/v1/eq/target/rme_totalmix_channel?eq_hash={}"),
+            ("rme_totalmix_room", "/v1/eq/target/rme_totalmix_room?eq_hash_left={0}&eq_hash_right={0}"),
+        ):
+            with self.subTest(target=target):
+                expected = self.client.get(url.format(self.eq_hash)).json()
+                for _ in range(2):
+                    response = self.client.get(
+                        "/v1/eq/download/{}?eq_hash={}".format(target, self.eq_hash)
+                    )
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(response.text, expected)
+        response = self.client.get("/v1/eq/download/aupreset?eq_hash={}".format(self.eq_hash))
+        expected = self.client.get("/v1/eq/target/aupreset?eq_hash={}".format(self.eq_hash))
+        self.assertEqual(response.text, expected.json()[1])
+        self.assertEqual(response.headers["content-type"], "application/xml")
+        self.assertEqual(
+            response.headers["content-disposition"], "attachment; filename*=utf-8''my%20eq.aupreset"
+        )
+
+    def test_accel_redirect(self):
+        """Test that behind nginx the body is left to nginx"""
+        backend.ACCEL_REDIRECT = "/_artifacts/"
+        response = self.client.get("/v1/eq/download/rmetmeq?eq_hash={}".format(self.eq_hash))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(
+            response.headers["content-disposition"], "attachment; filename*=utf-8''my%20eq.tmeq"
+        )
+        redirect = response.headers["x-accel-redirect"]
+        self.assertTrue(redirect.startswith("/_artifacts/"))
+        path = os.path.join(backend.ARTIFACT_STORE.root, redirect[len("/_artifacts/") :])
+        self.assertTrue(os.path.exists(path))
+
+    def test_renamed(self):
+        """Test that a re-upload under another name gets its own file"""
+        first = self.client.get("/v1/eq/download/apo?eq_hash={}".format(self.eq_hash))
+        with open(os.path.join(BASE_DIR, "examples_rews", "eq.txt"), "rb") as fd:
+            success, eq_hash = backend.store_eq("renamed.txt", fd.read())
+        self.assertTrue(success)
+        self.assertEqual(eq_hash, self.eq_hash)
+        second = self.client.get("/v1/eq/download/apo?eq_hash={}".format(eq_hash))
+        self.assertIn("my eq", first.text)
+        self.assertIn("renamed", second.text)
+        self.assertNotIn("my eq", second.text)
+
+    def test_render_version(self):
+        """Test that artifacts are stored under the render version"""
+        self.client.get("/v1/eq/download/apo?eq_hash={}".format(self.eq_hash))
+        self.assertEqual(
+            [path.name for path in backend.ARTIFACT_STORE.root.iterdir()],
+            [backend.RENDER_KEY_VERSION],
+        )
+
+    def test_unknown(self):
+        """Test unknown targets and hashes"""
+        self.assertEqual(
+            self.client.get("/v1/eq/download/nope?eq_hash={}".format(self.eq_hash)).status_code,
+            404,
+        )
+        self.assertEqual(
+            self.client.get("/v1/eq/download/apo?eq_hash={}".format("0" * 128)).status_code, 404
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
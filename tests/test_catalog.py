@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""Tests for the speaker indexes"""
+
+import unittest
+import json
+import sys
+import os
+import tempfile
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from catalog import SortedNames, SpeakerIndex, speaker_index
+    CATALOG_AVAILABLE = True
+except ImportError as e:
+    print(f"Warning: Could not import catalog module: {e}")
+    CATALOG_AVAILABLE = False
+
+
+METADATA = {
+    "KEF LS50": {"brand": "KEF"},
+    "KEF R3": {"brand": "KEF"},
+    "kali LP-6": {"brand": "kali"},
+    "Genelec 8030C": {"brand": "Genelec"},
+    "Genelec 8361A": {"brand": "Genelec"},
+    "Unknown": {},
+}
+
+
+@unittest.skipUnless(CATALOG_AVAILABLE, "Catalog module not available")
+class TestSortedNames(unittest.TestCase):
+    """Test prefix search and pagination"""
+
+    def setUp(self):
+        self.index = SpeakerIndex.build(METADATA)
+
+    def test_full_list(self):
+        """Test that without prefix the list is the one sorted() gives"""
+        self.assertEqual(self.index.speakers.search(), sorted(METADATA))
+        self.assertEqual(self.index.brands.search(), ["Genelec", "KEF", "kali"])
+
+    def test_prefix_ignores_case(self):
+        """Test that a prefix matches regardless of case"""
+        self.assertEqual(
+            self.index.speakers.search("k"), ["kali LP-6", "KEF LS50", "KEF R3"]
+        )
+        self.assertEqual(self.index.speakers.search("KEF "), ["KEF LS50", "KEF R3"])
+        self.assertEqual(self.index.speakers.search("genelec 83"), ["Genelec 8361A"])
+        self.assertEqual(self.index.speakers.search("z"), [])
+        self.assertEqual(self.index.speakers.count("k"), 3)
+
+    def test_pagination(self):
+        """Test limit and offset with and without prefix"""
+        self.assertEqual(self.index.speakers.search("k", limit=1, offset=1), ["KEF LS50"])
+        self.assertEqual(self.index.speakers.search("k", offset=5), [])
+        self.assertEqual(
+            self.index.speakers.search(limit=2, offset=1), sorted(METADATA)[1:3]
+        )
+
+    def test_matches_linear_scan(self):
+        """Test every prefix of every name against a linear scan"""
+        names = SortedNames.build(METADATA)
+        for name in METADATA:
+            for i in range(1, len(name) + 1):
+                prefix = name[:i].swapcase()
+                expected = sorted(
+                    (n for n in METADATA if n.casefold().startswith(prefix.casefold())),
+                    key=lambda n: (n.casefold(), n),
+                )
+                self.assertEqual(names.search(prefix), expected)
+
+    def test_reload(self):
+        """Test that the index is rebuilt when the file changes"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "metadata.json")
+            with open(path, "w", encoding="utf8") as f:
+                json.dump(METADATA, f)
+            first = speaker_index(path)
+            self.assertIs(speaker_index(path), first)
+            with open(path, "w", encoding="utf8") as f:
+                json.dump({"New Speaker": {"brand": "New"}}, f)
+            os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1))
+            self.assertEqual(speaker_index(path).speakers.search(), ["New Speaker"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""Tests for the eqdata.json scanner and the incremental ingestion"""
+
+import unittest
+import json
+import sys
+import os
+import sqlite3
+import tempfile
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from eqdata import eqdata_entry_cache_info, eqdata_index, iter_eqdata, scan_entries
+    EQDATA_AVAILABLE = True
+except ImportError as e:
+    print(f"Warning: Could not import eqdata module: {e}")
+    EQDATA_AVAILABLE = False
+
+try:
+    import backend
+    from benchmarks.loadtest import synthetic_catalog
+    from scripts.ingest import ingest
+    INGEST_AVAILABLE = True
+except ImportError as e:
+    print(f"Warning: Could not import ingest module: {e}")
+    INGEST_AVAILABLE = False
+
+
+TRICKY = {
+    "Plain": {"eqs": {}},
+    'Quote " and \\ backslash': {"eqs": {"a": {"peq": [1, 2.5, None, True]}}},
+    "Braces } { ] [ in a name": {"text": "} ] { [ \\\" ,"},
+    "Unicode é 音": {"list": [[], {}, [{"x": "é"}]], "n": -1.5e-3},
+    "Empty": {},
+    "Scalar": 3,
+}
+
+
+@unittest.skipUnless(EQDATA_AVAILABLE, "eqdata module not available")
+class TestScanEntries(unittest.TestCase):
+    """Test that the scanner finds every entry json.load finds"""
+
+    def check(self, buffer: bytes):
+        entries = [
+            (name, json.loads(buffer[start:end])) for name, start, end in scan_entries(buffer)
+        ]
+        self.assertEqual(entries, list(json.loads(buffer).items()))
+
+    def test_layouts(self):
+        """Test compact, indented and non ascii encodings"""
+        for kwargs in ({}, {"indent": 2}, {"separators": (",", ":")}, {"ensure_ascii": False}):
+            with self.subTest(**kwargs):
+                self.check(json.dumps(TRICKY, **kwargs).encode("utf-8"))
+        self.check(b" { } ")
+        self.check(b'\n{"a" : [ ] , "b":{"c":"}"}}\n')
+
+    def test_malformed(self):
+        """Test that truncated files are reported"""
+        buffer = json.dumps(TRICKY).encode("utf-8")
+        for cut in (1, len(buffer) // 2, len(buffer) - 1):
+            with self.subTest(cut=cut), self.assertRaises(ValueError):
+                list(scan_entries(buffer[:cut]))
+
+    def test_file(self):
+        """Test the mmap reader, including an empty file"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "eqdata.json")
+            with open(path, "w", encoding="utf-8") as fd:
+                json.dump(TRICKY, fd, ensure_ascii=False)
+            self.assertEqual(
+                {name: json.loads(raw) for name, raw in iter_eqdata(path)}, TRICKY
+            )
+            open(path, "w").close()
+            self.assertEqual(list(iter_eqdata(path)), [])
+
+
+@unittest.skipUnless(EQDATA_AVAILABLE, "eqdata module not available")
+class TestEqdataIndex(unittest.TestCase):
+    """Test the lazy reader the backend uses"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "eqdata.json")
+        self.write(TRICKY)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, eqdata: dict):
+        with open(self.path, "w", encoding="utf-8") as fd:
+            json.dump(eqdata, fd, indent=2, ensure_ascii=False)
+
+    def test_entries(self):
+        """Test that every entry reads as json.load gives it"""
+        index = eqdata_index(self.path)
+        self.assertEqual(len(index), len(TRICKY))
+        for name, entry in TRICKY.items():
+            self.assertEqual(index.get(name), entry)
+        self.assertIsNone(index.get("Missing"))
+        self.assertEqual(index.get("Missing", {}), {})
+
+    def test_hot_entries(self):
+        """Test that a speaker is parsed once"""
+        index = eqdata_index(self.path)
+        first = index.get("Plain")
+        hits = eqdata_entry_cache_info().hits
+        self.assertIs(index.get("Plain"), first)
+        self.assertEqual(eqdata_entry_cache_info().hits, hits + 1)
+
+    def test_reload(self):
+        """Test that the index is rebuilt when the file changes"""
+        index = eqdata_index(self.path)
+        self.assertIs(eqdata_index(self.path), index)
+        index.get("Plain")
+        # replaced as a deployment would do, then rewritten in place
+        replacement = os.path.join(self.tmp.name, "new.json")
+        with open(replacement, "w", encoding="utf-8") as fd:
+            json.dump({"New": {"eqs": {}}}, fd)
+        os.replace(replacement, self.path)
+        self.assertEqual(index.get("Plain"), TRICKY["Plain"])
+        self.assertEqual(list(eqdata_index(self.path).ranges), ["New"])
+        self.write({"Other": 1})
+        os.utime(self.path, ns=(0, os.stat(self.path).st_mtime_ns + 1))
+        self.assertEqual(eqdata_index(self.path).get("Other"), 1)
+
+
+@unittest.skipUnless(INGEST_AVAILABLE, "Requires the backend dependencies")
+class TestIngest(unittest.TestCase):
+    """Test that only what changed is stored"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "eqdata.json")
+        self.database = backend.DATABASE
+        backend.DATABASE = os.path.join(self.tmp.name, "eqs.db")
+        _, self.eqdata = synthetic_catalog(6)
+
+    def tearDown(self):
+        backend.DATABASE = self.database
+        self.tmp.cleanup()
+
+    def ingest(self, **kwargs) -> dict:
+        with open(self.path, "w", encoding="utf-8") as fd:
+            json.dump(self.eqdata, fd, indent=1)
+        return ingest(self.path, **kwargs)
+
+    def rows(self) -> int:
+        with sqlite3.connect(backend.DATABASE) as connection:
+            return connection.execute("SELECT COUNT(*) FROM eqs").fetchone()[0]
+
+    def test_incremental(self):
+        """Test a first load, a no-op reload and a reload after a change"""
+        counts = self.ingest(batch_size=5)
+        self.assertEqual((counts["changed"], counts["eqs"], counts["errors"]), (6, 12, 0))
+        self.assertEqual(self.rows(), 12)
+
+        counts = self.ingest()
+        self.assertEqual((counts["speakers"], counts["changed"], counts["eqs"]), (6, 0, 0))
+
+        changed, removed, *_ = self.eqdata
+        self.eqdata[changed]["eqs"]["autoeq"]["peq"][0]["dbGain"] += 1.0
+        del self.eqdata[removed]
+        counts = self.ingest()
+        self.assertEqual((counts["changed"], counts["eqs"], counts["removed"]), (1, 1, 1))
+        self.assertEqual(self.rows(), 13)
+
+    def test_same_hashes_as_backend(self):
+        """Test that ingested EQs are the ones /eqdata would store"""
+        self.ingest()
+        speaker_name, speaker = next(iter(self.eqdata.items()))
+        for eq in speaker["eqs"].values():
+            text = backend.spin_eq2text(eq)
+            eq_hash = backend.eq2hash(text.encode("utf-8"))
+            self.assertEqual(backend.db_get_eq(eq_hash)[0], speaker_name)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""Tests for listing, counting and exporting the eqs table"""
+
+import unittest
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from fastapi.testclient import TestClient
+    import backend
+    BACKEND_AVAILABLE = True
+except ImportError as e:
+    print(f"Warning: Could not import backend module: {e}")
+    BACKEND_AVAILABLE = False
+
+
+N_EQS = 25
+
+
+def apo(i: int) -> bytes:
+    return "Filter 1: ON PK Fc {} Hz Gain -2.0 dB Q 1.41\n".format(100 + i).encode("utf-8")
+
+
+@unittest.skipUnless(BACKEND_AVAILABLE, "Requires the backend dependencies")
+class TestEqs(unittest.TestCase):
+    """Test keyset pagination, the count and the export"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.saved = (backend.DATABASE, backend.EXPORT_BATCH_SIZE)
+        backend.DATABASE = os.path.join(self.tmp.name, "eqs.db")
+        backend.create_table()
+        self.hashes = {}
+        for i in range(N_EQS):
+            # names do not sort like upload times
+            name = "eq {:02d}.txt".format((i * 7) % N_EQS)
+            success, eq_hash = backend.store_eq(name, apo(i))
+            self.assertTrue(success)
+            self.hashes[eq_hash] = name
+        self.client = TestClient(backend.backend)
+
+    def tearDown(self):
+        backend.DATABASE, backend.EXPORT_BATCH_SIZE = self.saved
+        self.tmp.cleanup()
+
+    def pages(self, order: str, limit: int) -> list[dict]:
+        rows = []
+        url = "/v1/eqs?order={}&limit={}".format(order, limit)
+        cursor = None
+        while True:
+            response = self.client.get(url + ("" if cursor is None else "&cursor=" + cursor))
+            self.assertEqual(response.status_code, 200)
+            page = response.json()
+            self.assertLessEqual(len(page), limit)
+            rows.extend(page)
+            cursor = response.headers.get("x-next-cursor")
+            if cursor is None:
+                return rows
+
+    def test_pages(self):
+        """Test that pages cover every EQ once, in order"""
+        for order, key in (("name", "name"), ("created", "created_at")):
+            for limit in (1, 7, 25, 100):
+                with self.subTest(order=order, limit=limit):
+                    rows = self.pages(order, limit)
+                    self.assertEqual({row["hash"]: row["name"] for row in rows}, self.hashes)
+                    self.assertEqual(len(rows), N_EQS)
+                    positions = [(row[key], row["hash"]) for row in rows]
+                    self.assertEqual(positions, sorted(positions))
+                    self.assertNotIn("peq", rows[0])
+
+    def test_peq(self):
+        """Test that the peq is only sent when asked for"""
+        (row,) = self.client.get("/v1/eqs?limit=1&peq=true").json()
+        self.assertEqual(row["peq"], str(backend.db_get_eq(row["hash"])[1]))
+
+    def test_count(self):
+        self.assertEqual(self.client.get("/v1/eqs/count").json(), {"count": N_EQS})
+
+    def test_export(self):
+        """Test that the export streams every row, across batches"""
+        backend.EXPORT_BATCH_SIZE = 4
+        response = self.client.get("/v1/eqs/export?order=name")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("application/x-ndjson"))
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        self.assertEqual(lines, self.client.get("/v1/eqs?order=name&limit=1000&peq=true").json())
+
+    def test_invalid_cursor(self):
+        for cursor in ("garbage", "W10=", "bnVsbA=="):
+            with self.subTest(cursor=cursor):
+                response = self.client.get("/v1/eqs?cursor={}".format(cursor))
+                self.assertEqual(response.status_code, 400)
+
+    def test_migration(self):
+        """Test that a table from before created_at is migrated in place"""
+        backend.DATABASE = os.path.join(self.tmp.name, "old.db")
+        connection = sqlite3.connect(backend.DATABASE)
+        with connection:
+            connection.execute(
+                "CREATE TABLE eqs (eq_hash TEXT PRIMARY KEY, name TEXT NOT NULL, peq TEXT NOT NULL)"
+            )
+            connection.execute("INSERT INTO eqs VALUES (?, ?, ?)", ("b" * 128, "old.txt", "[]"))
+        connection.close()
+        backend.create_table()
+        backend.create_table()
+        success, eq_hash = backend.store_eq("new.txt", apo(0))
+        self.assertTrue(success)
+        rows = self.client.get("/v1/eqs?order=created").json()
+        self.assertEqual([row["hash"] for row in rows], ["b" * 128, eq_hash])
+        self.assertEqual(rows[0]["created_at"], 0)
+        self.assertGreater(rows[1]["created_at"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
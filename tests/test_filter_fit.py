@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""Tests for fitting an EQ on a constrained target"""
+
+import unittest
+import io
+import itertools
+import sys
+import os
+from contextlib import redirect_stdout
+from unittest import mock
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import numpy as np
+    from iir.filter_iir import Biquad, np_biquads_log_result
+    from iir.filter_peq import peq_freq_grid
+    from iir.filter_fit import peq_fit, peq_satisfies
+    from converter import (
+        file2iir,
+        clamp_iirs,
+        iir2data,
+        iir2peq,
+        AUNBANDEQ_CONSTRAINTS,
+        iir2rme_totalmix_channel,
+        iir2rme_totalmix_room,
+        q2bw,
+        RME_CHANNEL_CONSTRAINTS,
+        RME_ROOM_CONSTRAINTS,
+    )
+    FIT_AVAILABLE = True
+except ImportError as e:
+    print(f"Warning: Could not import fit modules: {e}")
+    FIT_AVAILABLE = False
+
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@unittest.skipUnless(FIT_AVAILABLE, "Requires numpy and iir modules")
+class TestVectorResponse(unittest.TestCase):
+    """Test the vectorized biquad response against Biquad"""
+
+    def test_matches_biquad(self):
+        freq = peq_freq_grid(200)
+        biquads = [
+            Biquad(typ, f0, 48000, q, gain)
+            for typ in Biquad.type2name
+            for f0, q, gain in ((50, 0.7, 3.0), (1000, 2.0, -5.0), (15000, 0.5, 6.0))
+        ]
+        expected = np.array([b.np_log_result(freq) for b in biquads])
+        result = np_biquads_log_result(
+            [b.typ for b in biquads],
+            [b.freq for b in biquads],
+            48000,
+            [b.q for b in biquads],
+            [b.db_gain for b in biquads],
+            freq,
+        )
+        np.testing.assert_allclose(result, expected, atol=1e-9)
+
+
+@unittest.skipUnless(FIT_AVAILABLE, "Requires numpy and iir modules")
+class TestPEQFit(unittest.TestCase):
+    """Test peq_fit on RME constraints"""
+
+    def setUp(self):
+        self.freq = peq_freq_grid(200)
+        success, iir = file2iir(os.path.join(BASE_DIR, "examples_rews", "test.txt"))
+        self.assertTrue(success)
+        self.peq = iir2peq(iir)
+
+    def test_satisfied_peq_is_unchanged(self):
+        """Test that a peq the target can represent is not touched"""
+        peq = [
+            (1.0, Biquad(Biquad.LOWSHELF, 100, 48000, 0.7, 3.0)),
+            (1.0, Biquad(Biquad.PEAK, 1000, 48000, 1.0, -2.0)),
+            (1.0, Biquad(Biquad.HIGHSHELF, 8000, 48000, 0.7, -1.0)),
+        ]
+        fitted, report = peq_fit(self.freq, peq, RME_CHANNEL_CONSTRAINTS)
+        self.assertFalse(report.fitted)
+        self.assertEqual(fitted, peq)
+
+    def test_wrong_position_is_moved(self):
+        """Test that a high shelf in the first slot ends in the last one"""
+        peq = [
+            (1.0, Biquad(Biquad.HIGHSHELF, 8000, 48000, 0.7, -3.0)),
+            (1.0, Biquad(Biquad.PEAK, 1000, 48000, 1.0, -2.0)),
+        ]
+        self.assertFalse(peq_satisfies(peq, RME_CHANNEL_CONSTRAINTS))
+        fitted, report = peq_fit(self.freq, peq, RME_CHANNEL_CONSTRAINTS)
+        self.assertTrue(report.fitted)
+        self.assertTrue(peq_satisfies(fitted, RME_CHANNEL_CONSTRAINTS))
+        self.assertEqual(fitted[-1][1].typ, Biquad.HIGHSHELF)
+
+    def test_fit_respects_constraints(self):
+        """Test that a 16 bands EQ is fitted on both RME targets"""
+        for constraints in (RME_CHANNEL_CONSTRAINTS, RME_ROOM_CONSTRAINTS):
+            with self.subTest(bands=constraints.max_bands):
+                fitted, report = peq_fit(self.freq, self.peq, constraints)
+                self.assertTrue(report.fitted)
+                self.assertTrue(peq_satisfies(fitted, constraints))
+                self.assertLessEqual(report.error, report.initial_error + 0.05)
+                self.assertLess(report.error, 2.0)
+
+    def test_deterministic(self):
+        """Test that the fit does not depend on the time it takes"""
+        expected, report = peq_fit(self.freq, self.peq, RME_CHANNEL_CONSTRAINTS)
+        clock = itertools.count(step=0.01)
+        # a machine 100 times slower
+        with mock.patch("iir.filter_fit.time.perf_counter", lambda: next(clock)):
+            fitted, loaded = peq_fit(self.freq, self.peq, RME_CHANNEL_CONSTRAINTS)
+        self.assertEqual(loaded.iterations, report.iterations)
+        self.assertEqual(
+            [(w, iir.typ, iir.freq, iir.q, iir.db_gain) for w, iir in fitted],
+            [(w, iir.typ, iir.freq, iir.q, iir.db_gain) for w, iir in expected],
+        )
+
+    def test_budget(self):
+        """Test that the time budget is a logged safety cutoff"""
+        clock = itertools.count(step=1.0)
+        with mock.patch("iir.filter_fit.time.perf_counter", lambda: next(clock)):
+            with self.assertLogs(level="WARNING") as logs:
+                _, report = peq_fit(self.freq, self.peq, RME_CHANNEL_CONSTRAINTS, budget=3.0)
+        self.assertLess(report.iterations, 5)
+        self.assertIn("budget", logs.output[0])
+
+
+@unittest.skipUnless(FIT_AVAILABLE, "Requires numpy and iir modules")
+class TestWritersFit(unittest.TestCase):
+    """Test that writers fit EQs instead of failing"""
+
+    def setUp(self):
+        success, self.iir = file2iir(os.path.join(BASE_DIR, "examples_rews", "test.txt"))
+        self.assertTrue(success)
+
+    def test_channel_with_many_bands(self):
+        success, xml = iir2rme_totalmix_channel(self.iir)
+        self.assertTrue(success)
+        self.assertIn("Band3 Freq", xml)
+        self.assertNotIn("Band4 Freq", xml)
+
+    def test_aunbandeq_with_too_many_bands(self):
+        iir = self.iir + [
+            {"type": "PK", "freq": 200.0 * (i + 1), "gain": 1.0, "width": 1.0}
+            for i in range(4)
+        ]
+        success, nbands, _ = iir2data(iir)
+        self.assertTrue(success)
+        self.assertEqual(nbands, 16)
+
+    def test_aunbandeq_clamps(self):
+        """Test that out of range parameters are clamped, not fitted"""
+        iir = [
+            {"type": "PK", "freq": 15.0, "gain": -3.0, "width": 1.0},
+            {"type": "PK", "freq": 1000.0, "gain": 3.0, "width": 0.036},
+        ]
+        clamped, messages = clamp_iirs(iir, AUNBANDEQ_CONSTRAINTS)
+        self.assertEqual(clamped[0]["freq"], 20.0)
+        self.assertAlmostEqual(clamped[1]["width"], 0.05)
+        self.assertEqual(clamped[1]["freq"], 1000.0)
+        self.assertEqual(len(messages), 2)
+        self.assertIn("Fc 15 Hz", messages[0])
+        self.assertIn("Q", messages[1])
+        with redirect_stdout(io.StringIO()) as output:
+            success, nbands, _ = iir2data(iir)
+        self.assertTrue(success)
+        self.assertEqual(nbands, 2)
+        self.assertNotIn("16 bands", output.getvalue())
+        self.assertNotIn("fitted", output.getvalue())
+        self.assertIn("clamped", output.getvalue())
+
+    def test_rme_clamps(self):
+        """Test that RME EQs with few enough bands are clamped, not fitted"""
+        iir = [
+            {"type": "PK", "freq": 100.0, "gain": -3.04, "width": q2bw(12.0)},
+            {"type": "PK", "freq": 1000.0, "gain": 25.0, "width": 1.0},
+            {"type": "PK", "freq": 5000.0, "gain": 2.0, "width": 1.0},
+        ]
+        for name, writer in (
+            ("channel", iir2rme_totalmix_channel),
+            ("room", lambda iirs: iir2rme_totalmix_room(iirs + iirs[:1], [])),
+        ):
+            with self.subTest(writer=name):
+                with redirect_stdout(io.StringIO()) as output:
+                    success, content = writer(iir)
+                self.assertTrue(success)
+                self.assertIn('Band1 Q" v="9.90,"', content)
+                self.assertIn('Band1 Gain" v="-3.00,"', content)
+                self.assertIn('Band2 Gain" v="20.00,"', content)
+                self.assertIn('Band3 Freq" v="5000.00,"', content)
+                self.assertIn("clamped", output.getvalue())
+                self.assertNotIn("fitted", output.getvalue())
+                self.assertNotIn("maximum", output.getvalue())
+
+    def test_aunbandeq_as_is(self):
+        """Test that an EQ within range is written without a warning"""
+        with redirect_stdout(io.StringIO()) as output:
+            self.assertEqual(iir2data(self.iir[:4])[:2], (True, 4))
+        self.assertEqual(output.getvalue(), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""Tests for the response based band reduction"""
+
+import unittest
+import sys
+import os
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import numpy as np
+    from iir.filter_iir import Biquad
+    from iir.filter_peq import peq_build, peq_freq_grid
+    from iir.filter_reduce import peq_reduce
+    from converter import file2iir, iir2peq
+    REDUCE_AVAILABLE = True
+except ImportError as e:
+    print(f"Warning: Could not import reduce modules: {e}")
+    REDUCE_AVAILABLE = False
+
+
+@unittest.skipUnless(REDUCE_AVAILABLE, "Requires numpy and iir modules")
+class TestPEQReduce(unittest.TestCase):
+    """Test peq_reduce selection and refit"""
+
+    def setUp(self):
+        self.freq = peq_freq_grid(200)
+        self.peq = [
+            (1.0, Biquad(Biquad.LOWSHELF, 105, 48000, 0.7, 6.0)),
+            (1.0, Biquad(Biquad.PEAK, 300, 48000, 1.3, -0.1)),
+            (1.0, Biquad(Biquad.PEAK, 1000, 48000, 1.0, -4.0)),
+            (1.0, Biquad(Biquad.PEAK, 1100, 48000, 1.0, -2.0)),
+            (1.0, Biquad(Biquad.HIGHSHELF, 10000, 48000, 0.7, -3.0)),
+        ]
+
+    def test_no_reduction_needed(self):
+        """Test that a short peq is returned unchanged"""
+        kept, reduced, error = peq_reduce(self.freq, self.peq, 5)
+        self.assertEqual(kept, [0, 1, 2, 3, 4])
+        self.assertEqual(reduced, self.peq)
+        self.assertEqual(error, 0.0)
+
+    def test_drops_least_contributing_band(self):
+        """Test that the negligible band is the one removed"""
+        kept, reduced, _ = peq_reduce(self.freq, self.peq, 4, refit=False)
+        self.assertEqual(kept, [0, 2, 3, 4])
+        self.assertEqual(len(reduced), 4)
+
+    def test_refit_reduces_error(self):
+        """Test that refitting the gains compensates for a removed band"""
+        _, _, error_plain = peq_reduce(self.freq, self.peq, 3, refit=False)
+        kept, reduced, error_refit = peq_reduce(self.freq, self.peq, 3)
+        self.assertEqual(len(kept), 3)
+        self.assertLess(error_refit, error_plain)
+        # the reported error matches the actual response difference
+        diff = peq_build(self.freq, self.peq) - peq_build(self.freq, reduced)
+        self.assertAlmostEqual(
+            error_refit, float(np.sqrt(np.mean(diff**2))), places=6
+        )
+
+    def test_gain_step(self):
+        """Test that refitted gains are rounded to the device resolution"""
+        _, reduced, _ = peq_reduce(self.freq, self.peq, 3, gain_step=0.1)
+        for _, iir in reduced:
+            self.assertAlmostEqual(iir.db_gain * 10, round(iir.db_gain * 10))
+
+    def test_weights(self):
+        """Test that refitted gains are biquad gains, weights are kept"""
+        weighted = [(0.5, iir) for _, iir in self.peq]
+        kept, reduced, error = peq_reduce(self.freq, self.peq, 3)
+        kept_weighted, reduced_weighted, error_weighted = peq_reduce(self.freq, weighted, 3)
+        self.assertEqual(kept, kept_weighted)
+        self.assertAlmostEqual(error_weighted, error / 2, places=6)
+        for (_, iir), (w, iir_weighted) in zip(reduced, reduced_weighted, strict=True):
+            self.assertEqual(w, 0.5)
+            self.assertAlmostEqual(iir.db_gain, iir_weighted.db_gain, places=6)
+
+    def test_greedy_large_peq(self):
+        """Test the greedy path on a 16 bands EQ for both RME limits"""
+        success, iir = file2iir(
+            os.path.join(
+                os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                "examples_rews",
+                "test.txt",
+            )
+        )
+        self.assertTrue(success)
+        self.assertEqual(len(iir), 16)
+        peq = iir2peq(iir)
+        for max_count in (9, 3):
+            with self.subTest(max_count=max_count):
+                kept, reduced, error = peq_reduce(peq_freq_grid(), peq, max_count, gain_step=0.1)
+                self.assertEqual(len(reduced), max_count)
+                self.assertLess(error, 3.0)
+                # original order is preserved
+                self.assertEqual(kept, sorted(kept))
+
+if __name__ == "__main__":
+    unittest.main()
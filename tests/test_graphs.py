@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""Tests for the graph payloads"""
+
+import unittest
+import sys
+import os
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import numpy as np
+    from converter import file2iir, iir2peq
+    from graphs import GRAPH_HEADER, graph_decode, graph_encode, graph_json
+    from iir.filter_peq import peq_build, peq_freq_grid
+    GRAPHS_AVAILABLE = True
+except ImportError as e:
+    print(f"Warning: Could not import graphs module: {e}")
+    GRAPHS_AVAILABLE = False
+
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@unittest.skipUnless(GRAPHS_AVAILABLE, "Requires numpy and graphs module")
+class TestGraphs(unittest.TestCase):
+    """Test the json and binary encodings"""
+
+    def setUp(self):
+        success, iir = file2iir(os.path.join(BASE_DIR, "examples_rews", "eq.txt"))
+        self.assertTrue(success)
+        self.freq = peq_freq_grid(200)
+        self.curves = np.array([peq_build(self.freq, [iir]) for iir in iir2peq(iir)])
+
+    def test_binary_roundtrip(self):
+        """Test that decoding gives back the curves within the type precision"""
+        n_curves, n_points = self.curves.shape
+        for fmt, itemsize, tolerance in (("f32", 4, 1.0e-5), ("f16", 2, 1.0e-2)):
+            with self.subTest(fmt=fmt):
+                buffer = graph_encode(self.freq, self.curves, fmt)
+                self.assertEqual(
+                    len(buffer),
+                    GRAPH_HEADER.size + 4 * n_points + itemsize * n_curves * n_points,
+                )
+                freq, curves = graph_decode(buffer)
+                self.assertEqual(curves.shape, self.curves.shape)
+                np.testing.assert_allclose(freq, self.freq, rtol=1.0e-6)
+                np.testing.assert_allclose(curves, self.curves, atol=tolerance)
+
+    def test_binary_is_smaller(self):
+        """Test that the binary payload is smaller than the json one"""
+        freq, curves = graph_json(self.freq, self.curves)
+        text = "{}{}".format(freq, curves)
+        self.assertLess(len(graph_encode(self.freq, self.curves, "f32")), len(text) / 3)
+
+    def test_json_precision(self):
+        """Test that json values are rounded"""
+        freq, curves = graph_json(self.freq, self.curves, precision=2)
+        self.assertEqual(len(curves), len(self.curves))
+        self.assertEqual(freq[0], 20.0)
+        for value in curves[0]:
+            self.assertEqual(value, round(value, 2))
+        freq, _ = graph_json(self.freq, self.curves)
+        self.assertEqual(freq, self.freq.tolist())
+
+    def test_bad_payload(self):
+        """Test that a payload with another magic is rejected"""
+        with self.assertRaises(ValueError):
+            graph_decode(b"NOPE" + bytes(12))
+
+
+if __name__ == "__main__":
+    unittest.main()
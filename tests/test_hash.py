@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""Tests for canonical EQ hashing"""
+
+import unittest
+import hashlib
+import os
+import sys
+import tempfile
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from converter import file2iir, iir2canonical, iir2hash, name2hash
+    from iir.filter_iir import q2bw
+    HASH_AVAILABLE = True
+except ImportError as e:
+    print(f"Warning: Could not import converter module: {e}")
+    HASH_AVAILABLE = False
+
+try:
+    from fastapi.testclient import TestClient
+    import backend
+    BACKEND_AVAILABLE = True
+except ImportError as e:
+    print(f"Warning: Could not import backend module: {e}")
+    BACKEND_AVAILABLE = False
+
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COMPOSER = "Austrian Audio The Composer (minimal setting) ParametricEQ{}.txt"
+
+APO = """Preamp: -3.0 dB
+Filter 1: ON PK Fc 100 Hz Gain -2.0 dB Q 1.41
+Filter 2: ON HS Fc 8000 Hz Gain 1.5 dB Q 0.70
+"""
+
+APO_REFORMATTED = """# same filters, written differently
+Preamp: -2.5 dB
+
+Filter 2: ON HS Fc 8000.0 Hz Gain 1.50 dB Q 0.700
+Filter   1:   ON   PK   Fc 100   Hz   Gain -2   dB   Q 1.410
+"""
+
+
+def parse(text: str):
+    success, iir = backend.lines2iir(text.split("\n"))
+    return iir if success else None
+
+
+@unittest.skipUnless(HASH_AVAILABLE, "Requires numpy and converter modules")
+class TestCanonicalHash(unittest.TestCase):
+    """Test what changes the hash and what does not"""
+
+    def iir(self, name: str):
+        success, iir = file2iir(os.path.join(BASE_DIR, "examples_rews", name))
+        self.assertTrue(success)
+        return iir
+
+    def test_order(self):
+        """Test that the order of the filters does not matter"""
+        original = self.iir(COMPOSER.format(""))
+        reordered = self.iir(COMPOSER.format(" reordered"))
+        self.assertNotEqual(original, reordered)
+        self.assertEqual(iir2hash(original), iir2hash(reordered))
+
+    def test_notation(self):
+        """Test that Q and bandwidth notations of a filter agree"""
+        q = {"type": "PK", "freq": 1000.0, "gain": -3.0, "q": 1.41, "width": q2bw(1.41)}
+        bw = {"type": "PK", "freq": 1000.0, "gain": -3.0, "width": round(q2bw(1.41), 6)}
+        self.assertEqual(iir2canonical([q]), iir2canonical([bw]))
+
+    def test_changes(self):
+        """Test that any parameter changes the hash"""
+        base = {"type": "PK", "freq": 1000.0, "gain": -3.0, "width": 1.0}
+        hashes = {iir2hash([base])}
+        for change in ({"type": "LS"}, {"freq": 1000.1}, {"gain": -3.01}, {"width": 1.001}):
+            hashes.add(iir2hash([{**base, **change}]))
+        hashes.add(iir2hash([base, base]))
+        hashes.add(iir2hash([]))
+        self.assertEqual(len(hashes), 7)
+
+    def test_format(self):
+        """Test the length and that the hash is keyed"""
+        iir = self.iir("eq.txt")
+        eq_hash = iir2hash(iir)
+        self.assertRegex(eq_hash, "^[a-f0-9]{64}$")
+        self.assertNotEqual(eq_hash, hashlib.blake2b(iir2canonical(iir), digest_size=32).hexdigest())
+
+    def test_name(self):
+        """Test that the name is hashed apart from the filters"""
+        self.assertRegex(name2hash("eq.txt"), "^[a-f0-9]{16}$")
+        self.assertNotEqual(name2hash("FirstName.txt"), name2hash("SecondName.txt"))
+        self.assertEqual(name2hash("é.txt"), name2hash("é.txt"))
+
+
+@unittest.skipUnless(BACKEND_AVAILABLE, "Requires the backend dependencies")
+class TestBackendHash(unittest.TestCase):
+    """Test deduplication and that older hashes keep working"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.database = backend.DATABASE
+        backend.DATABASE = os.path.join(self.tmp.name, "eqs.db")
+        backend.create_table()
+
+    def tearDown(self):
+        backend.DATABASE = self.database
+        self.tmp.cleanup()
+
+    def count(self) -> int:
+        connection = backend.create_connection()
+        (count,) = connection.execute("SELECT COUNT(*) FROM eqs").fetchone()
+        connection.close()
+        return count
+
+    def test_dedup(self):
+        """Test that differently written files are one row"""
+        self.assertEqual(iir2hash(parse(APO)), iir2hash(parse(APO_REFORMATTED)))
+        success, first = backend.store_eq("a.txt", APO.encode("utf-8"))
+        self.assertTrue(success)
+        success, second = backend.store_eq("b.txt", APO_REFORMATTED.encode("utf-8"))
+        self.assertTrue(success)
+        self.assertEqual(first, second)
+        self.assertEqual(first, backend.eq2hash(APO.encode("utf-8")))
+        self.assertEqual(self.count(), 1)
+
+    def test_legacy(self):
+        """Test that rows stored under the hash of the bytes are still served"""
+        buffer = APO.encode("utf-8")
+        legacy_hash = backend.eq2legacy_hash(buffer)
+        self.assertEqual(len(legacy_hash), 128)
+        backend.create_eq(backend.EQ(legacy_hash, "old.txt", str(parse(APO))))
+        client = TestClient(backend.backend)
+        for eq_hash in (legacy_hash, backend.eq2hash(buffer)):
+            with self.subTest(length=len(eq_hash)):
+                if len(eq_hash) == 64:
+                    backend.store_eq("new.txt", buffer)
+                response = client.get("/v1/eq/target/apo?eq_hash={}".format(eq_hash))
+                self.assertEqual(response.status_code, 200)
+                self.assertIn("Filter", response.json())
+        self.assertFalse(backend.check_hash("a" * 100))
+        self.assertFalse(backend.check_hash("A" * 64))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Tests for the metrics module"""
+
+import unittest
+import functools
+import sys
+import os
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import metrics
+    from metrics import Counter, Histogram, Registry, request_stages, stage
+    METRICS_AVAILABLE = True
+except ImportError as e:
+    print(f"Warning: Could not import metrics module: {e}")
+    METRICS_AVAILABLE = False
+
+
+@unittest.skipUnless(METRICS_AVAILABLE, "Metrics module not available")
+class TestMetrics(unittest.TestCase):
+    """Test collectors and the text format"""
+
+    def test_histogram(self):
+        """Test that buckets are cumulative and end with +Inf"""
+        registry = Registry()
+        histogram = registry.register(
+            Histogram("test_seconds", "Test.", ("route",), buckets=(0.1, 1.0))
+        )
+        histogram.observe(0.05, "/a")
+        histogram.observe(0.5, "/a")
+        histogram.observe(5.0, "/a")
+        text = registry.render()
+        self.assertIn("# TYPE test_seconds histogram", text)
+        self.assertIn('test_seconds_bucket{route="/a",le="0.1"} 1', text)
+        self.assertIn('test_seconds_bucket{route="/a",le="1.0"} 2', text)
+        self.assertIn('test_seconds_bucket{route="/a",le="+Inf"} 3', text)
+        self.assertIn('test_seconds_count{route="/a"} 3', text)
+        self.assertEqual(histogram.count("/a"), 3)
+
+    def test_label_escaping(self):
+        """Test that quotes in label values are escaped"""
+        registry = Registry()
+        counter = registry.register(Counter("test_total", "Test.", ("name",)))
+        counter.inc('say "hi"')
+        self.assertIn('test_total{name="say \\"hi\\""} 1.0', registry.render())
+
+    def test_duplicate_registration(self):
+        """Test that a name cannot be registered twice"""
+        registry = Registry()
+        registry.register(Counter("test_total", "Test."))
+        with self.assertRaises(ValueError):
+            registry.register(Counter("test_total", "Test."))
+
+    def test_stages(self):
+        """Test that stages are collected only inside a request"""
+        with stage("outside"):
+            pass
+        with request_stages() as stages:
+            with stage("db"):
+                with stage("parse"):
+                    pass
+        self.assertEqual([name for name, _ in stages], ["parse", "db"])
+        self.assertGreaterEqual(stages[1][1], stages[0][1])
+
+    def test_cache_ratio(self):
+        """Test that registered caches report their hit ratio"""
+
+        @functools.lru_cache
+        def square(x):
+            return x * x
+
+        square(2)
+        square(2)
+        square(2)
+        square(3)
+        metrics.register_cache("test_square", square.cache_info)
+        self.assertIn('eqconverter_cache_ratio{cache="test_square"} 0.5', metrics.render())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""Tests for the catalog file shared by the workers"""
+
+import unittest
+import json
+import sys
+import os
+import tempfile
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import numpy as np
+    from fastapi.testclient import TestClient
+    import backend
+    from benchmarks.loadtest import synthetic_catalog
+    from catalog import SpeakerIndex
+    from packed import packed_catalog
+    from scripts.pack import pack
+    PACKED_AVAILABLE = True
+except ImportError as e:
+    print(f"Warning: Could not import packed module: {e}")
+    PACKED_AVAILABLE = False
+
+
+@unittest.skipUnless(PACKED_AVAILABLE, "Requires the backend dependencies")
+class TestPacked(unittest.TestCase):
+    """Test that the packed catalog answers like the json files"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.metadata_path = os.path.join(self.tmp.name, "metadata.json")
+        self.eqdata_path = os.path.join(self.tmp.name, "eqdata.json")
+        self.path = os.path.join(self.tmp.name, "catalog.pack")
+        self.metadata, self.eqdata = synthetic_catalog(40)
+        # names that sort differently once casefolded
+        self.metadata["acme lowercase"] = {"brand": "acme"}
+        self.metadata["Éclair Ultra"] = {"brand": "Éclair"}
+        self.metadata["Brandless"] = {}
+        self.write()
+        self.assertTrue(pack(self.path, self.metadata_path, self.eqdata_path))
+        self.packed = packed_catalog(self.path)
+        self.assertIsNotNone(self.packed)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self):
+        with open(self.metadata_path, "w", encoding="utf-8") as fd:
+            json.dump(self.metadata, fd)
+        with open(self.eqdata_path, "w", encoding="utf-8") as fd:
+            json.dump(self.eqdata, fd)
+
+    def test_names(self):
+        """Test prefix search and pagination against SpeakerIndex"""
+        index = SpeakerIndex.build(self.metadata)
+        for names, expected in (
+            (self.packed.speakers, index.speakers),
+            (self.packed.brands, index.brands),
+        ):
+            for prefix in ("", "a", "AC", "acme", "é", "kef model 00", "zzz"):
+                for limit, offset in ((None, 0), (3, 0), (3, 2), (None, 1000)):
+                    with self.subTest(prefix=prefix, limit=limit, offset=offset):
+                        self.assertEqual(
+                            names.search(prefix, limit, offset),
+                            expected.search(prefix, limit, offset),
+                        )
+                        self.assertEqual(names.count(prefix), expected.count(prefix))
+
+    def test_entries(self):
+        """Test that every entry is the one of the json files"""
+        for name, entry in self.metadata.items():
+            self.assertEqual(self.packed.metadata.get(name), entry)
+        for name, entry in self.eqdata.items():
+            self.assertEqual(self.packed.eqdata.get(name), entry)
+        self.assertEqual(self.packed.eqdata.get("Missing", {}), {})
+
+    def test_banks(self):
+        """Test that shared banks are what the backend computes"""
+        speaker = next(iter(self.eqdata.values()))
+        for eq in speaker["eqs"].values():
+            text = backend.spin_eq2text(eq)
+            eq_hash = backend.eq2hash(text.encode("utf-8"))
+            bank = self.packed.banks.get(eq_hash)
+            _, iir = backend.lines2iir(text.split("\n"))
+            expected = backend.peq_bank(
+                backend.peq_freq_grid(self.packed.banks.points), backend.iir2peq(iir)
+            )
+            np.testing.assert_array_equal(bank, expected)
+            self.assertFalse(bank.flags.writeable)
+        self.assertIsNone(self.packed.banks.get("0" * 128))
+
+    def test_stale(self):
+        """Test that a packed file older than its sources is ignored"""
+        self.assertFalse(pack(self.path, self.metadata_path, self.eqdata_path))
+        del self.metadata["Brandless"]
+        self.write()
+        self.assertIsNone(packed_catalog(self.path))
+        self.assertTrue(pack(self.path, self.metadata_path, self.eqdata_path))
+        self.assertNotIn("Brandless", packed_catalog(self.path).metadata)
+
+    def test_backend(self):
+        """Test that the backend answers the same with and without the packed file"""
+        saved = (backend.METADATA, backend.EQDATA, backend.PACKED)
+        backend.METADATA, backend.EQDATA = self.metadata_path, self.eqdata_path
+        client = TestClient(backend.backend)
+        speaker = next(iter(self.eqdata))
+        urls = [
+            "/v1/speakers?prefix=a&limit=5",
+            "/v1/brands",
+            "/v1/speaker/{}/metadata".format(speaker),
+            "/v1/speaker/Missing/metadata",
+            "/v1/speaker/Missing/eqdata",
+        ]
+        try:
+            backend.PACKED = ""
+            expected = [client.get(url).content for url in urls]
+            backend.PACKED = self.path
+            self.assertIs(backend.load_packed(), self.packed)
+            self.assertEqual([client.get(url).content for url in urls], expected)
+        finally:
+            backend.METADATA, backend.EQDATA, backend.PACKED = saved
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -24,6 +24,12 @@ try:
     from iir.filter_iir import Biquad
     if NUMPY_AVAILABLE:
         from iir.filter_peq import (
+            peq_bank,
+            peq_batch,
+            peq_batch_banks,
+            peq_batch_spl,
+            peq_freq_grid,
+            peq_pad,
             peq_build, 
             peq_preamp_gain, 
             peq_preamp_gain_conservative,
@@ -119,6 +125,16 @@ class TestPEQBuild(unittest.TestCase):
         # Second filter should be doubled (3dB * 2.0 ≈ 6.9dB at peak frequency)  
         self.assertAlmostEqual(response[freq_2k_idx], 6.9, places=0)
     
+    def test_peq_bank_matches_build(self):
+        """Test that each row of the bank is the response of one filter"""
+        weighted = [(0.5, self.test_peq[0][1])] + self.test_peq[1:]
+        bank = peq_bank(self.freq, weighted)
+        self.assertEqual(bank.shape, (3, len(self.freq)))
+        for row, (w, iir) in zip(bank, weighted):
+            np.testing.assert_allclose(row, peq_build(self.freq, [(w, iir)]), atol=1e-9)
+        np.testing.assert_allclose(bank.sum(axis=0), peq_build(self.freq, weighted), atol=1e-9)
+        self.assertEqual(peq_bank(self.freq, self.empty_peq).shape, (0, len(self.freq)))
+
     def test_peq_build_different_frequencies(self):
         """Test peq_build with different frequency arrays"""
         # Test with single frequency
@@ -552,6 +568,133 @@ class TestPEQIntegration(unittest.TestCase):
                 self.assertEqual(len(filter_lines), length)
 
 
+@unittest.skipUnless(NUMPY_AVAILABLE and PEQ_AVAILABLE, "Requires numpy and PEQ modules")
+class TestPEQBatch(unittest.TestCase):
+    """Test that many PEQs evaluated at once match one at a time"""
+
+    def setUp(self):
+        self.peqs = [
+            [],
+            [(1.0, Biquad(Biquad.PEAK, 1000, 48000, 1.0, 6.0))],
+            [
+                (1.0, Biquad(Biquad.LOWSHELF, 100, 48000, 0.7, 2.0)),
+                (0.0, Biquad(Biquad.PEAK, 3000, 48000, 2.0, 9.0)),
+                (1.0, Biquad(Biquad.HIGHSHELF, 10000, 48000, 0.7, -2.0)),
+                (1.0, Biquad(Biquad.NOTCH, 50, 48000, 0.0)),
+            ],
+            [
+                (1.0, Biquad(Biquad.PEAK, 200, 44100, 4.0, 3.0)),
+                (1.0, Biquad(Biquad.PEAK, 5000, 96000, 1.0, -4.0)),
+            ],
+            [(1.0, Biquad(Biquad.PEAK, 50 + 100 * i, 48000, 1.0, -1.0)) for i in range(20)],
+        ]
+
+    def test_batch(self):
+        """Test curves, preamp gains and peaks against peq_build"""
+        freq = np.logspace(1, 4, 100)
+        for max_elements in (1, 1000, 1 << 22):
+            with self.subTest(max_elements=max_elements):
+                batch = peq_batch(self.peqs, freq, max_elements)
+                self.assertEqual(batch.spl.shape, (len(self.peqs), len(freq)))
+                for i, peq in enumerate(self.peqs):
+                    spl = peq_build(freq, peq)
+                    np.testing.assert_allclose(batch.spl[i], spl, atol=1e-9)
+                    self.assertEqual(batch.peak_freq[i], freq[np.argmax(spl)])
+        batch = peq_batch(self.peqs)
+        for i, peq in enumerate(self.peqs):
+            self.assertAlmostEqual(batch.preamp_gain[i], peq_preamp_gain(peq), places=9)
+
+    def test_banks(self):
+        """Test that the banks without padding are those of peq_bank"""
+        freq = np.logspace(1, 4, 50)
+        seen = 0
+        for start, bank, mask in peq_batch_banks(freq, self.peqs, 2000):
+            self.assertLessEqual(bank.size, 2000)
+            self.assertEqual(start, seen)
+            for i, rows in enumerate(mask):
+                expected = peq_bank(freq, self.peqs[start + i])
+                np.testing.assert_allclose(bank[i][rows], expected, atol=1e-9)
+            seen += len(bank)
+        self.assertEqual(seen, len(self.peqs))
+
+    def test_unsorted(self):
+        """Test padding in the middle of a chunk"""
+        freq = np.logspace(1, 4, 50)
+        spl = peq_batch_spl(freq, *peq_pad(self.peqs))
+        for i, peq in enumerate(self.peqs):
+            np.testing.assert_allclose(spl[i], peq_build(freq, peq), atol=1e-9)
+
+    def test_empty(self):
+        batch = peq_batch([])
+        self.assertEqual(batch.spl.shape, (0, 1000))
+        batch = peq_batch([[], []])
+        np.testing.assert_array_equal(batch.preamp_gain, [0.0, 0.0])
+
+
+@unittest.skipUnless(NUMPY_AVAILABLE and PEQ_AVAILABLE, "Requires numpy and PEQ modules")
+class TestPEQFloat32(unittest.TestCase):
+    """Test that float32 stays close to float64"""
+
+    def setUp(self):
+        self.freq = peq_freq_grid(1000)
+
+    def test_filters(self):
+        """Test every filter type over the audio range, deep nulls aside"""
+        worst = 0.0
+        for typ in range(7):
+            for f in (20, 100, 1000, 5000, 20000):
+                for q in (0.1, 1.0, 10.0):
+                    for gain in (-12.0, 3.0, 12.0):
+                        for srate in (44100, 48000, 96000):
+                            iir = Biquad(typ, f, srate, q, gain)
+                            spl = iir.np_log_result(self.freq)
+                            spl32 = iir.np_log_result(self.freq, np.float32)
+                            self.assertEqual(spl32.dtype, np.float32)
+                            error = np.abs(spl32 - spl)[spl > -40.0]
+                            worst = max(worst, float(np.max(error, initial=0.0)))
+        self.assertLess(worst, 0.15)
+
+    def test_peqs(self):
+        """Test curves, banks and preamp gains of realistic peqs"""
+        rng = np.random.default_rng(0)
+        peqs = []
+        for n_bands in range(1, 21):
+            peqs.append(
+                [
+                    (1.0, Biquad(Biquad.PEAK, f, 48000, q, gain))
+                    for f, q, gain in zip(
+                        rng.uniform(20, 16000, n_bands),
+                        rng.uniform(0.3, 6.0, n_bands),
+                        rng.uniform(-10.0, 6.0, n_bands),
+                    )
+                ]
+                + [(1.0, Biquad(Biquad.LOWSHELF, 105, 48000, 0.0, 3.0))]
+            )
+        for peq in peqs:
+            np.testing.assert_allclose(
+                peq_build(self.freq, peq, np.float32), peq_build(self.freq, peq), atol=0.01
+            )
+            np.testing.assert_allclose(
+                peq_bank(self.freq, peq, np.float32), peq_bank(self.freq, peq), atol=0.01
+            )
+        batch = peq_batch(peqs)
+        batch32 = peq_batch(peqs, dtype=np.float32)
+        self.assertEqual(batch32.spl.dtype, np.float32)
+        np.testing.assert_allclose(batch32.spl, batch.spl, atol=0.01)
+        np.testing.assert_allclose(batch32.preamp_gain, batch.preamp_gain, atol=0.01)
+
+    def test_scratch(self):
+        """Test that results do not share the scratch buffers"""
+        iir = Biquad(Biquad.PEAK, 1000, 48000, 1.0, 6.0)
+        first = iir.np_log_result(self.freq)
+        expected = first.copy()
+        Biquad(Biquad.PEAK, 100, 48000, 1.0, -6.0).np_log_result(self.freq)
+        peq_build(self.freq, [(1.0, iir)])
+        np.testing.assert_array_equal(first, expected)
+        out = np.empty(len(self.freq), dtype=np.float32)
+        self.assertIs(iir.np_log_result(self.freq, out=out), out)
+
+
 class TestPEQWithoutNumpy(unittest.TestCase):
     """Test PEQ module structure without numpy dependencies"""
     
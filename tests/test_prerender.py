@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""Tests for the static pre-rendering of the catalog"""
+
+import unittest
+import json
+import pathlib
+import re
+import sys
+import os
+import tempfile
+from urllib.parse import quote
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from fastapi.testclient import TestClient
+    import backend
+    from benchmarks.loadtest import synthetic_catalog
+    from scripts.prerender import MANIFEST, NAMED_TARGETS, eq_dir, prerender
+    PRERENDER_AVAILABLE = True
+except ImportError as e:
+    print(f"Warning: Could not import prerender module: {e}")
+    PRERENDER_AVAILABLE = False
+
+BASE_DIR = pathlib.Path(__file__).resolve().parent.parent
+
+
+def nginx_static_file(web_root: pathlib.Path, uri: str, args: str) -> pathlib.Path | None:
+    """the static file etc/nginx-prod.conf tries first for a request, if any"""
+    conf = (BASE_DIR / "etc" / "nginx-prod.conf").read_text(encoding="utf-8")
+    variables = {}
+    for name, body in re.findall(r"^map \$args \$(\w+) \{\n(.*?)^\}", conf, re.M | re.S):
+        variables[name] = ""
+        for line in body.strip().splitlines():
+            pattern, value = line.strip().rstrip(";").rsplit(" ", 1)
+            if pattern == "default":
+                variables[name] = value.strip('"')
+                break
+            match = re.match(pattern[1:], args)
+            if match is not None:
+                variables[name] = match.expand(re.sub(r"\$(\d)", r"\\\1", value))
+                break
+    for pattern, path in re.findall(r"location ~ (\S+) \{.*?try_files (\S+) @backend;", conf, re.S):
+        match = re.match(pattern.replace("(?<", "(?P<"), uri)
+        if match is not None:
+            variables.update(match.groupdict())
+            return web_root / re.sub(r"\$(\w+)", lambda m: variables[m.group(1)], path).lstrip("/")
+    return None
+
+
+@unittest.skipUnless(PRERENDER_AVAILABLE, "Requires the backend dependencies")
+class TestPrerender(unittest.TestCase):
+    """Test that static files match the backend and are rebuilt incrementally"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = pathlib.Path(self.tmp.name) / "static"
+        self.database = backend.DATABASE
+        backend.DATABASE = os.path.join(self.tmp.name, "eqs.db")
+        _, self.eqdata = synthetic_catalog(4)
+
+    def tearDown(self):
+        backend.DATABASE = self.database
+        backend.backend.dependency_overrides.clear()
+        self.tmp.cleanup()
+
+    def manifest(self) -> dict:
+        with open(self.root / MANIFEST, "r", encoding="utf-8") as fd:
+            return json.load(fd)
+
+    def test_same_bodies_as_backend(self):
+        """Test every static file against the response of the backend"""
+        counts = prerender(self.eqdata, self.root, jobs=2)
+        self.assertEqual(counts["rendered"], 4)
+        self.assertEqual(counts["eqs"], 8)
+        self.assertEqual(counts["errors"], 0)
+
+        backend.backend.dependency_overrides[backend.load_eqdata] = lambda: self.eqdata
+        client = TestClient(backend.backend)
+        for speaker_name, entry in self.manifest()["speakers"].items():
+            response = client.get("/v1/speaker/{}/eqdata".format(quote(speaker_name)))
+            static = self.root / "speaker" / speaker_name / "eqdata.json"
+            self.assertEqual(static.read_bytes(), response.content)
+            for eq_hash in entry["eqs"]:
+                directory = eq_dir(self.root, eq_hash)
+                for name in (
+                    "target/rme_totalmix_channel",
+                    "graph",
+                    "graph_spl",
+                    "graph_spl_details",
+                ):
+                    with self.subTest(speaker=speaker_name, file=name):
+                        response = client.get("/v1/eq/{}?eq_hash={}".format(name, eq_hash))
+                        self.assertEqual(response.status_code, 200)
+                        path = directory / "{}.json".format(name)
+                        self.assertEqual(path.read_bytes(), response.content)
+                response = client.get(
+                    "/v1/eq/target/rme_totalmix_room?eq_hash_left={}&eq_hash_right=".format(
+                        eq_hash
+                    )
+                )
+                path = directory / "target" / "rme_totalmix_room.json"
+                self.assertEqual(path.read_bytes(), response.content)
+
+    def test_nginx_serves_frontend_requests(self):
+        """Test that the requests of index.js resolve to the static files"""
+        with open(BASE_DIR / "index.js", "r", encoding="utf-8") as fd:
+            self.assertIn("'?format=f32&eq_hash='", fd.read())
+        prerender(self.eqdata, self.root, jobs=2)
+        client = TestClient(backend.backend)
+        for entry in self.manifest()["speakers"].values():
+            for eq_hash in entry["eqs"]:
+                for uri, args in (
+                    ("/v1/eq/graph", "format=f32&eq_hash={}"),
+                    ("/v1/eq/graph_spl", "format=f32&eq_hash={}"),
+                    ("/v1/eq/graph_spl_details", "format=f32&eq_hash={}"),
+                    ("/v1/eq/graph", "eq_hash={}"),
+                    ("/v1/eq/target/rme_totalmix_channel", "eq_hash={}"),
+                    ("/v1/eq/target/rme_totalmix_room", "eq_hash_left={0}&eq_hash_right={0}"),
+                    ("/v1/eq/target/rme_totalmix_room", "eq_hash_left={0}&eq_hash_right="),
+                ):
+                    args = args.format(eq_hash)
+                    with self.subTest(uri=uri, args=args):
+                        path = nginx_static_file(self.root.parent, uri, args)
+                        self.assertIsNotNone(path)
+                        self.assertTrue(path.is_file())
+                        response = client.get("{}?{}".format(uri, args))
+                        self.assertEqual(path.read_bytes(), response.content)
+                for uri in ("/v1/eq/target/aupreset", "/v1/eq/target/apo"):
+                    path = nginx_static_file(self.root.parent, uri, "eq_hash={}".format(eq_hash))
+                    self.assertFalse(path is not None and path.exists())
+
+    def test_shared_eq(self):
+        """Test that nothing showing a speaker name is shared by hash"""
+        first, second, *_ = self.eqdata
+        self.eqdata[second]["eqs"] = self.eqdata[first]["eqs"]
+        prerender(self.eqdata, self.root, jobs=2, store=False)
+        speakers = self.manifest()["speakers"]
+        self.assertEqual(speakers[first]["eqs"], speakers[second]["eqs"])
+        for eq_hash in speakers[first]["eqs"]:
+            directory = eq_dir(self.root, eq_hash)
+            self.assertTrue((directory / "graph.json").exists())
+            for name in NAMED_TARGETS:
+                self.assertFalse((directory / "target" / "{}.json".format(name)).exists())
+            for path in directory.rglob("*.json"):
+                body = path.read_text(encoding="utf-8")
+                self.assertNotIn(first, body)
+                self.assertNotIn(second, body)
+
+    def test_incremental(self):
+        """Test that only changed speakers are rendered and removed ones pruned"""
+        prerender(self.eqdata, self.root, jobs=1, store=False)
+        self.assertEqual(prerender(self.eqdata, self.root, jobs=1, store=False)["rendered"], 0)
+
+        changed, removed, *_ = self.eqdata
+        old_hashes = self.manifest()["speakers"][changed]["eqs"]
+        removed_hashes = self.manifest()["speakers"][removed]["eqs"]
+        self.eqdata[changed]["eqs"]["autoeq"]["peq"][0]["dbGain"] += 1.0
+        del self.eqdata[removed]
+        counts = prerender(self.eqdata, self.root, jobs=1, store=False)
+        self.assertEqual(counts["rendered"], 1)
+        self.assertEqual(counts["removed"], 1)
+
+        speakers = self.manifest()["speakers"]
+        self.assertNotIn(removed, speakers)
+        self.assertFalse((self.root / "speaker" / removed).exists())
+        for eq_hash in removed_hashes:
+            self.assertFalse(eq_dir(self.root, eq_hash).exists())
+        new_hashes = speakers[changed]["eqs"]
+        self.assertNotEqual(old_hashes[0], new_hashes[0])
+        self.assertEqual(old_hashes[1], new_hashes[1])
+        self.assertFalse(eq_dir(self.root, old_hashes[0]).exists())
+        self.assertTrue(eq_dir(self.root, new_hashes[0]).exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
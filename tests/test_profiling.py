@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""Tests for the opt-in profiler"""
+
+import unittest
+import pathlib
+import sys
+import os
+import tempfile
+import time
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from profiling import (
+        ProfileSettings,
+        check_signature,
+        profiled,
+        run,
+        sign,
+        wanted,
+    )
+    PROFILING_AVAILABLE = True
+except ImportError as e:
+    print(f"Warning: Could not import profiling module: {e}")
+    PROFILING_AVAILABLE = False
+
+
+def busy(seconds: float) -> int:
+    end = time.perf_counter() + seconds
+    total = 0
+    while time.perf_counter() < end:
+        total += sum(range(100))
+    return total
+
+
+@unittest.skipUnless(PROFILING_AVAILABLE, "Profiling module not available")
+class TestProfiling(unittest.TestCase):
+    """Test request selection and profile files"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.directory = pathlib.Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_signature(self):
+        """Test that only a valid, unexpired signature for the path is accepted"""
+        expires = int(time.time()) + 60
+        header = sign("/v1/eqs", expires, "secret")
+        self.assertTrue(check_signature("/v1/eqs", header, "secret"))
+        self.assertFalse(check_signature("/v1/brands", header, "secret"))
+        self.assertFalse(check_signature("/v1/eqs", header, "other"))
+        self.assertFalse(check_signature("/v1/eqs", header, ""))
+        expired = sign("/v1/eqs", int(time.time()) - 1, "secret")
+        self.assertFalse(check_signature("/v1/eqs", expired, "secret"))
+        self.assertFalse(check_signature("/v1/eqs", "garbage", "secret"))
+
+    def test_wanted(self):
+        """Test that requests are selected by header or by rate"""
+        off = ProfileSettings(secret="secret")
+        header = sign("/v1/eqs", int(time.time()) + 60, "secret")
+        self.assertIsNone(wanted("/v1/eqs", None, off))
+        self.assertEqual(wanted("/v1/eqs", header, off), "sample")
+        always = ProfileSettings(mode="cprofile", rate=1.0)
+        self.assertEqual(wanted("/v1/eqs", None, always), "cprofile")
+
+    def test_profile_files(self):
+        """Test that both modes write a profile"""
+        settings = ProfileSettings(directory=self.directory, interval=0.001)
+        with profiled("GET /v1/eqs", "sample", settings) as result:
+            busy(0.05)
+        self.assertEqual(result.path.suffix, ".collapsed")
+        with open(result.path, encoding="utf-8") as fd:
+            lines = fd.readlines()
+        self.assertGreater(len(lines), 0)
+        self.assertTrue(any("busy" in line for line in lines))
+        self.assertTrue(lines[0].rstrip().split(" ")[-1].isdigit())
+
+        with profiled("GET /v1/eqs", "cprofile", settings) as result:
+            busy(0.01)
+        self.assertEqual(result.path.suffix, ".prof")
+        self.assertTrue(result.path.exists())
+
+    def test_one_at_a_time(self):
+        """Test that a nested profile is skipped"""
+        settings = ProfileSettings(directory=self.directory)
+        with profiled("outer", "cprofile", settings) as outer:
+            with profiled("inner", "cprofile", settings) as inner:
+                pass
+        self.assertIsNone(inner.path)
+        self.assertIsNotNone(outer.path)
+
+    def test_unique_names(self):
+        """Test that profiles started in the same second get distinct ids and files"""
+        settings = ProfileSettings(directory=self.directory)
+        results = []
+        for _ in range(3):
+            with profiled("GET /v1/eqs", "cprofile", settings) as result:
+                pass
+            results.append(result)
+        self.assertEqual(len({result.profile_id for result in results}), 3)
+        self.assertEqual(len(list(self.directory.iterdir())), 3)
+        for result in results:
+            self.assertIn(result.profile_id, result.path.name)
+            self.assertNotIn(str(self.directory), result.profile_id)
+
+    def test_keep(self):
+        """Test that old profiles are deleted"""
+        settings = ProfileSettings(directory=self.directory, keep=2)
+        for i in range(4):
+            with profiled("run {}".format(i), "cprofile", settings):
+                pass
+        self.assertEqual(len(list(self.directory.iterdir())), 2)
+
+    def test_run(self):
+        """Test that run returns the status of the function"""
+        self.assertEqual(run("off", lambda: 3, ProfileSettings()), 3)
+        settings = ProfileSettings(mode="cprofile", directory=self.directory)
+        self.assertEqual(run("on", lambda: 4, settings), 4)
+        self.assertEqual(len(list(self.directory.iterdir())), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
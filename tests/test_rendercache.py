@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""Tests for the render cache backends"""
+
+import unittest
+import asyncio
+import sys
+import os
+import socket
+import tempfile
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from rendercache import (
+        CacheUnavailableError,
+        MemoryCache,
+        RedisCache,
+        RespStandIn,
+        SqliteCache,
+        cache_from_url,
+    )
+    RENDERCACHE_AVAILABLE = True
+except ImportError as e:
+    print(f"Warning: Could not import rendercache module: {e}")
+    RENDERCACHE_AVAILABLE = False
+
+try:
+    from fastapi.testclient import TestClient
+    import backend
+    BACKEND_AVAILABLE = True
+except ImportError as e:
+    print(f"Warning: Could not import backend module: {e}")
+    BACKEND_AVAILABLE = False
+
+
+class CacheContract:
+    """Behaviour every backend shares; subclasses build self.cache"""
+
+    def wait(self, coroutine):
+        return asyncio.run(coroutine)
+
+    def test_get_set_many(self):
+        """Test misses, batched sets and hits"""
+
+        async def scenario():
+            self.assertEqual(await self.cache.get_many(["a", "b"]), [None, None])
+            await self.cache.set_many({"a": b"1", "b": b"\x00\xff" * 1000})
+            await self.cache.set_many({})
+            values = await self.cache.get_many(["b", "c", "a"])
+            await self.cache.close()
+            return values
+
+        self.assertEqual(self.wait(scenario()), [b"\x00\xff" * 1000, None, b"1"])
+        info = self.cache.cache_info()
+        self.assertEqual((info.hits, info.misses), (2, 3))
+
+    def test_overwrite(self):
+        """Test that the last value set wins"""
+
+        async def scenario():
+            await self.cache.set_many({"k": b"old"})
+            await self.cache.set_many({"k": b"new"})
+            values = await self.cache.get_many(["k"])
+            await self.cache.close()
+            return values
+
+        self.assertEqual(self.wait(scenario()), [b"new"])
+
+
+@unittest.skipUnless(RENDERCACHE_AVAILABLE, "rendercache module not available")
+class TestMemoryCache(CacheContract, unittest.TestCase):
+    def setUp(self):
+        self.cache = MemoryCache(maxsize=3)
+
+    def test_lru(self):
+        """Test that the least recently used entry is evicted"""
+
+        async def scenario():
+            await self.cache.set_many({"a": b"1", "b": b"2", "c": b"3"})
+            await self.cache.get_many(["a"])
+            await self.cache.set_many({"d": b"4"})
+            return await self.cache.get_many(["a", "b", "c", "d"])
+
+        self.assertEqual(self.wait(scenario()), [b"1", None, b"3", b"4"])
+        self.assertEqual(self.cache.cache_info().currsize, 3)
+
+
+@unittest.skipUnless(RENDERCACHE_AVAILABLE, "rendercache module not available")
+class TestSqliteCache(CacheContract, unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "cache.db")
+        self.cache = cache_from_url("sqlite:" + self.path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_survives_restart(self):
+        """Test that another instance, as after a restart, sees the entries"""
+        self.wait(self.cache.set_many({"a": b"1"}))
+        self.assertEqual(self.wait(SqliteCache(self.path).get_many(["a"])), [b"1"])
+
+    def test_size(self):
+        """Test that the oldest entries are removed past maxsize"""
+        cache = SqliteCache(self.path, maxsize=10)
+        for i in range(30):
+            self.wait(cache.set_many({str(i): b"x"}))
+        values = self.wait(cache.get_many([str(i) for i in range(30)]))
+        self.assertLessEqual(sum(value is not None for value in values), 11)
+        self.assertEqual(values[-1], b"x")
+
+    def test_unavailable(self):
+        """Test that a path that cannot be opened is reported on use, not on creation"""
+        cache = cache_from_url("sqlite:" + os.path.join(self.tmp.name, "missing", "cache.db"))
+        with self.assertRaises(CacheUnavailableError):
+            self.wait(cache.get_many(["a"]))
+        with self.assertRaises(CacheUnavailableError):
+            self.wait(cache.set_many({"a": b"1"}))
+        os.mkdir(os.path.join(self.tmp.name, "missing"))
+        self.wait(cache.set_many({"a": b"1"}))
+        self.assertEqual(self.wait(cache.get_many(["a"])), [b"1"])
+
+
+@unittest.skipUnless(RENDERCACHE_AVAILABLE, "rendercache module not available")
+class TestRedisCache(CacheContract, unittest.TestCase):
+    """Test the Redis protocol client against the stand-in"""
+
+    def setUp(self):
+        self.cache = RedisCache(db=2)
+
+    def wait(self, coroutine):
+        async def with_server():
+            stand_in = RespStandIn()
+            self.cache.port = await stand_in.start()
+            try:
+                return await coroutine
+            finally:
+                await stand_in.stop()
+
+        return asyncio.run(with_server())
+
+    def test_url(self):
+        """Test that the url sets the server, database and ttl"""
+        cache = cache_from_url("redis://localhost:6380/3?ttl=60")
+        self.assertEqual((cache.host, cache.port, cache.db, cache.ttl), ("localhost", 6380, 3, 60))
+
+    def test_ttl(self):
+        """Test that entries expire"""
+        self.cache.ttl = 0
+
+        async def scenario():
+            await self.cache.set_many({"a": b"1"})
+            await asyncio.sleep(0.01)
+            return await self.cache.get_many(["a"])
+
+        self.assertEqual(self.wait(scenario()), [None])
+
+    def test_unavailable(self):
+        """Test that a server that is not there is reported, not fatal"""
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        cache = RedisCache(port=port)
+        with self.assertRaises(CacheUnavailableError):
+            asyncio.run(cache.get_many(["a"]))
+
+
+@unittest.skipUnless(BACKEND_AVAILABLE, "Requires the backend dependencies")
+class TestBackendCache(unittest.TestCase):
+    """Test that cached responses are the rendered ones"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.database = backend.DATABASE
+        backend.DATABASE = os.path.join(self.tmp.name, "eqs.db")
+        backend.create_table()
+        self.render_cache = backend.RENDER_CACHE
+        backend.RENDER_CACHE = MemoryCache()
+        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        with open(os.path.join(base_dir, "examples_rews", "eq.txt"), "rb") as fd:
+            success, self.eq_hash = backend.store_eq("eq.txt", fd.read())
+        self.assertTrue(success)
+
+    def tearDown(self):
+        backend.DATABASE = self.database
+        backend.RENDER_CACHE = self.render_cache
+        self.tmp.cleanup()
+
+    def test_hits(self):
+        """Test that a second request is a hit with the same response"""
+        client = TestClient(backend.backend)
+        for url in (
+            "/v1/eq/target/apo?eq_hash={}",
+            "/v1/eq/target/aupreset?eq_hash={}",
+            "/v1/eq/target/rme_totalmix_room?eq_hash_left={}&eq_hash_right=",
+            "/v1/eq/graph?eq_hash={}",
+            "/v1/eq/graph_spl?eq_hash={}&format=f16",
+            "/v1/eq/graph_spl_details?eq_hash={}&points=50&precision=2",
+        ):
+            with self.subTest(url=url):
+                hits = backend.RENDER_CACHE.cache_info().hits
+                first = client.get(url.format(self.eq_hash))
+                second = client.get(url.format(self.eq_hash))
+                self.assertEqual(backend.RENDER_CACHE.cache_info().hits, hits + 1)
+                self.assertEqual(first.content, second.content)
+                self.assertEqual(first.headers["content-type"], second.headers["content-type"])
+
+    def test_render_version(self):
+        """Test that keys change with the render version, not only the release"""
+        client = TestClient(backend.backend)
+        client.get("/v1/eq/graph?eq_hash={}".format(self.eq_hash))
+        keys = list(backend.RENDER_CACHE._entries)
+        self.assertEqual(len(keys), 1)
+        self.assertTrue(keys[0].startswith("{}-r{}/".format(backend.SOFTWARE_VERSION, backend.RENDER_VERSION)))
+
+    def test_convert_off_loop(self):
+        """Test that targets are converted outside of the event loop"""
+        loops = []
+        convert = backend.convert
+
+        def recording(*args):
+            try:
+                loops.append(asyncio.get_running_loop())
+            except RuntimeError:
+                loops.append(None)
+            return convert(*args)
+
+        backend.convert = recording
+        try:
+            client = TestClient(backend.backend)
+            self.assertEqual(
+                client.get("/v1/eq/target/apo?eq_hash={}".format(self.eq_hash)).status_code, 200
+            )
+        finally:
+            backend.convert = convert
+        self.assertEqual(loops, [None])
+
+    def test_renamed(self):
+        """Test that a body showing the name follows the last upload"""
+        client = TestClient(backend.backend)
+        first = client.get("/v1/eq/target/apo?eq_hash={}".format(self.eq_hash)).json()
+        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        with open(os.path.join(base_dir, "examples_rews", "eq.txt"), "rb") as fd:
+            success, eq_hash = backend.store_eq("renamed.txt", fd.read())
+        self.assertTrue(success)
+        self.assertEqual(eq_hash, self.eq_hash)
+        for target in ("apo", "aupreset"):
+            with self.subTest(target=target):
+                content = client.get(
+                    "/v1/eq/target/{}?eq_hash={}".format(target, eq_hash)
+                ).text
+                self.assertIn("renamed", content)
+                self.assertNotIn("eq.txt", content)
+        self.assertNotEqual(first, client.get("/v1/eq/target/apo?eq_hash={}".format(eq_hash)).json())
+
+    def test_cache_unavailable(self):
+        """Test that an unreachable cache is served around"""
+        backend.RENDER_CACHE = SqliteCache(os.path.join(self.tmp.name, "missing", "cache.db"))
+        client = TestClient(backend.backend)
+        for _ in range(2):
+            response = client.get("/v1/eq/target/apo?eq_hash={}".format(self.eq_hash))
+            self.assertEqual(response.status_code, 200)
+
+    def test_unknown_hash(self):
+        """Test that bodies for unknown hashes are not cached"""
+        client = TestClient(backend.backend)
+        client.get("/v1/eq/graph?eq_hash={}".format("0" * 128))
+        client.get("/v1/eq/target/apo?eq_hash={}".format("0" * 128))
+        self.assertEqual(backend.RENDER_CACHE.cache_info().currsize, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
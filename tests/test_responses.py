@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""Tests for the fast JSON responses"""
+
+import unittest
+import json
+import sys
+import os
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import msgspec
+    import numpy as np
+    from fastapi.encoders import jsonable_encoder
+    from starlette.responses import JSONResponse
+    from responses import FastJSONResponse, dumps
+    RESPONSES_AVAILABLE = True
+except ImportError as e:
+    print(f"Warning: Could not import responses module: {e}")
+    RESPONSES_AVAILABLE = False
+
+
+if RESPONSES_AVAILABLE:
+
+    class Row(msgspec.Struct, array_like=True):
+        eq_hash: str
+        name: str
+
+
+@unittest.skipUnless(RESPONSES_AVAILABLE, "Requires orjson, msgspec and starlette")
+class TestFastJSONResponse(unittest.TestCase):
+    """Test that FastJSONResponse produces the same documents"""
+
+    def test_same_as_jsonable_encoder(self):
+        """Test plain python content"""
+        content = {
+            "freq": [20.0, 1.0e-5, 20000.0],
+            "spl": {0: [1.5, -2.25], 1: []},
+            "name": "Genelec 8361A é",
+            "status": (True, "ok"),
+            "hash": None,
+        }
+        fast = json.loads(FastJSONResponse(content).body)
+        expected = json.loads(JSONResponse(jsonable_encoder(content)).body)
+        self.assertEqual(fast, expected)
+
+    def test_numpy(self):
+        """Test arrays, views and scalars"""
+        bank = np.arange(12, dtype=float).reshape(3, 4)
+        content = {
+            "rows": dict(enumerate(bank)),
+            "column": bank[:, 1],
+            "scalar": np.float64(0.5),
+            "count": np.int64(3),
+        }
+        self.assertEqual(
+            json.loads(dumps(content)),
+            {
+                "rows": {str(i): row.tolist() for i, row in enumerate(bank)},
+                "column": [1.0, 5.0, 9.0],
+                "scalar": 0.5,
+                "count": 3,
+            },
+        )
+
+    def test_struct(self):
+        """Test that array like structs are encoded as arrays"""
+        self.assertEqual(json.loads(dumps([Row("abc", "eq.txt")])), [["abc", "eq.txt"]])
+
+    def test_non_finite(self):
+        """Test that non finite floats become null"""
+        self.assertEqual(json.loads(dumps([float("nan"), np.inf])), [None, None])
+
+    def test_unknown_type(self):
+        """Test that unknown types are rejected"""
+        with self.assertRaises(TypeError):
+            dumps({"value": object()})
+
+
+if __name__ == "__main__":
+    unittest.main()
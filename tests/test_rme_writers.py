@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""Golden file tests for the RME TotalMix writers"""
+
+import unittest
+import contextlib
+import glob
+import io
+import os
+import sys
+import tempfile
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from converter import (
+        file2iir,
+        iir2rme_totalmix_catalog,
+        iir2rme_totalmix_channel,
+        iir2rme_totalmix_channel_stream,
+        iir2rme_totalmix_room,
+        iir2rme_totalmix_room_stream,
+        rme_totalmix_channel_render,
+        write_rme_totalmix_catalog,
+    )
+    CONVERTER_AVAILABLE = True
+except ImportError as e:
+    print(f"Warning: Could not import converter modules: {e}")
+    CONVERTER_AVAILABLE = False
+
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# golden files that are room presets and the EQ they were generated from
+ROOM_GOLDEN_SOURCES = {
+    "Sennheiser HD 650 ParametricEq": "Sennheiser HD 650 -- 9 iirs",
+}
+
+# the channel EQ has 3 bands: the writer fits larger EQs first
+RME_CHANNEL_BANDS = 3
+
+
+def load(name: str) -> list:
+    success, iir = file2iir(os.path.join(BASE_DIR, "examples_rews", f"{name}.txt"))
+    if not success:
+        raise AssertionError(name)
+    return iir
+
+
+def goldens() -> list[tuple[str, str]]:
+    """name and content of the files in examples_tmeq"""
+    result = []
+    for golden in sorted(glob.glob(os.path.join(BASE_DIR, "examples_tmeq", "*.tmeq"))):
+        with open(golden, "r", encoding="ascii") as fd:
+            result.append((os.path.basename(golden)[: -len(".tmeq")], fd.read().rstrip("\n")))
+    return result
+
+
+@unittest.skipUnless(CONVERTER_AVAILABLE, "Converter module not available")
+class TestRMEGolden(unittest.TestCase):
+    """Compare rendered presets with the files in examples_tmeq"""
+
+    def test_golden_files(self):
+        """Test the writers on the EQs they take as is"""
+        checked = 0
+        for name, expected in goldens():
+            if name in ROOM_GOLDEN_SOURCES:
+                _, rendered = iir2rme_totalmix_room(load(ROOM_GOLDEN_SOURCES[name]), [])
+            elif len(load(name)) <= RME_CHANNEL_BANDS:
+                _, rendered = iir2rme_totalmix_channel(load(name))
+            else:
+                continue
+            with self.subTest(name=name):
+                self.assertEqual(rendered, expected)
+                checked += 1
+        self.assertGreaterEqual(checked, 2)
+
+    def test_band_layouts(self):
+        """Test the layout of presets with more bands than the channel EQ
+
+        These files predate the 3 band limit: the writer fits such EQs
+        and renders the fitted bands with the same templates.
+        """
+        checked = 0
+        for name, expected in goldens():
+            if name in ROOM_GOLDEN_SOURCES or len(load(name)) <= RME_CHANNEL_BANDS:
+                continue
+            with self.subTest(name=name):
+                self.assertEqual("".join(rme_totalmix_channel_render(load(name))), expected)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    success, fitted = iir2rme_totalmix_channel(load(name))
+                self.assertTrue(success)
+                self.assertIn('e="Band{} Freq"'.format(RME_CHANNEL_BANDS), fitted)
+                self.assertNotIn('e="Band{} Freq"'.format(RME_CHANNEL_BANDS + 1), fitted)
+                checked += 1
+        self.assertGreater(checked, 0)
+
+
+@unittest.skipUnless(CONVERTER_AVAILABLE, "Converter module not available")
+class TestRMEWriters(unittest.TestCase):
+    """Test stream, shared channel and catalog writers"""
+
+    def setUp(self):
+        self.iir = load("manger-sidekick")
+        self.other = load("l")
+
+    def test_stream_matches_string(self):
+        stream = io.StringIO()
+        self.assertTrue(iir2rme_totalmix_channel_stream(self.iir, stream))
+        self.assertEqual(stream.getvalue(), iir2rme_totalmix_channel(self.iir)[1])
+        stream = io.StringIO()
+        self.assertTrue(iir2rme_totalmix_room_stream(self.iir, self.other, stream))
+        self.assertEqual(stream.getvalue(), iir2rme_totalmix_room(self.iir, self.other)[1])
+
+    def test_room_empty_right_copies_left(self):
+        _, room = iir2rme_totalmix_room(self.iir, [])
+        left = room[room.index("<Room EQ L>") + len("<Room EQ L>"): room.index("</Room EQ L>")]
+        right = room[room.index("<Room EQ R>") + len("<Room EQ R>"): room.index("</Room EQ R>")]
+        self.assertEqual(left, right)
+        self.assertEqual(room, iir2rme_totalmix_room(self.iir, self.iir)[1])
+
+    def test_catalog(self):
+        catalog = {"sidekick": self.iir, "left": self.other}
+        rendered = iir2rme_totalmix_catalog(catalog)
+        self.assertEqual(set(rendered), set(catalog))
+        self.assertEqual(rendered["left"][0], iir2rme_totalmix_channel(self.other)[1])
+        self.assertEqual(rendered["left"][1], iir2rme_totalmix_room(self.other, [])[1])
+        with tempfile.TemporaryDirectory() as tmp:
+            self.assertEqual(write_rme_totalmix_catalog(catalog, tmp), 4)
+            with open(os.path.join(tmp, "sidekick.tmreq"), encoding="ascii") as fd:
+                self.assertEqual(fd.read(), rendered["sidekick"][1])
+
+
+if __name__ == "__main__":
+    unittest.main()
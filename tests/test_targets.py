@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""Tests for the target registry and the conversion dispatch"""
+
+import unittest
+import sys
+import os
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from converter import (
+        file2iir,
+        iir2aupreset,
+        iir2rme_totalmix_room,
+    )
+    from targets import (
+        Target,
+        TARGETS,
+        convert,
+        convert_cache_info,
+        convert_many,
+        get_target,
+        register_target,
+    )
+    TARGETS_AVAILABLE = True
+except ImportError as e:
+    print(f"Warning: Could not import targets module: {e}")
+    TARGETS_AVAILABLE = False
+
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@unittest.skipUnless(TARGETS_AVAILABLE, "Requires numpy and converter modules")
+class TestTargets(unittest.TestCase):
+    """Test the target registry"""
+
+    def setUp(self):
+        success, self.iir = file2iir(os.path.join(BASE_DIR, "examples_rews", "eq.txt"))
+        self.assertTrue(success)
+
+    def test_aliases(self):
+        """Test that command line names resolve to registry targets"""
+        self.assertEqual(get_target("rmetmeq").name, "rme_totalmix_channel")
+        self.assertEqual(get_target("rmetmreq").name, "rme_totalmix_room")
+        self.assertIsNone(get_target("unknown"))
+
+    def test_capabilities(self):
+        """Test that every target describes its limits"""
+        for name, target in TARGETS.items():
+            with self.subTest(target=name):
+                capabilities = target.capabilities()
+                self.assertEqual(capabilities["name"], name)
+                self.assertIn("extension", capabilities)
+        self.assertEqual(get_target("aupreset").capabilities()["max_bands"], 16)
+        self.assertEqual(get_target("rmetmeq").capabilities()["max_bands"], 3)
+        self.assertEqual(get_target("rmetmreq").capabilities()["max_bands"], 9)
+
+    def test_convert_matches_writers(self):
+        """Test that dispatch produces the same output as the writers"""
+        self.assertEqual(
+            convert("aupreset", [self.iir], "eq"), iir2aupreset(self.iir, "eq")
+        )
+        self.assertEqual(
+            convert("rmetmreq", [self.iir], "eq"),
+            iir2rme_totalmix_room(self.iir, []),
+        )
+
+    def test_convert_is_cached(self):
+        """Test that a repeated conversion hits the cache"""
+        convert("apo", [self.iir], "cached")
+        hits = convert_cache_info().hits
+        convert("apo", [self.iir], "cached")
+        self.assertEqual(convert_cache_info().hits, hits + 1)
+
+    def test_validation(self):
+        """Test that invalid requests are rejected with a message"""
+        status, msg = convert("nope", [self.iir], "eq")
+        self.assertFalse(status)
+        self.assertIn("unknown target", msg)
+        status, msg = convert("aupreset", [self.iir, self.iir], "eq")
+        self.assertFalse(status)
+
+    def test_convert_many(self):
+        """Test batch conversion"""
+        results = convert_many("apo", [([self.iir], "a"), ([self.iir], "b")])
+        self.assertEqual(len(results), 2)
+        self.assertTrue(all(status for status, _ in results))
+        self.assertIn("a", results[0][1])
+
+    def test_duplicate_registration(self):
+        """Test that a name cannot be registered twice"""
+        target = get_target("apo")
+        with self.assertRaises(ValueError):
+            register_target(
+                Target(
+                    name="apo",
+                    description="duplicate",
+                    extension="txt",
+                    constraints=None,
+                    writer=target.writer,
+                )
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
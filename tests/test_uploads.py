@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""Tests for streamed uploads and their limits"""
+
+import unittest
+import asyncio
+import os
+import sys
+import tempfile
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from converter import guess_format
+    from uploads import (
+        UPLOAD_MAX_BYTES,
+        UPLOAD_MAX_FILES,
+        UPLOAD_MAX_LINE,
+        UPLOAD_MAX_LINES,
+        UPLOAD_MAX_REQUEST,
+        UPLOAD_SNIFF_BYTES,
+        EqLines,
+        UploadRejectedError,
+        read_uploads,
+    )
+    UPLOADS_AVAILABLE = True
+except ImportError as e:
+    print(f"Warning: Could not import uploads module: {e}")
+    UPLOADS_AVAILABLE = False
+
+try:
+    from fastapi.testclient import TestClient
+    import backend
+    BACKEND_AVAILABLE = True
+except ImportError as e:
+    print(f"Warning: Could not import backend module: {e}")
+    BACKEND_AVAILABLE = False
+
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EXAMPLES = os.path.join(BASE_DIR, "examples_rews")
+
+
+def example(name: str) -> bytes:
+    with open(os.path.join(EXAMPLES, name), "rb") as fd:
+        return fd.read()
+
+
+def feed(data: bytes, chunk: int) -> EqLines:
+    lines = EqLines()
+    for i in range(0, len(data), chunk):
+        lines.feed(data[i : i + chunk])
+    return lines
+
+
+def multipart(files: list[tuple[str, bytes]], boundary: str = "b0undary") -> bytes:
+    body = b""
+    for name, data in files:
+        body += (
+            "--{}\r\nContent-Disposition: form-data; name=\"files\"; filename=\"{}\"\r\n"
+            "Content-Type: text/plain\r\n\r\n".format(boundary, name).encode("utf-8")
+        )
+        body += data + b"\r\n"
+    return body + "--{}--\r\n".format(boundary).encode("utf-8")
+
+
+@unittest.skipUnless(UPLOADS_AVAILABLE, "uploads module not available")
+class TestEqLines(unittest.TestCase):
+    """Test line splitting and limits, whatever the chunks"""
+
+    def test_same_lines(self):
+        """Test that the lines are those of decode and split"""
+        for name in sorted(os.listdir(EXAMPLES)):
+            data = example(name)
+            if guess_format(data.decode("utf-8").split("\n")) == "Unknown":
+                # raw coefficients
+                self.assertFalse(feed(data, 7).result()[0])
+                continue
+            for chunk in (1, 7, 4096):
+                with self.subTest(name=name, chunk=chunk):
+                    self.assertEqual(
+                        feed(data, chunk).result(), (True, data.decode("utf-8").split("\n"))
+                    )
+
+    def test_utf8_across_chunks(self):
+        data = "Filter 1: ON PK Fc 100 Hz Gain -2 dB Q 1.41 # é€\n".encode("utf-8")
+        self.assertEqual(feed(data, 1).result(), (True, data.decode("utf-8").split("\n")))
+        self.assertEqual(feed(b"\xff\xfe" + data, 3).result()[0], False)
+
+    def test_limits(self):
+        filter_line = b"Filter 1: ON PK Fc 100 Hz Gain -2 dB Q 1.41\n"
+        for data, message in (
+            (b"", "empty"),
+            (b"hello\nworld\n" * 1000, "look like an EQ"),
+            (filter_line + b"x" * (UPLOAD_MAX_LINE + 1) + b"\n", "longer"),
+            (filter_line + b"x" * (UPLOAD_MAX_LINE + 1), "longer"),
+            (filter_line + b"\n" * UPLOAD_MAX_LINES, "lines"),
+            (filter_line + (b"#" * 100 + b"\n") * (UPLOAD_MAX_BYTES // 100), "larger"),
+        ):
+            with self.subTest(message=message):
+                success, result = feed(data, 1000).result()
+                self.assertFalse(success)
+                self.assertIn(message, result)
+
+    def test_early_rejection(self):
+        """Test that a file that is not an EQ is dropped after the first KB"""
+        lines = EqLines()
+        lines.feed(b"not an eq\n" * (UPLOAD_SNIFF_BYTES // 10 + 1))
+        self.assertIsNotNone(lines.error)
+        lines.feed(b"Filter 1: ON PK Fc 100 Hz Gain -2 dB Q 1.41\n")
+        self.assertEqual(lines.lines, [])
+        self.assertFalse(lines.result()[0])
+
+
+@unittest.skipUnless(UPLOADS_AVAILABLE, "uploads module not available")
+class TestReadUploads(unittest.TestCase):
+    """Test request level limits"""
+
+    def read(self, body: bytes, chunk: int = 1000, headers: dict | None = None):
+        self.consumed = 0
+
+        async def stream():
+            for i in range(0, len(body), chunk):
+                self.consumed += chunk
+                yield body[i : i + chunk]
+
+        headers = headers or {"content-type": "multipart/form-data; boundary=b0undary"}
+        return asyncio.run(read_uploads(headers, stream()))
+
+    def test_files(self):
+        files = self.read(multipart([("eq.txt", example("eq.txt")), ("r.txt", example("r.txt"))]))
+        self.assertEqual([name for name, _ in files], ["eq.txt", "r.txt"])
+        self.assertTrue(all(lines.result()[0] for _, lines in files))
+
+    def test_stops_reading(self):
+        """Test that an oversized body is refused before it is read"""
+        body = multipart([("big.txt", b"Filter\n" * (UPLOAD_MAX_REQUEST // 7 * 2))])
+        with self.assertRaises(UploadRejectedError) as raised:
+            self.read(body)
+        self.assertEqual(raised.exception.status, 413)
+        self.assertLessEqual(self.consumed, UPLOAD_MAX_REQUEST + 1000)
+        self.assertLess(self.consumed, len(body))
+        headers = {
+            "content-type": "multipart/form-data; boundary=b0undary",
+            "content-length": str(len(body)),
+        }
+        with self.assertRaises(UploadRejectedError):
+            self.read(body, headers=headers)
+        self.assertEqual(self.consumed, 0)
+
+    def test_rejected(self):
+        for body, headers, status in (
+            (
+                multipart([("eq.txt", b"x")] * (UPLOAD_MAX_FILES + 1)),
+                None,
+                413,
+            ),
+            (b"{}", {"content-type": "application/json"}, 415),
+        ):
+            with self.subTest(status=status), self.assertRaises(UploadRejectedError) as raised:
+                self.read(body, headers=headers)
+            self.assertEqual(raised.exception.status, status)
+
+
+@unittest.skipUnless(BACKEND_AVAILABLE, "Requires the backend dependencies")
+class TestUploadRoute(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.database = backend.DATABASE
+        backend.DATABASE = os.path.join(self.tmp.name, "eqs.db")
+        backend.create_table()
+        self.client = TestClient(backend.backend)
+
+    def tearDown(self):
+        backend.DATABASE = self.database
+        self.tmp.cleanup()
+
+    def test_upload(self):
+        """Test one status per file, in order"""
+        files = [
+            ("files", ("eq.txt", example("eq.txt"), "text/plain")),
+            ("files", ("junk.bin", b"\x00" * 10000, "application/octet-stream")),
+            ("files", ("empty.txt", b"", "text/plain")),
+            ("files", ("r.txt", example("r.txt"), "text/plain")),
+        ]
+        response = self.client.post("/v1/eq/upload", files=files)
+        self.assertEqual(response.status_code, 200)
+        statuses = response.json()
+        self.assertEqual([item["status"] for item in statuses], ["ok", "failed", "failed", "ok"])
+        self.assertEqual(statuses[0]["hash"], backend.eq2hash(example("eq.txt")))
+        self.assertIn("empty", statuses[2]["message"])
+        for item in (statuses[0], statuses[3]):
+            self.assertIsNotNone(backend.db_find_eq(item["hash"]))
+
+    def test_too_large(self):
+        response = self.client.post(
+            "/v1/eq/upload", files=[("files", ("big.txt", b"x" * (UPLOAD_MAX_REQUEST + 1)))]
+        )
+        self.assertEqual(response.status_code, 413)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""EQ files read from a multipart upload as the request arrives.
+
+The multipart body is parsed chunk by chunk from the request stream: file
+data goes straight to an EqLines, which splits it into lines and enforces
+the limits, nothing is spooled. A request is refused before its body is
+read when Content-Length is too large, and as soon as it goes over the
+limit otherwise. A file is rejected, and the rest of it ignored:
+
+    - past UPLOAD_MAX_BYTES, UPLOAD_MAX_LINES or UPLOAD_MAX_LINE
+    - when its first UPLOAD_SNIFF_BYTES hold no line that looks like an
+      EQ, a filter line or the AUNBandEQ header
+    - when a line is not utf-8
+"""
+
+from collections.abc import AsyncIterator
+
+import python_multipart
+from python_multipart.exceptions import FormParserError
+from python_multipart.multipart import parse_options_header
+
+from converter import guess_format
+
+UPLOAD_MAX_FILES = 16
+# a 16 band REW export is under 2 KB
+UPLOAD_MAX_BYTES = 32 * 1024
+UPLOAD_MAX_LINES = 1024
+UPLOAD_MAX_LINE = 1024
+UPLOAD_SNIFF_BYTES = 4096
+# files plus their part headers
+UPLOAD_MAX_REQUEST = UPLOAD_MAX_FILES * (UPLOAD_MAX_BYTES + 1024)
+
+UPLOAD_FIELD = "files"
+
+
+class UploadRejectedError(Exception):
+    """the whole request is refused, status is the HTTP status to answer"""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+class EqLines:
+    """the lines of an uploaded file, fed in chunks"""
+
+    def __init__(self):
+        self.lines: list[str] = []
+        self.size = 0
+        self.error: str | None = None
+        self._partial = bytearray()
+        self._looks_like_eq = False
+
+    def feed(self, data: bytes) -> None:
+        if self.error is not None:
+            return
+        self.size += len(data)
+        if self.size > UPLOAD_MAX_BYTES:
+            self._reject("The file is larger than {} bytes".format(UPLOAD_MAX_BYTES))
+            return
+        start = 0
+        while self.error is None:
+            end = data.find(b"\n", start)
+            if end == -1:
+                self._partial += data[start:]
+                if len(self._partial) > UPLOAD_MAX_LINE:
+                    self._reject("A line is longer than {} bytes".format(UPLOAD_MAX_LINE))
+                break
+            self._partial += data[start:end]
+            self._line()
+            start = end + 1
+        if (
+            self.error is None
+            and not self._looks_like_eq
+            and self.size - len(self._partial) >= UPLOAD_SNIFF_BYTES
+        ):
+            self._reject("The file does not look like an EQ")
+
+    def _line(self) -> None:
+        if len(self._partial) > UPLOAD_MAX_LINE:
+            self._reject("A line is longer than {} bytes".format(UPLOAD_MAX_LINE))
+            return
+        if len(self.lines) >= UPLOAD_MAX_LINES:
+            self._reject("The file has more than {} lines".format(UPLOAD_MAX_LINES))
+            return
+        try:
+            line = self._partial.decode("utf-8")
+        except UnicodeDecodeError:
+            self._reject("There was an error parsing the file: buffer decoding")
+            return
+        self._partial.clear()
+        if not self._looks_like_eq and guess_format([line]) != "Unknown":
+            self._looks_like_eq = True
+        self.lines.append(line)
+
+    def _reject(self, message: str) -> None:
+        self.error = message
+        self.lines = []
+        self._partial = bytearray()
+
+    def result(self) -> tuple[bool, list[str] | str]:
+        """the lines, as bytes.decode().split("\\n") would give them, or an error"""
+        if self.error is None and self.size == 0:
+            return False, "There was an error parsing the file: buffer looks empty"
+        if self.error is None:
+            self._line()
+        if self.error is None and not self._looks_like_eq:
+            self._reject("The file does not look like an EQ")
+        if self.error is not None:
+            return False, self.error
+        return True, self.lines
+
+
+class _Parts:
+    """python_multipart callbacks, keeping the files of UPLOAD_FIELD"""
+
+    def __init__(self):
+        self.files: list[tuple[str | None, EqLines]] = []
+        self._header_name = b""
+        self._header_value = b""
+        self._disposition = b""
+        self._current: EqLines | None = None
+
+    def on_part_begin(self) -> None:
+        self._disposition = b""
+        self._current = None
+
+    def on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_name += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def on_header_end(self) -> None:
+        if self._header_name.lower() == b"content-disposition":
+            self._disposition = self._header_value
+        self._header_name = b""
+        self._header_value = b""
+
+    def on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._disposition)
+        if options.get(b"name", b"").decode("utf-8", "replace") != UPLOAD_FIELD:
+            # other fields are ignored
+            return
+        if len(self.files) >= UPLOAD_MAX_FILES:
+            msg = "More than {} files".format(UPLOAD_MAX_FILES)
+            raise UploadRejectedError(msg, 413)
+        filename = options.get(b"filename")
+        self._current = EqLines()
+        self.files.append(
+            (None if filename is None else filename.decode("utf-8", "replace"), self._current)
+        )
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._current is not None:
+            self._current.feed(data[start:end])
+
+    def on_part_end(self) -> None:
+        self._current = None
+
+
+async def read_uploads(
+    headers, stream: AsyncIterator[bytes]
+) -> list[tuple[str | None, EqLines]]:
+    """the files of a multipart request, with their name as sent"""
+    content_type, options = parse_options_header(headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in options:
+        msg = "Expected a multipart/form-data body"
+        raise UploadRejectedError(msg, 415)
+    length = headers.get("content-length")
+    if length is not None and length.isdigit() and int(length) > UPLOAD_MAX_REQUEST:
+        msg = "The upload is larger than {} bytes".format(UPLOAD_MAX_REQUEST)
+        raise UploadRejectedError(msg, 413)
+
+    parts = _Parts()
+    parser = python_multipart.MultipartParser(
+        options[b"boundary"],
+        {
+            "on_part_begin": parts.on_part_begin,
+            "on_header_field": parts.on_header_field,
+            "on_header_value": parts.on_header_value,
+            "on_header_end": parts.on_header_end,
+            "on_headers_finished": parts.on_headers_finished,
+            "on_part_data": parts.on_part_data,
+            "on_part_end": parts.on_part_end,
+        },
+    )
+    received = 0
+    try:
+        async for chunk in stream:
+            received += len(chunk)
+            if received > UPLOAD_MAX_REQUEST:
+                msg = "The upload is larger than {} bytes".format(UPLOAD_MAX_REQUEST)
+                raise UploadRejectedError(msg, 413)
+            parser.write(chunk)
+        parser.finalize()
+    except FormParserError as e:
+        msg = "There was an error parsing the upload: {}".format(e)
+        raise UploadRejectedError(msg) from e
+    return parts.files